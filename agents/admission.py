@@ -0,0 +1,137 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Lower value is admitted first
+PRIORITY_TASK_ASSIGNMENT = 0
+PRIORITY_CONVERSATION = 1
+
+
+class AgentOverloadedError(Exception):
+    """Raised when the agent wait queue is full; surfaced to clients as 429."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Agent is overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds how many agent runs hit the LLM provider at once.
+    Up to `max_in_flight` runs execute concurrently; up to `max_queue` more
+    wait in a priority queue (FIFO within a priority). Anything beyond that is
+    rejected immediately with AgentOverloadedError instead of failing slowly.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 32,
+                 retry_after: int = 5, use_priority: bool = True):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.use_priority = use_priority
+
+        self._in_flight = 0
+        self._waiters = []
+        self._queued = 0
+        self._sequence = itertools.count()
+
+        self.admitted = 0
+        self.rejected = 0
+        self._wait_times = deque(maxlen=1000)
+        self._max_wait = 0.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_in_flight=int(os.getenv("AGENT_MAX_IN_FLIGHT", "8")),
+            max_queue=int(os.getenv("AGENT_MAX_QUEUE", "32")),
+            retry_after=int(os.getenv("AGENT_RETRY_AFTER_SECONDS", "5")),
+            use_priority=os.getenv("AGENT_PRIORITIZE_TASK_ASSIGNMENT", "true").lower() == "true"
+        )
+
+    def is_saturated(self) -> bool:
+        """True when a new request would be rejected right now."""
+        return self._in_flight >= self.max_in_flight and self._queued >= self.max_queue
+
+    def reject(self) -> AgentOverloadedError:
+        """Count a rejection and build the error to raise for it."""
+        self.rejected += 1
+        return AgentOverloadedError(self.retry_after)
+
+    async def acquire(self, priority: int = PRIORITY_CONVERSATION):
+        started = time.monotonic()
+
+        if self._in_flight < self.max_in_flight and self._queued == 0:
+            self._in_flight += 1
+            self._record_admission(started)
+            return
+
+        if self._queued >= self.max_queue:
+            raise self.reject()
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority if self.use_priority else 0, next(self._sequence), future]
+        heapq.heappush(self._waiters, entry)
+        self._queued += 1
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self.release()
+            else:
+                self._queued -= 1
+            raise
+
+        self._record_admission(started)
+
+    def release(self):
+        # Hand the slot straight to the next live waiter, if any
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._queued -= 1
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_CONVERSATION):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _record_admission(self, started: float):
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self._wait_times.append(waited)
+        self._max_wait = max(self._max_wait, waited)
+
+    def stats(self) -> dict:
+        waits = sorted(self._wait_times)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 3)
+
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_wait_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(self._max_wait * 1000, 3)
+            }
+        }
@@ -1,9 +1,9 @@
 from langgraph.graph import StateGraph, END
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langgraph.graph.message import add_messages
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, ToolMessage
 from langchain_core.tools import tool
-from models import AgentState
-import os
+from agents.llm_backends import build_llm
+from typing import Annotated, List, Optional, TypedDict
 from dotenv import load_dotenv
 from bson import ObjectId
 
@@ -11,21 +11,20 @@ from bson import ObjectId
 load_dotenv()
 
 
-def get_learning_agent(db):
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY not found in environment variables")
+class AgentState(TypedDict, total=False):
+    """Graph state for the StateGraph agent."""
+    userId: str
+    goals: List[str]
+    active_task: Optional[str]
+    messages: Annotated[list, add_messages]
+    response_text: str
 
-    print(f"🔑 Using API Key: {api_key[:10]}...")
 
-    # Use gemini-2.5-flash with tools
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.7,
-        google_api_key=api_key
-    )
+def get_learning_agent(db):
+    # Use gemini-2.5-flash with tools, or the backend selected by AGENT_LLM_BACKEND
+    llm = build_llm(model="gemini-2.5-flash")
 
-    print("✅ LLM initialized with model: gemini-2.5-flash")
+    print(f"✅ LLM initialized: {llm._llm_type}")
 
     # Define tools for the agent
     @tool
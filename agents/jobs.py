@@ -0,0 +1,211 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from bson import ObjectId
+
+from agents.admission import AgentOverloadedError
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+TERMINAL_STATES = (JOB_COMPLETED, JOB_FAILED)
+
+# A running job belongs to the worker holding its lease; the lease is renewed
+# every third of this while the job runs, so it only lapses if the process dies
+JOB_LEASE_SECONDS = float(os.getenv("AGENT_JOB_LEASE_SECONDS", "60"))
+
+
+class AgentJobQueue:
+    """
+    Runs agent requests in the background for `/chat/agent?async=true`.
+    Jobs are recorded in the `agent_jobs` collection and executed by a bounded
+    pool of in-process workers. A running job carries the `worker_id` of the
+    process running it and a `lease_expires_at` that process keeps renewing;
+    jobs whose lease lapsed (their process died) are re-queued on start() and
+    periodically after, while jobs other live processes are running are left alone.
+    """
+
+    def __init__(
+        self,
+        db,
+        handler: Callable[[str, Optional[str]], Awaitable[dict]],
+        workers: int = 4,
+        lease_seconds: float = JOB_LEASE_SECONDS
+    ):
+        self.db = db
+        self.handler = handler
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self._updates = {}
+
+    async def start(self):
+        requeued = await self._requeue_expired()
+        # Also picks up jobs that were still queued when the last process stopped
+        cursor = self.db.agent_jobs.find({"status": JOB_QUEUED}, {"_id": 1}).sort("created_at", 1)
+        async for job in cursor:
+            self._queue.put_nowait(str(job["_id"]))
+        if requeued:
+            print(f"♻️ Re-queued {requeued} agent job(s) whose worker stopped")
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+        print(f"✅ Agent job workers started ({self.workers}, {self.worker_id})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: str, message: Optional[str]) -> str:
+        now = datetime.now()
+        result = await self.db.agent_jobs.insert_one({
+            "userId": user_id,
+            "message": message,
+            "status": JOB_QUEUED,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now
+        })
+        job_id = str(result.inserted_id)
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await self.db.agent_jobs.find_one({"_id": ObjectId(job_id)})
+
+    async def wait_for_update(self, job_id: str, timeout: float):
+        """Wait until a local worker updates the job, or until timeout."""
+        event = self._updates.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if event.is_set():
+                self._updates.pop(job_id, None)
+
+    def forget_updates(self, job_id: str):
+        """Drop the wake-up event of a job nobody waits on any more (e.g. run by another process)."""
+        self._updates.pop(job_id, None)
+
+    def _notify(self, job_id: str):
+        event = self._updates.get(job_id)
+        if event is not None:
+            event.set()
+
+    def _lease_expiry(self) -> datetime:
+        return datetime.now() + timedelta(seconds=self.lease_seconds)
+
+    async def _set_status(self, job_id: str, status: str, **fields) -> bool:
+        """Move a job this worker holds to `status`; False if its lease was lost to another worker."""
+        result = await self.db.agent_jobs.update_one(
+            {"_id": ObjectId(job_id), "status": JOB_RUNNING, "worker_id": self.worker_id},
+            {
+                "$set": {"status": status, "updated_at": datetime.now(), **fields},
+                "$unset": {"worker_id": "", "lease_expires_at": ""}
+            }
+        )
+        self._notify(job_id)
+        return result.matched_count > 0
+
+    async def _requeue_expired(self) -> int:
+        """Put running jobs whose worker stopped renewing its lease back in the queue."""
+        now = datetime.now()
+        result = await self.db.agent_jobs.update_many(
+            {"status": JOB_RUNNING, "$or": [
+                {"lease_expires_at": {"$lt": now}},
+                # Claimed before leases existed: give up once they have been quiet for a lease
+                {"lease_expires_at": {"$exists": False}, "updated_at": {"$lt": now - timedelta(seconds=self.lease_seconds)}}
+            ]},
+            {"$set": {"status": JOB_QUEUED, "updated_at": now}, "$unset": {"worker_id": "", "lease_expires_at": ""}}
+        )
+        return result.modified_count
+
+    async def _reaper(self):
+        """Recover jobs of processes that died while this one keeps running."""
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                if await self._requeue_expired():
+                    async for job in self.db.agent_jobs.find({"status": JOB_QUEUED}, {"_id": 1}).sort("created_at", 1):
+                        self._queue.put_nowait(str(job["_id"]))
+            except Exception as e:
+                print(f"⚠️ Agent job lease check failed: {str(e)}")
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.db.agent_jobs.update_one(
+                    {"_id": ObjectId(job_id), "status": JOB_RUNNING, "worker_id": self.worker_id},
+                    {"$set": {"lease_expires_at": self._lease_expiry()}}
+                )
+            except Exception as e:
+                print(f"⚠️ Renewing the lease of agent job {job_id} failed: {str(e)}")
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._execute(job_id)
+            except Exception as e:
+                print(f"❌ Agent job {job_id} crashed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run_leased(self, job_id: str, job: dict) -> dict:
+        """Run the handler while renewing the job's lease."""
+        heartbeat = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            return await self.handler(job["userId"], job.get("message"))
+        finally:
+            heartbeat.cancel()
+
+    async def _execute(self, job_id: str):
+        # Claim the job; if it is no longer queued another worker has it
+        job = await self.db.agent_jobs.find_one_and_update(
+            {"_id": ObjectId(job_id), "status": JOB_QUEUED},
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "worker_id": self.worker_id,
+                    "lease_expires_at": self._lease_expiry(),
+                    "started_at": datetime.now(),
+                    "updated_at": datetime.now()
+                },
+                "$inc": {"attempts": 1}
+            }
+        )
+        if not job:
+            return
+        self._notify(job_id)
+
+        try:
+            result = await self._run_leased(job_id, job)
+        except AgentOverloadedError as e:
+            # Back off and put the job back instead of failing it
+            await self._set_status(job_id, JOB_QUEUED)
+            await asyncio.sleep(e.retry_after)
+            self._queue.put_nowait(job_id)
+            return
+        except Exception as e:
+            await self._set_status(job_id, JOB_FAILED, error=str(e), finished_at=datetime.now())
+            return
+
+        if not await self._set_status(job_id, JOB_COMPLETED, result=result, finished_at=datetime.now()):
+            print(f"⚠️ Agent job {job_id} finished after its lease was taken over; result dropped")
+
+
+def get_job_queue(db, handler) -> AgentJobQueue:
+    return AgentJobQueue(db, handler, workers=int(os.getenv("AGENT_JOB_WORKERS", "4")))
@@ -1,11 +1,23 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
 from langgraph.prebuilt import create_react_agent
 from langsmith import traceable
+from agents.recommendation_cache import recommendation_cache, recommendation_fingerprint
+from agents.task_index import task_index
+from agents.llm_backends import build_llm
+from agents.payloads import (
+    ASSIGNED_TASK_FIELDS,
+    compact_json, encode_task_table, fit_to_budget, summarize_usage
+)
+from agents.admission import AdmissionController, PRIORITY_CONVERSATION, PRIORITY_TASK_ASSIGNMENT
+from utils.concurrency import SingleFlight
+from utils.assignments import assigned_task_ids, load_assignments
+from utils.catalog_cache import catalog_cache
+from utils.profile_cache import profile_cache
 import os
 from dotenv import load_dotenv
-from bson import ObjectId
+import asyncio
 import json
 import re
 
@@ -49,25 +61,271 @@ async def handle_agent_name_update(db, user_id: str, message: str) -> str:
         return "Hello! How can I help you today?"
 
 
+TASK_ASSIGNMENT_MODE = "task_assignment"
+CONVERSATION_MODE = "conversation"
+
+# Project whose catalog task recommendations are drawn from
+RECOMMENDATION_PROJECT_ID = "695caa41c485455f397017ae"
+RECOMMENDED_TASK_COUNT = 6
+
+# Fetch task-assignment inputs concurrently and rank with a single LLM call
+# instead of letting the ReAct loop call each tool in turn
+TASK_FAST_PATH_ENABLED = os.getenv("AGENT_TASK_FAST_PATH", "true").lower() == "true"
+
+# Only the top-k candidates by similarity to the goals are sent to the LLM
+TASK_RETRIEVAL_TOP_K = int(os.getenv("TASK_RETRIEVAL_TOP_K", "24"))
+
+
+def _get_db(config: RunnableConfig):
+    """Read the per-request database handle passed in through the run config."""
+    return config["configurable"]["db"]
+
+
+# Data access helpers
+# Shared by the ReAct tools and the task-assignment fast path.
+async def fetch_user_goals(db, user_id: str) -> dict:
+    """Fetch and normalize the learning goals for a specific user."""
+    print(f"🔍 Fetching goals for user: {user_id}")
+    goals_doc = await profile_cache.get_goals(db, user_id)
+    if not goals_doc:
+        return {"goals": [], "message": "No goals set"}
+
+    goals_data = goals_doc.get("goals", [])
+    print(f"   Raw goals_data type: {type(goals_data)}")
+    print(f"   Raw goals_data: {goals_data}")
+
+    # Robust parsing - handle any data type
+    goals = []
+
+    if isinstance(goals_data, list):
+        for item in goals_data:
+            if item:
+                item_str = str(item).strip()
+                if item_str:
+                    goals.append(item_str)
+
+    elif isinstance(goals_data, str):
+        stripped = goals_data.strip()
+        if stripped:
+            goals.append(stripped)
+
+    elif goals_data:
+        goals.append(str(goals_data))
+
+    print(f"✅ Parsed {len(goals)} goal(s): {goals}")
+    return {"goals": goals}
+
+
+async def fetch_project_details(db, project_id: str) -> dict:
+    """Fetch project name, description and status."""
+    print(f"🔍 Fetching project: {project_id}")
+    project = await catalog_cache.get_project(db, project_id)
+    if not project:
+        return {"error": f"Project {project_id} not found"}
+
+    result = {
+        "id": str(project["_id"]),
+        "name": project.get("name"),
+        "description": project.get("description", "No description"),
+        "status": project.get("status")
+    }
+    print(f"✅ Project found: {result['name']}")
+    return result
+
+
+async def fetch_project_tasks(db, project_id: str) -> list:
+    """Fetch all tasks for a project."""
+    print(f"🔍 Fetching tasks for project: {project_id}")
+    tasks = await catalog_cache.get_project_tasks(db, project_id)
+
+    result = [
+        {
+            "id": str(task["_id"]),
+            "title": task.get("title"),
+            "description": task.get("description", "No description"),
+            "status": task.get("status")
+        }
+        for task in tasks
+    ]
+    print(f"✅ Found {len(result)} tasks")
+    return result
+
+
+async def fetch_user_assigned_tasks(db, user_id: str) -> dict:
+    """Fetch the IDs of tasks already assigned to the user."""
+    print(f"🔍 Fetching assigned tasks for user: {user_id}")
+    task_assignments = await load_assignments(db, user_id, fields=ASSIGNED_TASK_FIELDS)
+
+    if not task_assignments:
+        print("✅ No tasks assigned to user yet")
+        return {"assigned_task_ids": [], "completed_task_ids": []}
+
+    assigned_task_ids = []
+    completed_task_ids = []
+
+    for task in task_assignments:
+        task_id = task.get("taskId")
+        if task_id:
+            assigned_task_ids.append(task_id)
+            if task.get("isCompleted", False):
+                completed_task_ids.append(task_id)
+
+    print(f"✅ User has {len(assigned_task_ids)} assigned tasks ({len(completed_task_ids)} completed)")
+    return {
+        "assigned_task_ids": assigned_task_ids,
+        "completed_task_ids": completed_task_ids
+    }
+
+
+# Define tools
+# The tools are created once at import time. Everything that varies per
+# request (db, userId, agentName) arrives through config["configurable"].
+@tool
+async def get_user_goals(user_id: str, config: RunnableConfig) -> str:
+    """Fetch the learning goals for a specific user."""
+    try:
+        return fit_to_budget(await fetch_user_goals(_get_db(config), user_id))
+    except Exception as e:
+        print(f"❌ Error in get_user_goals: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return compact_json({"error": str(e)})
+
+
+@tool
+async def get_project_details(project_id: str, config: RunnableConfig) -> str:
+    """Fetch project details including name, description, and status."""
+    try:
+        return fit_to_budget(await fetch_project_details(_get_db(config), project_id))
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return compact_json({"error": str(e)})
+
+
+@tool
+async def get_project_tasks(project_id: str, config: RunnableConfig, page: int = 1) -> str:
+    """
+    Fetch the tasks of a project that are not assigned to the user yet, as a table with
+    one task per line (id|title|status|description). Long task lists are split into
+    pages; the last line then names the next page to request.
+    """
+    try:
+        db = _get_db(config)
+        user_id = config["configurable"].get("user_id")
+        tasks = await fetch_project_tasks(db, project_id)
+        assigned_ids = (await assigned_task_ids(db, [user_id]))[user_id] if user_id else set()
+        return encode_task_table([task for task in tasks if task["id"] not in assigned_ids], page=page)
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return compact_json({"error": str(e)})
+
+
+@tool
+async def get_user_assigned_tasks(user_id: str, config: RunnableConfig) -> str:
+    """Fetch all tasks already assigned to the user (both completed and pending)."""
+    try:
+        # Never cut: a truncated ID list would let already-assigned tasks be recommended
+        return compact_json(await fetch_user_assigned_tasks(_get_db(config), user_id))
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return compact_json({"error": str(e), "assigned_task_ids": [], "completed_task_ids": []})
+
+
+MODE_TOOLS = {
+    TASK_ASSIGNMENT_MODE: [get_user_goals, get_project_details, get_project_tasks, get_user_assigned_tasks],
+    CONVERSATION_MODE: [get_user_goals],
+}
+
+
+class AgentRuntime:
+    """
+    Process-wide agent runtime.
+    Holds the LLM client and one compiled ReAct graph per mode so that a
+    request only has to build its prompt and run config.
+    """
+
+    def __init__(self, llm=None):
+        self.llm = llm if llm is not None else build_llm()
+        self.graphs = {
+            mode: create_react_agent(self.llm, tools)
+            for mode, tools in MODE_TOOLS.items()
+        }
+        print(f"✅ Agent runtime ready ({len(self.graphs)} compiled graphs)")
+
+    def get_graph(self, mode: str):
+        return self.graphs[mode]
+
+
+_runtime = None
+
+
+def get_agent_runtime() -> AgentRuntime:
+    """Return the shared agent runtime, building it on first use."""
+    global _runtime
+    if _runtime is None:
+        _runtime = AgentRuntime()
+    return _runtime
+
+
+class SimpleLearningAgent:
+    """Long-lived agent bound to a database, stored on app.state.agent."""
+
+    def __init__(self, database, runtime: AgentRuntime = None, admission: AdmissionController = None):
+        self.db = database
+        self.runtime = runtime
+        self.flights = SingleFlight()
+        self.admission = admission if admission is not None else AdmissionController.from_env()
+
+    @staticmethod
+    def priority_for(message: str = None) -> int:
+        if is_task_assignment_message(message):
+            return PRIORITY_TASK_ASSIGNMENT
+        return PRIORITY_CONVERSATION
+
+    async def ainvoke(self, user_id: str, message: str = None):
+        """
+        Invoke the agent for a specific user.
+        Concurrent calls with the same (user_id, message) share one agent run,
+        and each run waits for an admission slot before calling the LLM.
+        Raises AgentOverloadedError when the wait queue is full.
+        """
+        return await self.flights.do((user_id, message), lambda: self._run(user_id, message))
+
+    async def _run(self, user_id: str, message: str = None):
+        async with self.admission.slot(self.priority_for(message)):
+            return await run_learning_agent(self.db, user_id, message, runtime=self.runtime)
+
+    async def astream(self, user_id: str, message: str = None):
+        """Stream progress events and tokens for a specific user."""
+        async with self.admission.slot(self.priority_for(message)):
+            async for event in stream_learning_agent(self.db, user_id, message, runtime=self.runtime):
+                yield event
+
+
 def get_learning_agent(db):
     """
     Initialize and return the learning agent.
-    This function exists for compatibility with your existing code.
-    
-    Returns a simple object that can be invoked.
+    Builds the shared runtime eagerly so the first request does not pay for it.
+    If GOOGLE_API_KEY is missing, the runtime is built lazily on first use instead.
     """
+    try:
+        runtime = get_agent_runtime()
+    except ValueError as e:
+        print(f"⚠️ Agent runtime not built at startup: {str(e)}")
+        runtime = None
+
     print("✅ Learning agent initialized")
-    
-    # Return a simple callable that wraps run_learning_agent
-    class SimpleLearningAgent:
-        def __init__(self, database):
-            self.db = database
-        
-        async def ainvoke(self, user_id: str, message: str = None):
-            """Invoke the agent for a specific user."""
-            return await run_learning_agent(self.db, user_id, message)
-    
-    return SimpleLearningAgent(db)
+    return SimpleLearningAgent(db, runtime)
+
+
+def is_task_assignment_message(user_message: str = None) -> bool:
+    """Task assignment mode is triggered by goal-update style messages."""
+    return bool(
+        user_message and
+        ("updated the goals" in user_message.lower() or
+         "share the revised tasks" in user_message.lower() or
+         "share tasks" in user_message.lower())
+    )
 
 
 def parse_json_from_response(response_text: str) -> list:
@@ -115,180 +373,250 @@ def parse_json_from_response(response_text: str) -> list:
         return []
 
 
-@traceable(name="Learning Agent", tags=["agent", "career-guidance"])
-async def run_learning_agent(db, user_id: str, user_message: str = None) -> dict:
+def message_text(message) -> str:
+    """Return the text content of an LLM message, joining Gemini's list content."""
+    content = message.content if hasattr(message, 'content') else str(message)
+
+    # Handle list content from Gemini
+    if isinstance(content, list):
+        content_parts = []
+        for part in content:
+            if isinstance(part, str):
+                content_parts.append(part)
+            elif hasattr(part, 'text'):
+                content_parts.append(part.text)
+            elif isinstance(part, dict) and "text" in part:
+                content_parts.append(part["text"])
+            else:
+                content_parts.append(str(part))
+        content = ''.join(content_parts).strip()
+
+    return content
+
+
+def enrich_tasks(parsed_tasks: list, project_id: str, project_name: str) -> list:
+    """Attach project information to the {id, title} tasks picked by the model."""
+    enriched_tasks = []
+    for task in parsed_tasks:
+        enriched_task = {
+            "taskId": task.get("id"),
+            "taskName": task.get("title"),
+            "projectId": project_id,
+            "projectName": project_name
+        }
+        enriched_tasks.append(enriched_task)
+        print(f"   ✓ {enriched_task['taskName']}")
+    return enriched_tasks
+
+
+def build_ranking_prompts(agent_name: str, goals: list, candidates: list) -> tuple:
+    """Build the single-call ranking prompt over a precomputed candidate set."""
+    goals_text = "\n".join(f"- {goal}" for goal in goals) if goals else "- (no goals set)"
+    # The pool is already bounded by TASK_RETRIEVAL_TOP_K, so every candidate is shown
+    candidates_table = encode_task_table(candidates, columns=("id", "title", "description"), token_budget=None)
+
+    system_prompt = f"""RESPOND WITH ONLY A JSON ARRAY. DO NOT INCLUDE ANY OTHER TEXT.
+
+You are {agent_name}, an expert learning path advisor.
+
+You are given the user's learning goals and a list of CANDIDATE tasks the user has NOT been assigned yet.
+
+STEPS:
+1. Analyze user goals vs the candidate tasks (title + description)
+2. Select exactly {RECOMMENDED_TASK_COUNT} tasks from the candidates
+3. Order them progressively (foundation → intermediate → advanced)
+
+CRITICAL RULES:
+- ONLY use IDs that appear in the candidate list
+- Select exactly {RECOMMENDED_TASK_COUNT} tasks that match user's goals
+
+RESPONSE: Output ONLY this JSON structure with NO other text, NO markdown, NO explanation:
+[
+  {{"id": "actual_task_id", "title": "Actual Task Title"}}
+]"""
+
+    user_prompt = f"""User's Learning Goals:
+{goals_text}
+
+Candidate tasks (one per line: id|title|description):
+{candidates_table}
+
+Return the {RECOMMENDED_TASK_COUNT} best candidates as a JSON array only."""
+
+    return system_prompt, user_prompt
+
+
+async def prefetch_task_candidates(db, user_id: str) -> dict:
     """
-    Agentic learning assistant that:
-    1. Answers career and growth questions conversationally
-    2. Provides personalized task recommendations based on goals
-    3. Handles general career guidance queries
-    
-    Args:
-        db: Database connection
-        user_id: User identifier
-        user_message: Optional message from user. If "Updated the goals. Share the revised tasks.", 
-                     triggers task assignment mode. Otherwise, conversational mode.
+    Fetch everything task-assignment mode needs concurrently and filter out
+    tasks the user already has, so the LLM only sees real candidates.
     """
-    try:
-        print(f"\n{'='*60}")
-        print(f"🚀 Starting learning agent for user: {user_id}")
-        print(f"📝 User message: {user_message}")
-        print(f"{'='*60}\n")
-        
-        # Get agent name for personalized responses
-        agent_doc = await db.agents.find_one({"userId": user_id})
-        agent_name = agent_doc.get("agentName", "Study Buddy") if agent_doc else "Study Buddy"
-        print(f"🤖 Agent name: {agent_name}")
-        
-        # Initialize LLM
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY not found")
-        
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            temperature=0.7,
-            google_api_key=api_key
-        )
-        
-        print("✅ LLM initialized")
-        
-        # Define tools
-        @tool
-        async def get_user_goals(user_id: str) -> dict:
-            """Fetch the learning goals for a specific user."""
-            try:
-                print(f"🔍 Fetching goals for user: {user_id}")
-                goals_doc = await db.goals.find_one({"userId": user_id})
-                if not goals_doc:
-                    return {"goals": [], "message": "No goals set"}
-                
-                goals_data = goals_doc.get("goals", [])
-                print(f"   Raw goals_data type: {type(goals_data)}")
-                print(f"   Raw goals_data: {goals_data}")
-                
-                # Robust parsing - handle any data type
-                goals = []
-                
-                if isinstance(goals_data, list):
-                    for item in goals_data:
-                        if item:
-                            item_str = str(item).strip()
-                            if item_str:
-                                goals.append(item_str)
-                
-                elif isinstance(goals_data, str):
-                    stripped = goals_data.strip()
-                    if stripped:
-                        goals.append(stripped)
-                
-                elif goals_data:
-                    goals.append(str(goals_data))
-                
-                print(f"✅ Parsed {len(goals)} goal(s): {goals}")
-                return {"goals": goals}
-                
-            except Exception as e:
-                print(f"❌ Error in get_user_goals: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return {"error": str(e)}
-        
-        @tool
-        async def get_project_details(project_id: str) -> dict:
-            """Fetch project details including name, description, and status."""
-            try:
-                print(f"🔍 Fetching project: {project_id}")
-                project = await db.projects.find_one({"_id": ObjectId(project_id)})
-                if not project:
-                    return {"error": f"Project {project_id} not found"}
-                
-                result = {
-                    "id": str(project["_id"]),
-                    "name": project.get("name"),
-                    "description": project.get("description", "No description"),
-                    "status": project.get("status")
-                }
-                print(f"✅ Project found: {result['name']}")
-                return result
-            except Exception as e:
-                print(f"❌ Error: {str(e)}")
-                return {"error": str(e)}
-        
-        @tool
-        async def get_project_tasks(project_id: str) -> list:
-            """Fetch all tasks for a specific project."""
-            try:
-                print(f"🔍 Fetching tasks for project: {project_id}")
-                tasks_cursor = db.tasks.find({"project_id": project_id})
-                tasks = await tasks_cursor.to_list(length=None)
-                
-                result = [
-                    {
-                        "id": str(task["_id"]),
-                        "title": task.get("title"),
-                        "description": task.get("description", "No description"),
-                        "status": task.get("status")
-                    }
-                    for task in tasks
-                ]
-                print(f"✅ Found {len(result)} tasks")
-                return result
-            except Exception as e:
-                print(f"❌ Error: {str(e)}")
-                return [{"error": str(e)}]
-        
-        @tool
-        async def get_user_assigned_tasks(user_id: str) -> dict:
-            """Fetch all tasks already assigned to the user (both completed and pending)."""
-            try:
-                print(f"🔍 Fetching assigned tasks for user: {user_id}")
-                assignment = await db.assignments.find_one({"userId": user_id})
-                
-                if not assignment or not assignment.get("tasks"):
-                    print("✅ No tasks assigned to user yet")
-                    return {"assigned_task_ids": [], "completed_task_ids": []}
-                
-                assigned_task_ids = []
-                completed_task_ids = []
-                
-                for task in assignment.get("tasks", []):
-                    task_id = task.get("taskId")
-                    if task_id:
-                        assigned_task_ids.append(task_id)
-                        if task.get("isCompleted", False):
-                            completed_task_ids.append(task_id)
-                
-                print(f"✅ User has {len(assigned_task_ids)} assigned tasks ({len(completed_task_ids)} completed)")
-                return {
-                    "assigned_task_ids": assigned_task_ids,
-                    "completed_task_ids": completed_task_ids
-                }
-            except Exception as e:
-                print(f"❌ Error: {str(e)}")
-                return {"error": str(e), "assigned_task_ids": [], "completed_task_ids": []}
-        
-        # Determine mode based on user message
-        is_task_assignment_mode = (
-            user_message and 
-            ("updated the goals" in user_message.lower() or 
-             "share the revised tasks" in user_message.lower() or
-             "share tasks" in user_message.lower())
-        )
-        
-        if is_task_assignment_mode:
-            print("🎯 MODE: Task Assignment")
-            tools = [get_user_goals, get_project_details, get_project_tasks, get_user_assigned_tasks]
-            
-            system_prompt = f"""RESPOND WITH ONLY A JSON ARRAY. DO NOT INCLUDE ANY OTHER TEXT.
+    project_id = RECOMMENDATION_PROJECT_ID
+
+    goals_result, assigned_result, project, project_tasks = await asyncio.gather(
+        fetch_user_goals(db, user_id),
+        fetch_user_assigned_tasks(db, user_id),
+        fetch_project_details(db, project_id),
+        fetch_project_tasks(db, project_id)
+    )
+
+    goals = goals_result.get("goals", [])
+    assigned_task_ids = assigned_result.get("assigned_task_ids", [])
+    assigned_ids = set(assigned_task_ids)
+    candidates = [task for task in project_tasks if task["id"] not in assigned_ids]
+    print(f"🧮 {len(candidates)} unassigned candidate(s) out of {len(project_tasks)} tasks")
+
+    return {
+        "goals": goals,
+        "candidates": candidates,
+        "fingerprint": recommendation_fingerprint(goals, assigned_task_ids, project_tasks),
+        "project_id": project_id,
+        "project_name": project.get("name") or "Project School"
+    }
+
+
+def retrieve_candidates(goals: list, candidates: list) -> list:
+    """
+    Narrow the candidate set to the TASK_RETRIEVAL_TOP_K tasks most similar to
+    the user's goals using the local task index, best match first. Without
+    goals to match on, the first TASK_RETRIEVAL_TOP_K candidates are kept.
+    """
+    if len(candidates) <= TASK_RETRIEVAL_TOP_K:
+        return candidates
+    if not goals:
+        return candidates[:TASK_RETRIEVAL_TOP_K]
+
+    # Tasks written straight to the database may not be indexed yet
+    for task in candidates:
+        if task["id"] not in task_index:
+            task_index.upsert(task["id"], None, task.get("title"), task.get("description"))
+
+    candidates_by_id = {task["id"]: task for task in candidates}
+    hits = task_index.search(" ".join(goals), k=TASK_RETRIEVAL_TOP_K, candidate_ids=candidates_by_id)
+    if not hits:
+        return candidates[:TASK_RETRIEVAL_TOP_K]
+
+    print(f"🔎 Retrieved top {len(hits)} of {len(candidates)} candidates for ranking")
+    return [candidates_by_id[task_id] for task_id, _ in hits]
+
+
+def select_ranked_tasks(response_text: str, candidates: list) -> list:
+    """Keep only valid, unassigned candidate IDs from the model's ranking, using catalog titles."""
+    candidates_by_id = {task["id"]: task for task in candidates}
+    selected = []
+    seen_ids = set()
+    for task in parse_json_from_response(response_text):
+        task_id = task.get("id") if isinstance(task, dict) else None
+        if task_id in candidates_by_id and task_id not in seen_ids:
+            seen_ids.add(task_id)
+            selected.append({"id": task_id, "title": candidates_by_id[task_id]["title"]})
+    return selected[:RECOMMENDED_TASK_COUNT]
+
+
+# Running totals of LLM token usage across all runs in this process
+token_usage_totals = {"runs": 0, "llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+
+def report_usage(messages: list) -> dict:
+    """Summarize the tokens a run actually used, log them and add them to the process totals."""
+    usage = summarize_usage(messages)
+    token_usage_totals["runs"] += 1
+    for key, value in usage.items():
+        token_usage_totals[key] += value
+    print(f"🧾 Token usage: {usage['input_tokens']} prompt / {usage['output_tokens']} completion "
+          f"across {usage['llm_calls']} LLM call(s)")
+    return usage
+
+
+def task_assignment_result(selected: list, project_id: str, project_name: str, messages: list) -> dict:
+    """Build the task-assignment mode result returned to the chat router."""
+    print(f"📦 Project: {project_name} ({project_id})\n")
+    enriched_tasks = enrich_tasks(selected, project_id, project_name)
+    print(f"\n📤 Returning {len(enriched_tasks)} enriched tasks\n")
+
+    return {
+        "response_text": f"I've selected {len(enriched_tasks)} personalized tasks for your learning path. Here they are:",
+        "status": "success",
+        "tasks": enriched_tasks,
+        "messages": messages,
+        "usage": report_usage(messages)
+    }
+
+
+async def stream_task_assignment_fast_path(db, user_id: str, agent_name: str, runtime: AgentRuntime):
+    """
+    Task-assignment mode without the multi-turn ReAct loop.
+    Fetches goals, assignments, project and catalog concurrently, filters out
+    already-assigned tasks in Python and only calls the LLM once, to rank the
+    remaining candidates. If there are few enough candidates, the LLM is skipped.
+    Yields the same (event, data) tuples as stream_learning_agent, ending with
+    ("result", {...}); run_learning_agent keeps only the result.
+    """
+    yield "tool_start", {"tool": "prefetch_task_candidates", "input": {"user_id": user_id}}
+    prefetched = await prefetch_task_candidates(db, user_id)
+    candidates = prefetched["candidates"]
+    yield "tool_end", {"tool": "prefetch_task_candidates", "candidates": len(candidates)}
+
+    cached = await recommendation_cache.get(prefetched["fingerprint"])
+    if cached is not None:
+        print("⚡ Recommendation cache hit")
+        yield "result", {**cached, "messages": [], "usage": report_usage([])}
+        return
+
+    messages = []
+    if len(candidates) <= RECOMMENDED_TASK_COUNT:
+        print("⚡ Few enough candidates - skipping LLM ranking")
+        selected = [{"id": task["id"], "title": task["title"]} for task in candidates]
+    else:
+        pool = retrieve_candidates(prefetched["goals"], candidates)
+        system_prompt, user_prompt = build_ranking_prompts(agent_name, prefetched["goals"], pool)
+        messages = [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]
+
+        print("🤖 Ranking candidates with a single LLM call...\n")
+        response = None
+        async for chunk in runtime.llm.astream(messages):
+            text = message_text(chunk)
+            if text:
+                yield "token", {"text": text}
+            response = chunk if response is None else response + chunk
+        messages.append(response)
+        selected = select_ranked_tasks(message_text(response), pool)
+
+    result = task_assignment_result(selected, prefetched["project_id"], prefetched["project_name"], messages)
+    if result["tasks"]:
+        await recommendation_cache.set(user_id, prefetched["fingerprint"], result)
+    yield "result", result
+
+
+async def collect_result(events) -> dict:
+    """Drain an agent event stream and return its final ("result", ...) payload."""
+    result = None
+    async for event, data in events:
+        if event == "result":
+            result = data
+    return result
+
+
+async def load_agent_name(db, user_id: str) -> str:
+    """Get agent name for personalized responses."""
+    agent_doc = await profile_cache.get_agent(db, user_id)
+    agent_name = agent_doc.get("agentName", "Study Buddy") if agent_doc else "Study Buddy"
+    print(f"🤖 Agent name: {agent_name}")
+    return agent_name
+
+
+def build_agent_prompts(mode: str, agent_name: str, user_id: str, user_message: str = None) -> tuple:
+    """Build the system and user prompts for a ReAct run in the given mode."""
+    if mode == TASK_ASSIGNMENT_MODE:
+        system_prompt = f"""RESPOND WITH ONLY A JSON ARRAY. DO NOT INCLUDE ANY OTHER TEXT.
 
 You are {agent_name}, an expert learning path advisor.
 
 STEPS:
 1. Use get_user_goals to fetch the user's learning goals
 2. Use get_user_assigned_tasks to fetch tasks already assigned to the user
-3. Use get_project_details for project_id: "695caa41c485455f397017ae"
-4. Use get_project_tasks to fetch ALL tasks from the project
+3. Use get_project_details for project_id: "{RECOMMENDATION_PROJECT_ID}"
+4. Use get_project_tasks to fetch the project's unassigned tasks (request every page it lists)
 5. Filter OUT any tasks whose ID appears in the assigned_task_ids list
 6. From the remaining UNASSIGNED tasks, select exactly 6 tasks
 7. Analyze user goals vs the unassigned tasks (title + description)
@@ -310,17 +638,14 @@ RESPONSE: Output ONLY this JSON structure with NO other text, NO markdown, NO ex
   {{"id": "actual_task_id", "title": "Actual Task Title"}}
 ]"""
 
-            user_prompt = f"""User ID: {user_id}
+        user_prompt = f"""User ID: {user_id}
 
 Respond with ONLY a JSON array. No text before or after. Exactly 6 tasks with id and title fields.
 
 Get goals → Get assigned tasks → Get all project tasks → Filter → Select 6 best → Return JSON array only."""
-            
-        else:
-            print("💬 MODE: Conversational Career Guidance")
-            tools = [get_user_goals]
-            
-            system_prompt = f"""You are {agent_name}, a friendly and knowledgeable career advisor specializing in AI/ML, Data Science, and tech careers.
+
+    else:
+        system_prompt = f"""You are {agent_name}, a friendly and knowledgeable career advisor specializing in AI/ML, Data Science, and tech careers.
 
 YOUR EXPERTISE:
 - Career roadmaps (AI/ML, Data Science, Software Engineering)
@@ -354,103 +679,191 @@ IMPORTANT:
 - Keep responses concise (2-3 paragraphs max)
 - End with a follow-up question to continue the conversation"""
 
-            if user_message:
-                user_prompt = f"""User message: {user_message}
+        if user_message:
+            user_prompt = f"""User message: {user_message}
 
 User ID: {user_id}
 
 Please respond to the user's question. First, fetch their learning goals to provide personalized advice."""
-            else:
-                user_prompt = f"""User ID: {user_id}
+        else:
+            user_prompt = f"""User ID: {user_id}
 
 The user has just updated their goals. Fetch their goals and provide an encouraging welcome message about their learning journey."""
+
+    return system_prompt, user_prompt
+
+
+def build_run_config(db, user_id: str, agent_name: str) -> dict:
+    """Per-request context handed to the shared graphs and their tools."""
+    return {
+        "configurable": {
+            "db": db,
+            "user_id": user_id,
+            "agent_name": agent_name
+        }
+    }
+
+
+async def finish_react_run(db, mode: str, messages: list) -> dict:
+    """Turn the final ReAct message list into the result returned to the chat router."""
+    # Extract final response
+    final_response = message_text(messages[-1])
+    
+    print(f"{'='*60}")
+    print(f"✅ Agent completed successfully")
+    print(f"{'='*60}\n")
+    print(f"Response:\n{final_response}\n")
+    
+    # If task assignment mode, parse JSON and return structured tasks
+    if mode == TASK_ASSIGNMENT_MODE:
+        print(f"\n🔍 TASK ASSIGNMENT MODE - Parsing response")
+        print(f"📝 Raw response text:\n{final_response}\n")
+        
+        parsed_tasks = parse_json_from_response(final_response)
+        print(f"✅ Parsed {len(parsed_tasks)} tasks from agent response\n")
+        
+        # Get project info for response
+        project_id = RECOMMENDATION_PROJECT_ID
+        project_doc = await catalog_cache.get_project(db, project_id)
+        project_name = project_doc.get("name", "Project School") if project_doc else "Project School"
+        
+        return task_assignment_result(parsed_tasks, project_id, project_name, messages)
+    
+    return {
+        "response_text": final_response,
+        "status": "success",
+        "messages": messages,
+        "usage": report_usage(messages)
+    }
+
+
+@traceable(name="Learning Agent", tags=["agent", "career-guidance"])
+async def run_learning_agent(db, user_id: str, user_message: str = None, runtime: AgentRuntime = None) -> dict:
+    """
+    Agentic learning assistant that:
+    1. Answers career and growth questions conversationally
+    2. Provides personalized task recommendations based on goals
+    3. Handles general career guidance queries
+    
+    Args:
+        db: Database connection
+        user_id: User identifier
+        user_message: Optional message from user. If "Updated the goals. Share the revised tasks.", 
+                     triggers task assignment mode. Otherwise, conversational mode.
+        runtime: Optional prebuilt AgentRuntime. Defaults to the shared process-wide runtime.
+    """
+    try:
+        print(f"\n{'='*60}")
+        print(f"🚀 Starting learning agent for user: {user_id}")
+        print(f"📝 User message: {user_message}")
+        print(f"{'='*60}\n")
+        
+        agent_name = await load_agent_name(db, user_id)
+        
+        if runtime is None:
+            runtime = get_agent_runtime()
+        
+        # Determine mode based on user message
+        if is_task_assignment_message(user_message):
+            if TASK_FAST_PATH_ENABLED:
+                print("🎯 MODE: Task Assignment (fast path)")
+                return await collect_result(stream_task_assignment_fast_path(db, user_id, agent_name, runtime))
+            print("🎯 MODE: Task Assignment")
+            mode = TASK_ASSIGNMENT_MODE
+        else:
+            print("💬 MODE: Conversational Career Guidance")
+            mode = CONVERSATION_MODE
         
-        print("🤖 Creating LangGraph ReAct agent...\n")
+        system_prompt, user_prompt = build_agent_prompts(mode, agent_name, user_id, user_message)
         
-        # Create the ReAct agent
-        agent = create_react_agent(llm, tools)
+        # Reuse the compiled graph for this mode; per-request context goes in config
+        agent = runtime.get_graph(mode)
         
-        print("✅ Agent created\n")
         print("📄 Running agent...\n")
         
         # Run the agent
-        result = await agent.ainvoke({
-            "messages": [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-        })
+        result = await agent.ainvoke(
+            {
+                "messages": [
+                    SystemMessage(content=system_prompt),
+                    HumanMessage(content=user_prompt)
+                ]
+            },
+            config=build_run_config(db, user_id, agent_name)
+        )
         
         print("✅ Agent execution completed\n")
         
-        # Extract final response
-        final_message = result["messages"][-1]
-        final_response = final_message.content if hasattr(final_message, 'content') else str(final_message)
+        return await finish_react_run(db, mode, result["messages"])
+        
+    except Exception as e:
+        print(f"\n❌ ERROR: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            "response_text": f"An error occurred: {str(e)}",
+            "status": "error"
+        }
+
+
+async def stream_learning_agent(db, user_id: str, user_message: str = None, runtime: AgentRuntime = None):
+    """
+    Streaming variant of run_learning_agent.
+    Yields (event, data) tuples as the run progresses:
+    - ("mode", {"mode": ...}) once the mode is known
+    - ("tool_start", {"tool": ..., "input": ...}) / ("tool_end", {"tool": ...}) around tool calls
+    - ("token", {"text": ...}) for every model token
+    - ("result", {...}) last, with the same dict run_learning_agent returns
+    """
+    try:
+        agent_name = await load_agent_name(db, user_id)
+        
+        if runtime is None:
+            runtime = get_agent_runtime()
         
-        # Handle list content from Gemini
-        if isinstance(final_response, list):
-            content_parts = []
-            for part in final_response:
-                if isinstance(part, str):
-                    content_parts.append(part)
-                elif hasattr(part, 'text'):
-                    content_parts.append(part.text)
-                else:
-                    content_parts.append(str(part))
-            final_response = ''.join(content_parts).strip()
+        if is_task_assignment_message(user_message) and TASK_FAST_PATH_ENABLED:
+            yield "mode", {"mode": TASK_ASSIGNMENT_MODE}
+            async for event in stream_task_assignment_fast_path(db, user_id, agent_name, runtime):
+                yield event
+            return
         
-        print(f"{'='*60}")
-        print(f"✅ Agent completed successfully")
-        print(f"{'='*60}\n")
-        print(f"Response:\n{final_response}\n")
+        mode = TASK_ASSIGNMENT_MODE if is_task_assignment_message(user_message) else CONVERSATION_MODE
+        yield "mode", {"mode": mode}
         
-        # If task assignment mode, parse JSON and return structured tasks
-        if is_task_assignment_mode:
-            print(f"\n🔍 TASK ASSIGNMENT MODE - Parsing response")
-            print(f"📝 Raw response text:\n{final_response}\n")
-            
-            parsed_tasks = parse_json_from_response(final_response)
-            print(f"✅ Parsed {len(parsed_tasks)} tasks from agent response\n")
-            
-            # Get project info for response
-            project_doc = await db.projects.find_one({"_id": ObjectId("695caa41c485455f397017ae")})
-            project_name = project_doc.get("name", "Project School") if project_doc else "Project School"
-            project_id = "695caa41c485455f397017ae"
-            
-            print(f"📦 Project: {project_name} ({project_id})\n")
-            
-            # Enrich tasks with project information
-            enriched_tasks = []
-            for task in parsed_tasks:
-                enriched_task = {
-                    "taskId": task.get("id"),
-                    "taskName": task.get("title"),
-                    "projectId": project_id,
-                    "projectName": project_name
-                }
-                enriched_tasks.append(enriched_task)
-                print(f"   ✓ {enriched_task['taskName']}")
-            
-            print(f"\n📤 Returning {len(enriched_tasks)} enriched tasks\n")
-            
-            return {
-                "response_text": f"I've selected {len(enriched_tasks)} personalized tasks for your learning path. Here they are:",
-                "status": "success",
-                "tasks": enriched_tasks,
-                "messages": result["messages"]
-            }
-        else:
-            return {
-                "response_text": final_response,
-                "status": "success",
-                "messages": result["messages"]
-            }
+        system_prompt, user_prompt = build_agent_prompts(mode, agent_name, user_id, user_message)
+        agent = runtime.get_graph(mode)
+        
+        final_messages = None
+        async for event in agent.astream_events(
+            {
+                "messages": [
+                    SystemMessage(content=system_prompt),
+                    HumanMessage(content=user_prompt)
+                ]
+            },
+            config=build_run_config(db, user_id, agent_name),
+            version="v2"
+        ):
+            kind = event["event"]
+            if kind == "on_tool_start":
+                yield "tool_start", {"tool": event["name"], "input": event["data"].get("input")}
+            elif kind == "on_tool_end":
+                yield "tool_end", {"tool": event["name"]}
+            elif kind == "on_chat_model_stream":
+                text = message_text(event["data"]["chunk"])
+                if text:
+                    yield "token", {"text": text}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                # End of the top-level graph run carries the final state
+                final_messages = event["data"]["output"]["messages"]
+        
+        yield "result", await finish_react_run(db, mode, final_messages)
         
     except Exception as e:
         print(f"\n❌ ERROR: {str(e)}")
         import traceback
         traceback.print_exc()
-        return {
+        yield "result", {
             "response_text": f"An error occurred: {str(e)}",
             "status": "error"
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,228 @@
+"""
+Pluggable chat model backends for the learning agents.
+
+AGENT_LLM_BACKEND selects the model the agents talk to:
+- "gemini" (default): ChatGoogleGenerativeAI, needs GOOGLE_API_KEY
+- "fake": deterministic offline model, no network or API key
+- "record": Gemini, with every request/response appended to a transcript file
+- "replay": answers from a recorded transcript file, no network or API key
+
+The fake and replay backends let the agents, /chat/agent and the benchmark
+harness run offline, so our own overhead can be measured without model latency.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage, BaseMessage, ToolMessage, message_to_dict, messages_from_dict
+)
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from agents.payloads import estimate_tokens
+
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash-exp"
+DEFAULT_TRANSCRIPT_PATH = "transcripts/agent_llm.jsonl"
+
+_OBJECT_ID_RE = re.compile(r"\b[0-9a-f]{24}\b")
+_USER_ID_RE = re.compile(r"User ID:\s*(\S+)")
+_PROJECT_ID_RE = re.compile(r'project_id:\s*"?([0-9a-f]{24})')
+
+
+def build_gemini(model: str = DEFAULT_GEMINI_MODEL, temperature: float = 0.7):
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY not found")
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        google_api_key=api_key
+    )
+
+
+def build_llm(backend: Optional[str] = None, model: str = DEFAULT_GEMINI_MODEL, temperature: float = 0.7):
+    """Build the chat model selected by AGENT_LLM_BACKEND (or the explicit backend argument)."""
+    backend = (backend or os.getenv("AGENT_LLM_BACKEND", "gemini")).lower()
+    transcript_path = os.getenv("AGENT_LLM_TRANSCRIPTS", DEFAULT_TRANSCRIPT_PATH)
+
+    if backend == "gemini":
+        return build_gemini(model, temperature)
+    if backend == "fake":
+        return FakeChatModel(latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "0")))
+    if backend == "record":
+        return RecordReplayChatModel(inner=build_gemini(model, temperature), path=transcript_path, mode="record")
+    if backend == "replay":
+        return RecordReplayChatModel(path=transcript_path, mode="replay")
+    raise ValueError(f"Unknown AGENT_LLM_BACKEND: {backend}")
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, list):
+        return "".join(part if isinstance(part, str) else str(part.get("text", "")) for part in content)
+    return content or ""
+
+
+def _usage(messages: List[BaseMessage], output: str) -> dict:
+    input_tokens = sum(estimate_tokens(_text(m)) for m in messages)
+    output_tokens = estimate_tokens(output)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic offline stand-in for Gemini.
+
+    With tools bound it calls every tool once, in order, filling user_id and
+    project_id from the prompts, then answers. Prompts asking for a JSON array
+    get the first six task IDs seen in the conversation; anything else gets a
+    fixed conversational reply. latency_ms simulates model time per call.
+    """
+
+    latency_ms: float = 0
+    tool_schemas: List[dict] = []
+    task_count: int = 6
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-learning-agent"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tool_schemas": [convert_to_openai_tool(t)["function"] for t in tools]})
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        called = {m.name for m in messages if isinstance(m, ToolMessage)}
+        prompt = "\n".join(_text(m) for m in messages)
+
+        for schema in self.tool_schemas:
+            if schema["name"] in called:
+                continue
+            args = {}
+            parameters = schema.get("parameters", {})
+            for arg in parameters.get("properties", {}):
+                if arg not in parameters.get("required", []):
+                    continue  # Optional arguments (e.g. page) keep their defaults
+                if arg == "user_id":
+                    match = _USER_ID_RE.search(prompt)
+                    args[arg] = match.group(1) if match else "unknown"
+                elif arg == "project_id":
+                    match = _PROJECT_ID_RE.search(prompt)
+                    args[arg] = match.group(1) if match else ""
+                else:
+                    args[arg] = ""
+            call_id = hashlib.md5(f"{schema['name']}:{len(messages)}".encode()).hexdigest()[:12]
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": schema["name"], "args": args, "id": call_id}],
+                usage_metadata=_usage(messages, json.dumps(args))
+            )
+
+        if "JSON ARRAY" in prompt:
+            # Skip IDs listed as already assigned by the tools
+            assigned = set()
+            for m in messages:
+                if isinstance(m, ToolMessage) and "assigned_task_ids" in _text(m):
+                    assigned.update(_OBJECT_ID_RE.findall(_text(m)))
+            picked = []
+            for line in prompt.splitlines():
+                ids = _OBJECT_ID_RE.findall(line)
+                if "|" in line and ids and ids[0] not in assigned and ids[0] not in [p["id"] for p in picked]:
+                    title = line.split("|")[1] if len(line.split("|")) > 1 else ""
+                    picked.append({"id": ids[0], "title": title})
+            content = json.dumps(picked[:self.task_count])
+        else:
+            content = ("Great question! Based on your goals, focus on fundamentals first, "
+                       "then build a small project to apply them. What would you like to tackle next?")
+
+        return AIMessage(content=content, usage_metadata=_usage(messages, content))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+
+class RecordReplayChatModel(BaseChatModel):
+    """
+    Records real model transcripts to a JSONL file, or replays them offline.
+    Requests are keyed on a hash of the bound tool names and the serialized
+    input messages, so a replayed run must send the same prompts it recorded.
+    """
+
+    mode: str = "replay"
+    path: str = DEFAULT_TRANSCRIPT_PATH
+    inner: Any = None
+    tool_names: List[str] = []
+
+    _transcripts: Optional[dict] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return f"{self.mode}-learning-agent"
+
+    def bind_tools(self, tools, **kwargs):
+        inner = self.inner.bind_tools(tools, **kwargs) if self.inner is not None else None
+        names = [convert_to_openai_tool(t)["function"]["name"] for t in tools]
+        return self.model_copy(update={"inner": inner, "tool_names": names})
+
+    def _key(self, messages: List[BaseMessage]) -> str:
+        payload = {
+            "tools": self.tool_names,
+            "messages": [
+                {"type": m.type, "content": m.content, "tool_calls": getattr(m, "tool_calls", None)}
+                for m in messages
+            ]
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _load(self) -> dict:
+        if self._transcripts is None:
+            transcripts = {}
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            transcripts[entry["key"]] = entry["response"]
+            self._transcripts = transcripts
+        return self._transcripts
+
+    def _replay(self, key: str) -> ChatResult:
+        response = self._load().get(key)
+        if response is None:
+            raise LookupError(f"No recorded response for this prompt (key {key[:12]}) in {self.path}")
+        message = messages_from_dict([response])[0]
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _record(self, key: str, message: BaseMessage) -> ChatResult:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "response": message_to_dict(message)}, default=str) + "\n")
+        self._load()[key] = message_to_dict(message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._key(messages)
+        if self.mode == "replay":
+            return self._replay(key)
+        return self._record(key, self.inner.invoke(messages))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._key(messages)
+        if self.mode == "replay":
+            return self._replay(key)
+        return self._record(key, await self.inner.ainvoke(messages))
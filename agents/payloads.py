@@ -0,0 +1,96 @@
+import json
+import math
+import os
+from typing import Iterable, List, Optional
+
+# Rough token estimate used for budgeting; Gemini averages ~4 characters per token
+CHARS_PER_TOKEN = 4
+
+TOOL_TOKEN_BUDGET = int(os.getenv("AGENT_TOOL_TOKEN_BUDGET", "1500"))
+# Reserved on each task table page for its "more tasks" line
+PAGE_FOOTER_TOKENS = 20
+FIELD_MAX_CHARS = {
+    "title": int(os.getenv("AGENT_TITLE_MAX_CHARS", "80")),
+    "description": int(os.getenv("AGENT_DESCRIPTION_MAX_CHARS", "160")),
+}
+
+# Assignment fields (utils.assignments maps them onto whichever storage layout is active)
+ASSIGNED_TASK_FIELDS = ("taskId", "isCompleted")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def truncate(value, max_chars: Optional[int]) -> str:
+    text = "" if value is None else str(value)
+    text = " ".join(text.split())
+    if max_chars is not None and len(text) > max_chars:
+        return text[:max(0, max_chars - 1)].rstrip() + "…"
+    return text
+
+
+def encode_task_table(
+    tasks: Iterable[dict],
+    columns: tuple = ("id", "title", "status", "description"),
+    token_budget: Optional[int] = TOOL_TOKEN_BUDGET,
+    page: int = 1
+) -> str:
+    """
+    Encode tasks as a compact pipe-separated table instead of repeated JSON keys.
+    Long fields are truncated per FIELD_MAX_CHARS. Rows are split into pages
+    that each fit the token budget and one page is returned; its last line
+    says how many tasks are on the pages after it. With token_budget=None
+    every row is returned, for callers that already bounded the list.
+    """
+    header = "|".join(columns)
+    pages = [[]]
+    used = estimate_tokens(header)
+    for task in tasks:
+        line = "|".join(truncate(task.get(column), FIELD_MAX_CHARS.get(column)).replace("|", "/") for column in columns)
+        cost = estimate_tokens(line) + 1
+        # A page always takes at least one row, and leaves room for the footer
+        if token_budget is not None and pages[-1] and used + cost > token_budget - PAGE_FOOTER_TOKENS:
+            pages.append([])
+            used = estimate_tokens(header)
+        pages[-1].append(line)
+        used += cost
+
+    page = min(max(page, 1), len(pages))
+    lines = [header, *pages[page - 1]]
+    remaining = sum(len(rows) for rows in pages[page:])
+    if remaining:
+        lines.append(f"... {remaining} more task(s); request page {page + 1} of {len(pages)} for the next ones")
+    return "\n".join(lines)
+
+
+def compact_json(payload) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def fit_to_budget(payload, token_budget: int = TOOL_TOKEN_BUDGET) -> str:
+    """
+    Serialize a tool result compactly, cutting it off at the token budget.
+    Only for free-form payloads (goals, project details): lists the model has
+    to act on in full, like assigned task IDs, must not go through here.
+    """
+    text = compact_json(payload)
+    max_chars = token_budget * CHARS_PER_TOKEN
+    if len(text) > max_chars:
+        return text[:max_chars] + "…(truncated)"
+    return text
+
+
+def summarize_usage(messages: List) -> dict:
+    """Sum the token usage reported by the model across every LLM call in a run."""
+    usage = {"llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    for message in messages or []:
+        metadata = getattr(message, "usage_metadata", None)
+        if getattr(message, "type", None) not in ("ai", "AIMessageChunk"):
+            continue
+        usage["llm_calls"] += 1
+        if metadata:
+            usage["input_tokens"] += metadata.get("input_tokens", 0)
+            usage["output_tokens"] += metadata.get("output_tokens", 0)
+            usage["total_tokens"] += metadata.get("total_tokens", 0)
+    return usage
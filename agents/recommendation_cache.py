@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+
+from utils.cache import CacheBackend, build_cache
+
+
+def recommendation_fingerprint(goals: list, assigned_task_ids: list, project_tasks: list) -> str:
+    """
+    Hash of everything a task recommendation depends on: the user's goals,
+    the IDs already assigned to them and the project's task catalog.
+    """
+    payload = {
+        "goals": goals,
+        "assigned": sorted(assigned_task_ids),
+        "catalog": sorted(
+            [task["id"], task.get("title"), task.get("description"), task.get("status")]
+            for task in project_tasks
+        )
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class RecommendationCache:
+    """
+    Task-assignment results keyed on recommendation_fingerprint.
+    The fingerprint already changes whenever an input changes; explicit
+    invalidation on writes drops entries that can no longer be hit.
+    The fingerprints computed for each user are kept in the cache too, so
+    any worker can invalidate a user's entries.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self._entries = backend
+
+    async def get(self, fingerprint: str):
+        return await self._entries.get(f"result:{fingerprint}")
+
+    async def set(self, user_id: str, fingerprint: str, result: dict):
+        # Never cache the LLM message objects, only the response the router needs
+        cached = {k: v for k, v in result.items() if k != "messages"}
+        fingerprints = await self._entries.get(f"user:{user_id}") or []
+        await self._entries.set_many({
+            f"result:{fingerprint}": cached,
+            f"user:{user_id}": sorted(set(fingerprints) | {fingerprint})
+        })
+
+    async def invalidate_user(self, user_id: str):
+        """Drop entries computed for a user after their goals or assignments change."""
+        fingerprints = await self._entries.get(f"user:{user_id}") or []
+        await self._entries.delete(f"user:{user_id}", *[f"result:{fingerprint}" for fingerprint in fingerprints])
+
+    async def invalidate_catalog(self):
+        """Drop every entry after a task is created or updated."""
+        await self._entries.clear()
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+
+recommendation_cache = RecommendationCache(
+    build_cache(
+        "recommendations",
+        maxsize=int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "1024")),
+        ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", "600"))
+    )
+)
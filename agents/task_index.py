@@ -0,0 +1,149 @@
+import os
+import re
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "with", "your", "you",
+    "i", "me", "my", "we", "our", "want", "learn", "learning", "how", "using", "use"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+class TaskIndex:
+    """
+    In-process TF-IDF retrieval index over task title + description.
+
+    Terms are hashed into a fixed number of dimensions, so adding or updating a
+    task only touches its own row and the document-frequency vector; IDF
+    weights are applied at query time. No network or model downloads.
+    """
+
+    def __init__(self, dimensions: int = 1024):
+        self.dimensions = dimensions
+        self._tf = np.zeros((0, dimensions), dtype=np.float32)
+        self._df = np.zeros(dimensions, dtype=np.float32)
+        self._row_by_id = {}
+        self._ids = []
+        self._projects = []
+        self._free_rows = []
+        self.ready = False
+
+    def _vectorize(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode("utf-8")) % self.dimensions] += 1.0
+        # Sublinear term frequency
+        return np.log1p(vector)
+
+    @staticmethod
+    def _task_text(task: dict) -> str:
+        # Titles are short and precise; count them twice against descriptions
+        title = task.get("title") or ""
+        return f"{title} {title} {task.get('description') or ''}"
+
+    def _allocate_row(self) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = len(self._ids)
+        if row >= self._tf.shape[0]:
+            grown = np.zeros((max(16, self._tf.shape[0] * 2), self.dimensions), dtype=np.float32)
+            grown[:self._tf.shape[0]] = self._tf
+            self._tf = grown
+        self._ids.append(None)
+        self._projects.append(None)
+        return row
+
+    def upsert(self, task_id: str, project_id: Optional[str], title: str, description: Optional[str] = None):
+        """Add a task or refresh it after its title/description changed."""
+        vector = self._vectorize(self._task_text({"title": title, "description": description}))
+
+        row = self._row_by_id.get(task_id)
+        if row is None:
+            row = self._allocate_row()
+            self._row_by_id[task_id] = row
+            self._ids[row] = task_id
+        else:
+            self._df -= self._tf[row] > 0
+
+        self._tf[row] = vector
+        self._df += vector > 0
+        if project_id is not None:
+            self._projects[row] = project_id
+
+    def upsert_document(self, task: dict):
+        """Index a task document as stored in the tasks collection."""
+        self.upsert(str(task["_id"]), task.get("project_id"), task.get("title"), task.get("description"))
+
+    def remove(self, task_id: str):
+        row = self._row_by_id.pop(task_id, None)
+        if row is None:
+            return
+        self._df -= self._tf[row] > 0
+        self._tf[row] = 0
+        self._ids[row] = None
+        self._projects[row] = None
+        self._free_rows.append(row)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._row_by_id
+
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+
+    async def build(self, db):
+        """Load every task from the database. Called once at startup."""
+        cursor = db.tasks.find({}, {"title": 1, "description": 1, "project_id": 1})
+        async for task in cursor:
+            self.upsert_document(task)
+        self.ready = True
+        print(f"✅ Task index built ({len(self)} tasks, {self.dimensions} dims)")
+
+    def search(
+        self,
+        query: str,
+        k: int = 20,
+        candidate_ids: Optional[Iterable[str]] = None,
+        project_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Return up to k (task_id, score) pairs ranked by cosine similarity to the query.
+        Restrict to candidate_ids and/or project_id when given.
+        """
+        if candidate_ids is not None:
+            rows = [self._row_by_id[t] for t in candidate_ids if t in self._row_by_id]
+        else:
+            rows = [r for r, t in enumerate(self._ids) if t is not None]
+        if project_id is not None:
+            rows = [r for r in rows if self._projects[r] == project_id]
+        if not rows:
+            return []
+
+        n_docs = len(self._row_by_id)
+        idf = np.log((1.0 + n_docs) / (1.0 + self._df)) + 1.0
+
+        query_vector = self._vectorize(query) * idf
+        query_norm = np.linalg.norm(query_vector)
+        if query_norm == 0:
+            return []
+
+        rows = np.asarray(rows)
+        weighted = self._tf[rows] * idf
+        norms = np.linalg.norm(weighted, axis=1)
+        norms[norms == 0] = 1.0
+        scores = (weighted @ query_vector) / (norms * query_norm)
+
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._ids[rows[i]], float(scores[i])) for i in top]
+
+
+task_index = TaskIndex(dimensions=int(os.getenv("TASK_INDEX_DIMENSIONS", "1024")))
@@ -0,0 +1,153 @@
+"""
+End-to-end /chat/agent benchmark against an offline LLM backend.
+
+Seeds a local MongoDB with one recommendation project, its tasks and a goals
+document per simulated user, then sends N concurrent POST /chat/agent requests
+through the real FastAPI app (lifespan, router, agent, tool DB calls, parsing
+and chat persistence). The model is the "fake" backend by default, or
+"replay" to answer from transcripts recorded with AGENT_LLM_BACKEND=record,
+so the numbers are our own overhead rather than Gemini latency.
+
+Requires MONGODB_URL (default mongodb://localhost:27017). The benchmark uses
+its own database (default "agent_bench") and drops it first.
+
+Usage:
+    python benchmarks/bench_agent.py --sessions 200 --concurrency 20
+    python benchmarks/bench_agent.py --mode chat --llm-latency-ms 300
+    python benchmarks/bench_agent.py --react        # ReAct tool loop instead of the fast path
+    python benchmarks/bench_agent.py --backend replay
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+warnings.filterwarnings("ignore", message=".*create_react_agent.*")
+
+TOPICS = [
+    ("Python basics", "Variables, loops and functions in Python"),
+    ("REST APIs", "Design and build HTTP endpoints with FastAPI"),
+    ("MongoDB queries", "Filters, projections and indexes in MongoDB"),
+    ("Async IO", "Coroutines, tasks and the event loop"),
+    ("Testing", "Unit and integration tests with pytest"),
+    ("Docker", "Containerize a Python web service"),
+    ("Git workflow", "Branches, rebases and pull requests"),
+    ("Data modeling", "Embedding versus referencing documents"),
+    ("Caching", "TTL caches and invalidation strategies"),
+    ("Observability", "Logging, metrics and tracing basics"),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100, help="total agent requests to send")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight at once")
+    parser.add_argument("--mode", choices=["tasks", "chat"], default="tasks",
+                        help="tasks: task assignment after a goal update; chat: conversation mode")
+    parser.add_argument("--backend", choices=["fake", "replay"], default="fake")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated latency per fake LLM call")
+    parser.add_argument("--tasks", type=int, default=40, help="tasks seeded in the recommendation project")
+    parser.add_argument("--react", action="store_true", help="disable the task-assignment fast path")
+    parser.add_argument("--database", default="agent_bench")
+    return parser.parse_args()
+
+
+async def seed(db, project_id: str, task_count: int, user_count: int):
+    from bson import ObjectId
+
+    await db.projects.insert_one({
+        "_id": ObjectId(project_id),
+        "name": "Benchmark Learning Path",
+        "description": "Seeded by benchmarks/bench_agent.py",
+        "status": "active"
+    })
+    await db.tasks.insert_many([
+        {
+            "project_id": project_id,
+            "title": f"{TOPICS[i % len(TOPICS)][0]} #{i}",
+            "description": TOPICS[i % len(TOPICS)][1],
+            "status": "todo"
+        }
+        for i in range(task_count)
+    ])
+    # Distinct goals per user so task recommendations are not served from cache
+    await db.goals.insert_many([
+        {"userId": f"bench_user_{u}", "goals": [f"Learn {TOPICS[u % len(TOPICS)][0]} for project {u}"]}
+        for u in range(user_count)
+    ])
+
+
+def percentile(ordered: list, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def run(args):
+    os.environ["AGENT_LLM_BACKEND"] = args.backend
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["DATABASE_NAME"] = args.database
+    os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+    if args.react:
+        os.environ["AGENT_TASK_FAST_PATH"] = "false"
+
+    import httpx
+    from main import app
+    from agents.learning_agent import RECOMMENDATION_PROJECT_ID
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGODB_URL"])
+    await client.drop_database(args.database)
+    await seed(client[args.database], RECOMMENDATION_PROJECT_ID, args.tasks, args.sessions)
+
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    if args.mode == "tasks":
+        message = "I have updated the goals, please share the revised tasks"
+    else:
+        message = "How should I structure my week of study?"
+
+    # The app logs every step; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+
+                async def session(n: int):
+                    async with semaphore:
+                        start = time.perf_counter()
+                        response = await http.post("/chat/agent", json={"userId": f"bench_user_{n}", "message": message})
+                        latencies.append((time.perf_counter() - start) * 1000)
+                        body = response.json() if response.status_code == 200 else {}
+                        key = f"{response.status_code}/{body.get('status', '-')}"
+                        statuses[key] = statuses.get(key, 0) + 1
+
+                started = time.perf_counter()
+                await asyncio.gather(*(session(n) for n in range(args.sessions)))
+                elapsed = time.perf_counter() - started
+
+                metrics = (await http.get("/chat/agent/metrics")).json()
+
+    await client.drop_database(args.database)
+    client.close()
+
+    ordered = sorted(latencies)
+    path = "react" if args.react else "fast path"
+    print(f"/chat/agent {args.mode} mode ({path}), backend={args.backend}, "
+          f"llm latency={args.llm_latency_ms:g} ms, {args.tasks} project tasks")
+    print(f"sessions={args.sessions} concurrency={args.concurrency} wall={elapsed:.2f} s")
+    print(f"throughput={args.sessions / elapsed:8.1f} req/s")
+    print(f"latency    mean={statistics.mean(ordered):8.1f} ms  p50={percentile(ordered, 0.50):8.1f} ms  "
+          f"p95={percentile(ordered, 0.95):8.1f} ms  p99={percentile(ordered, 0.99):8.1f} ms")
+    print(f"responses  {statuses}")
+    print(f"token usage {metrics.get('token_usage')}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,105 @@
+"""
+Per-request agent setup cost: before vs after the persistent agent runtime.
+
+"Before" reproduces what run_learning_agent used to do on every /chat/agent
+call: build a ChatGoogleGenerativeAI client, redefine the tool closures and
+compile a ReAct graph. "After" is what a request does now: look up the
+precompiled graph for its mode and build the per-request run config.
+
+No model calls are made, so no real API key is needed.
+
+Usage:
+    python benchmarks/bench_agent_setup.py [iterations]
+"""
+
+import os
+import sys
+import time
+import statistics
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder-key")
+warnings.filterwarnings("ignore", message=".*create_react_agent.*")
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.tools import tool
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langgraph.prebuilt import create_react_agent
+
+from agents.learning_agent import AgentRuntime, TASK_ASSIGNMENT_MODE
+
+
+def setup_before(db=None):
+    """Per-request setup as it was done before the runtime was introduced."""
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash-exp",
+        temperature=0.7,
+        google_api_key=os.getenv("GOOGLE_API_KEY")
+    )
+
+    @tool
+    async def get_user_goals(user_id: str) -> dict:
+        """Fetch the learning goals for a specific user."""
+        return await db.goals.find_one({"userId": user_id})
+
+    @tool
+    async def get_project_details(project_id: str) -> dict:
+        """Fetch project details including name, description, and status."""
+        return await db.projects.find_one({"_id": project_id})
+
+    @tool
+    async def get_project_tasks(project_id: str) -> list:
+        """Fetch all tasks for a specific project."""
+        return await db.tasks.find({"project_id": project_id}).to_list(length=None)
+
+    @tool
+    async def get_user_assigned_tasks(user_id: str) -> dict:
+        """Fetch all tasks already assigned to the user (both completed and pending)."""
+        return await db.assignments.find_one({"userId": user_id})
+
+    tools = [get_user_goals, get_project_details, get_project_tasks, get_user_assigned_tasks]
+    agent = create_react_agent(llm, tools)
+    messages = [SystemMessage(content="system"), HumanMessage(content="user")]
+    return agent, messages
+
+
+def setup_after(runtime: AgentRuntime, db=None):
+    """Per-request setup with the shared runtime."""
+    agent = runtime.get_graph(TASK_ASSIGNMENT_MODE)
+    messages = [SystemMessage(content="system"), HumanMessage(content="user")]
+    config = {"configurable": {"db": db, "user_id": "bench_user", "agent_name": "Study Buddy"}}
+    return agent, messages, config
+
+
+def measure(fn, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: list):
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{label:<8} mean={statistics.mean(timings):9.3f} ms  "
+          f"p50={statistics.median(timings):9.3f} ms  p95={p95:9.3f} ms")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    start = time.perf_counter()
+    runtime = AgentRuntime()
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    before = measure(setup_before, iterations)
+    after = measure(lambda: setup_after(runtime), iterations)
+
+    print(f"Per-request agent setup over {iterations} iterations")
+    report("before", before)
+    report("after", after)
+    print(f"One-time runtime build at startup: {startup_ms:.3f} ms")
+    print(f"Speedup (p50): {statistics.median(before) / max(statistics.median(after), 1e-9):.0f}x")
@@ -0,0 +1,118 @@
+"""
+Assignment update latency as a user's comment history grows: embedded vs split.
+
+For each comment count, seeds one user with TASKS assignments carrying that
+many comments each, in both storage layouts (see utils/assignments.py), then
+times the two hot writes: toggling isCompleted and adding a comment. In the
+embedded layout both rewrite the user's whole assignment document; in the
+split layout they touch one user_tasks row (plus one task_comments insert).
+
+Requires MONGODB_URL (default mongodb://localhost:27017). The benchmark uses
+its own database (default "assignment_updates_bench") and drops it when done.
+
+Usage:
+    python benchmarks/bench_assignment_updates.py [comment counts] [iterations]
+    python benchmarks/bench_assignment_updates.py 0,100,1000,5000 200
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bson import BSON, ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from utils import assignments
+from utils.indexes import INDEXES, apply_indexes
+
+USER_ID = "bench_commenter"
+TASKS = int(os.getenv("BENCH_TASKS", "20"))
+
+
+def build_assignments(comments_per_task: int) -> list:
+    start = datetime(2026, 1, 1)
+    return [
+        {
+            "taskId": str(ObjectId()),
+            "assignedBy": "admin",
+            "sequenceId": i,
+            "isCompleted": False,
+            "comments": [
+                {"comment": f"Progress note {c} on task {i}", "commentBy": "user", "createdAt": start + timedelta(seconds=c)}
+                for c in range(comments_per_task)
+            ]
+        }
+        for i in range(TASKS)
+    ]
+
+
+async def seed(db, task_assignments: list):
+    await db.assignments.delete_many({})
+    await db.user_tasks.delete_many({})
+    await db.task_comments.delete_many({})
+
+    result = await db.assignments.insert_one({"userId": USER_ID, "tasks": task_assignments})
+    # The migration path is the seeding path for the split layout
+    await assignments.migrate_user(db, {"_id": result.inserted_id, "userId": USER_ID, "tasks": task_assignments})
+
+
+async def measure(layout: str, db, task_ids: list, iterations: int) -> dict:
+    assignments.ASSIGNMENTS_STORAGE = layout
+    timings = {"complete": [], "comment": []}
+    for i in range(iterations):
+        task_id = task_ids[i % len(task_ids)]
+
+        start = time.perf_counter()
+        await assignments.update_assignment(db, USER_ID, task_id, {"isCompleted": i % 2 == 0})
+        timings["complete"].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await assignments.add_comment(db, USER_ID, task_id, {
+            "comment": f"Bench comment {i}", "commentBy": "user", "createdAt": datetime.now()
+        })
+        timings["comment"].append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def percentile(timings: list, q: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def main(comment_counts: list, iterations: int):
+    database = os.getenv("BENCH_DATABASE_NAME", "assignment_updates_bench")
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    await client.drop_database(database)
+    db = client[database]
+
+    try:
+        await apply_indexes(db, {name: INDEXES[name] for name in ("assignments", "user_tasks", "task_comments")})
+        print(f"{TASKS} tasks per user, {iterations} iterations per write")
+        print(f"{'comments/task':>13} {'doc size':>10} {'layout':<9} {'write':<9} {'p50 ms':>8} {'p95 ms':>8}")
+
+        for comments_per_task in comment_counts:
+            task_assignments = build_assignments(comments_per_task)
+            doc_size = len(BSON.encode({"userId": USER_ID, "tasks": task_assignments}))
+            task_ids = [t["taskId"] for t in task_assignments]
+
+            for layout in ("embedded", "split"):
+                # Fresh data per layout, so comments added by the previous run don't count
+                await seed(db, task_assignments)
+                timings = await measure(layout, db, task_ids, iterations)
+                for write, values in timings.items():
+                    print(f"{comments_per_task:>13} {doc_size / 1024:>8.0f}KB {layout:<9} {write:<9} "
+                          f"{statistics.median(values):>8.3f} {percentile(values, 0.95):>8.3f}")
+    finally:
+        await client.drop_database(database)
+        client.close()
+
+
+if __name__ == "__main__":
+    counts = [int(c) for c in sys.argv[1].split(",")] if len(sys.argv) > 1 else [0, 100, 1000, 5000]
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(counts, iterations))
@@ -0,0 +1,154 @@
+"""
+GET /tasks/user/{user_id} with a long assignment history: before vs after.
+
+"Before" reproduces the old per-assignment loop (one tasks.find_one and one
+projects.find_one per entry, 2N+1 round trips). "After" is the batched
+lookup the endpoint uses now (assignment + one $in query for tasks + one for
+their distinct projects), measured with the catalog cache disabled and then
+with a warm cache.
+
+Requires MONGODB_URL (default mongodb://localhost:27017). The benchmark uses
+its own database (default "user_tasks_bench") and drops it when done.
+
+Usage:
+    python benchmarks/bench_user_tasks.py [assignments] [iterations]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from models import TaskResponse
+from routers.tasks import build_task_responses
+from utils.catalog_cache import catalog_cache
+
+USER_ID = "bench_power_user"
+PROJECT_COUNT = 20
+
+
+async def seed(db, assignments: int):
+    projects = await db.projects.insert_many([
+        {"name": f"Project {p}", "description": "Seeded by bench_user_tasks.py", "status": "active"}
+        for p in range(PROJECT_COUNT)
+    ])
+    project_ids = [str(pid) for pid in projects.inserted_ids]
+
+    tasks = await db.tasks.insert_many([
+        {
+            "project_id": project_ids[i % PROJECT_COUNT],
+            "title": f"Task {i}",
+            "description": f"Description for task {i}",
+            "status": "pending"
+        }
+        for i in range(assignments)
+    ])
+
+    await db.assignments.insert_one({
+        "userId": USER_ID,
+        "tasks": [
+            {
+                "taskId": str(task_id),
+                "assignedBy": "admin",
+                "sequenceId": i,
+                "isCompleted": i % 3 == 0,
+                "comments": []
+            }
+            for i, task_id in enumerate(tasks.inserted_ids)
+        ]
+    })
+
+
+async def get_user_tasks_before(db, user_id: str) -> list:
+    """The endpoint as it was: two lookups per assignment."""
+    assignment = await db.assignments.find_one({"userId": user_id})
+    if not assignment or not assignment.get("tasks"):
+        return []
+
+    response_tasks = []
+    for task_assignment in assignment["tasks"]:
+        task_id = task_assignment["taskId"]
+        if not ObjectId.is_valid(task_id):
+            continue
+        task = await db.tasks.find_one({"_id": ObjectId(task_id)})
+        if not task:
+            continue
+        project = await db.projects.find_one({"_id": ObjectId(task["project_id"])})
+        if not project:
+            continue
+        response_tasks.append(TaskResponse(
+            taskId=task_id,
+            name=task.get("title", ""),
+            description=task.get("description"),
+            projectId=task["project_id"],
+            projectName=project.get("name", ""),
+            assignedBy=task_assignment.get("assignedBy", "admin"),
+            sequenceId=task_assignment.get("sequenceId"),
+            isCompleted=task_assignment.get("isCompleted", False),
+            comments=task_assignment.get("comments", [])
+        ))
+    return response_tasks
+
+
+async def get_user_tasks_after(db, user_id: str) -> list:
+    """The endpoint as it is now."""
+    assignment = await db.assignments.find_one({"userId": user_id})
+    if not assignment or not assignment.get("tasks"):
+        return []
+    return await build_task_responses(db, assignment["tasks"])
+
+
+async def measure(fn, db, iterations: int) -> tuple:
+    timings = []
+    result = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = await fn(db, USER_ID)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result
+
+
+def report(label: str, timings: list):
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{label:<8} mean={statistics.mean(timings):9.3f} ms  "
+          f"p50={statistics.median(timings):9.3f} ms  p95={p95:9.3f} ms")
+
+
+async def main(assignments: int, iterations: int):
+    database = os.getenv("BENCH_DATABASE_NAME", "user_tasks_bench")
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    await client.drop_database(database)
+    db = client[database]
+
+    try:
+        await seed(db, assignments)
+
+        before, before_result = await measure(get_user_tasks_before, db, iterations)
+        catalog_cache.enabled = False
+        after, after_result = await measure(get_user_tasks_after, db, iterations)
+        catalog_cache.enabled = True
+        cached, cached_result = await measure(get_user_tasks_after, db, iterations)
+        assert [t.model_dump() for t in before_result] == [t.model_dump() for t in after_result]
+        assert [t.model_dump() for t in after_result] == [t.model_dump() for t in cached_result]
+
+        print(f"GET /tasks/user/{{user_id}} with {assignments} assignments over {iterations} iterations")
+        report("before", before)
+        report("after", after)
+        report("cached", cached)
+        print(f"Speedup (p50): {statistics.median(before) / max(statistics.median(after), 1e-9):.1f}x")
+    finally:
+        await client.drop_database(database)
+        client.close()
+
+
+if __name__ == "__main__":
+    assignments = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(assignments, iterations))
@@ -0,0 +1,101 @@
+"""
+MongoDB round trips per write endpoint.
+
+Drives each endpoint through the FastAPI app and counts the database
+commands it issues using pymongo command monitoring. Prints one line per
+endpoint and exits non-zero if any endpoint's count differs from the
+expected one. tests/test_round_trips.py pins the same counts without a
+server.
+
+Requires MONGODB_URL (default mongodb://localhost:27017). The script uses
+its own database (default "round_trips_bench") and drops it when done.
+
+Usage:
+    python benchmarks/count_round_trips.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("AGENT_LLM_BACKEND", "fake")
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+# Driver housekeeping that is not a round trip made by the endpoint
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue"}
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def main():
+    from main import app
+    from agents.learning_agent import get_learning_agent
+
+    database = os.getenv("BENCH_DATABASE_NAME", "round_trips_bench")
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"), event_listeners=[counter])
+    await client.drop_database(database)
+    db = client[database]
+
+    app.state.db = db
+    app.state.agent = get_learning_agent(db)
+
+    transport = httpx.ASGITransport(app=app)
+    failures = 0
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+
+        async def check(label: str, expected: int, method: str, url: str, **kwargs) -> dict:
+            nonlocal failures
+            counter.commands.clear()
+            response = await http.request(method, url, **kwargs)
+            used = len(counter.commands)
+            ok = response.status_code < 400 and used == expected
+            failures += not ok
+            print(f"{'ok ' if ok else 'FAIL'} {label:<46} {used} round trip(s) (expected {expected}) "
+                  f"[{', '.join(counter.commands)}] -> {response.status_code}")
+            return response.json()
+
+        project = await check("POST /projects/", 1, "POST", "/projects/", json={"name": "Round trips"})
+        task = await check("POST /tasks/", 1, "POST", "/tasks/", json={"project_id": project["id"], "title": "First task"})
+        await check("PUT /tasks/{task_id}", 1, "PUT", f"/tasks/{task['id']}", json={"status": "in_progress"})
+        await check("POST /goals/", 1, "POST", "/goals/", json={"userId": "rt_user", "goals": "Learn MongoDB"})
+        await check("POST /goals/manage-goals", 1, "POST", "/goals/manage-goals", json={"userId": "rt_user", "goals": "Learn FastAPI"})
+        await check("POST /chat/manage-agent", 1, "POST", "/chat/manage-agent", json={"userId": "rt_user", "agentName": "Coach"})
+        await check("POST /chat/agent (name update)", 1, "POST", "/chat/agent",
+                    json={"userId": "rt_user", "message": "Updated the name of the agent to Coach"})
+
+        # Assignment set-up, not measured against a target
+        await http.post("/tasks/user-tasks", json={"userId": "rt_user", "taskId": task["id"]})
+
+        await check("POST /tasks/task-comments", 1, "POST", "/tasks/task-comments",
+                    json={"userId": "rt_user", "taskId": task["id"], "comment": "Started"})
+        await check("POST /tasks/update-task-completion-status", 1, "POST", "/tasks/update-task-completion-status",
+                    json={"userId": "rt_user", "taskId": task["id"], "isCompleted": True})
+        await check("POST /tasks/delete-user-task", 1, "POST", "/tasks/delete-user-task",
+                    json={"userId": "rt_user", "taskId": task["id"]})
+
+    await client.drop_database(database)
+    client.close()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
@@ -1,4 +1,5 @@
 import os
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -7,6 +8,15 @@ from dotenv import load_dotenv
 
 from routers import projects, chat, goals, tasks
 from agents.learning_agent import get_learning_agent
+from agents.jobs import get_job_queue
+from agents.task_index import task_index
+from agents.recommendation_cache import recommendation_cache
+from utils.catalog_cache import catalog_cache
+from utils.profile_cache import profile_cache
+from utils.cache import start_caches, stop_caches
+from utils.change_watcher import CHANGE_WATCHER_ENABLED, ChangeWatcher
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.indexes import apply_indexes
 
 load_dotenv()
 
@@ -18,23 +28,37 @@ async def lifespan(app: FastAPI):
     db = client[os.getenv("DATABASE_NAME", "projects")]
     app.state.db = db
 
+    # Cross-worker invalidation listeners (no-op for CACHE_BACKEND=memory)
+    await start_caches()
+
     # Initialize Agent
     app.state.agent = get_learning_agent(db)
 
-    # Indexes
-    await db.chats.create_index([("userId", 1), ("timestamp", 1)])
-    
-    # Create unique index on agents collection to prevent duplicate userId entries
-    print("🔧 Creating unique index on agents.userId...")
-    try:
-        await db.agents.create_index([("userId", 1)], unique=True)
-        print("✅ Unique index on agents.userId created successfully")
-    except Exception as e:
-        # Index might already exist, that's okay
-        print(f"ℹ️  Agents index: {str(e)}")
+    # Local retrieval index over task titles/descriptions for goal matching
+    await task_index.build(db)
+
+    # Background workers for /chat/agent?async=true
+    app.state.jobs = get_job_queue(
+        db, handler=lambda user_id, message: chat.run_agent_reply(app.state, user_id, message)
+    )
+
+    # Indexes from the registry, built in the background so startup is not blocked
+    app.state.index_build = asyncio.create_task(apply_indexes(db))
+
+    # Evict cached documents changed outside this worker (optional)
+    app.state.change_watcher = ChangeWatcher(db) if CHANGE_WATCHER_ENABLED else None
+    if app.state.change_watcher:
+        await app.state.change_watcher.start()
+
+    await app.state.jobs.start()
 
     print("🚀 API and Agent Ready")
     yield
+    await app.state.jobs.stop()
+    if app.state.change_watcher:
+        await app.state.change_watcher.stop()
+    app.state.index_build.cancel()
+    await stop_caches()
     client.close()
 
 
@@ -45,6 +69,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include Routers
@@ -59,6 +84,18 @@ async def health():
     return {"status": "healthy", "timestamp": "2026-01-12T12:00:00Z"}
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss/eviction counters for the caches, plus the change watcher's state."""
+    change_watcher = getattr(app.state, "change_watcher", None)
+    return {
+        "catalog": catalog_cache.stats(),
+        "profiles": profile_cache.stats(),
+        "recommendations": recommendation_cache.stats(),
+        "change_watcher": change_watcher.stats() if change_watcher else {"mode": "disabled"}
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -32,6 +32,7 @@ class TaskAssignment(BaseModel):
     taskId: str
     assignedBy: Literal["user", "admin"] = "admin"
     sequenceId: Optional[int] = None
+    rank: Optional[str] = None  # fractional ordering key, see utils/ranking.py
     isCompleted: bool = False
     comments: List[Comment] = Field(default_factory=list)
 
@@ -52,6 +53,7 @@ class TaskResponse(BaseModel):
     projectName: str
     assignedBy: Literal["user", "admin"]
     sequenceId: Optional[int] = None
+    rank: Optional[str] = None
     isCompleted: bool
     comments: List[Comment] = Field(default_factory=list)
 
@@ -1,13 +1,29 @@
-from fastapi import APIRouter, Request, Body, HTTPException
+from fastapi import APIRouter, Request, Body, HTTPException, Query
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from datetime import datetime
 from models import Chat
-from agents.learning_agent import run_learning_agent, handle_agent_name_update
+from agents.learning_agent import handle_agent_name_update, token_usage_totals
+from agents.admission import AgentOverloadedError
+from agents.jobs import TERMINAL_STATES
 from bson import ObjectId
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
+from utils.concurrency import SingleFlight
+from utils.profile_cache import profile_cache
+from utils.repository import insert_document, now_ms, upsert_and_fetch
+from utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, keyset_filter
+import json
+import os
 
 router = APIRouter()
 
+# Double-fired /chat/agent requests (retries, second tab) share one reply
+agent_reply_flights = SingleFlight()
+
+# Cursor batch size for streamed chat history and exports
+CHAT_EXPORT_BATCH_SIZE = int(os.getenv("CHAT_EXPORT_BATCH_SIZE", "500"))
+
 
 class AgentRequest(BaseModel):
     """Simplified request model for agent endpoint"""
@@ -83,14 +99,57 @@ def parse_agent_response_to_tasks(response_text: str) -> List[Dict[str, Any]]:
     return tasks
 
 
+def _agent_reply(result: dict) -> tuple:
+    """Extract (response text, status, tasks) from an agent result for the UI."""
+    agent_response = result.get("response_text", "I couldn't process your request.")
+    status = result.get("status", "error")
+    
+    # Parse the response to extract tasks only if it looks like a task list
+    print("🔍 Parsing response for tasks...")
+    if _is_task_list_response(agent_response):
+        tasks = parse_agent_response_to_tasks(agent_response)
+        print(f"✅ Extracted {len(tasks)} tasks from response")
+    else:
+        tasks = []
+        print("ℹ️ Response is conversational (no tasks to extract)")
+    
+    return agent_response, status, tasks
+
+
+async def _store_agent_chat(db, user_id: str, agent_response: str) -> dict:
+    """Store agent chat in database and return the serialized document."""
+    agent_chat_doc = {
+        "userId": user_id,
+        "userType": "agent",
+        "message": agent_response,
+        "timestamp": now_ms()
+    }
+
+    created_chat = await insert_document(db.chats, agent_chat_doc)
+    print(f"💾 Stored agent response in chat history")
+
+    return serialize(created_chat)
+
+
+def _is_name_update_message(message: Optional[str]) -> bool:
+    return bool(message and message.startswith("Updated the name of the agent to "))
+
+
 @router.post("/agent", status_code=200)
-async def chat_with_agent(request: Request, agent_req: AgentRequest = Body(...)):
+async def chat_with_agent(
+    request: Request,
+    agent_req: AgentRequest = Body(...),
+    run_async: bool = Query(False, alias="async")
+):
     """
     Invoke the learning agent for a user.
     Accepts optional message parameter for conversational queries or task updates.
     Returns both a message and a structured tasks array for UI rendering.
+
+    With ?async=true the run is queued as a background job instead and the
+    endpoint returns 202 with a jobId; poll /chat/agent/jobs/{jobId} or
+    stream /chat/agent/jobs/{jobId}/events for the result.
     """
-    db = request.app.state.db
     user_id = agent_req.userId
     message = agent_req.message
 
@@ -98,9 +157,45 @@ async def chat_with_agent(request: Request, agent_req: AgentRequest = Body(...))
     if message:
         print(f"📝 With message: {message}")
 
+    if run_async:
+        job_id = await request.app.state.jobs.submit(user_id, message)
+        print(f"📬 Queued agent job {job_id}")
+        return JSONResponse(
+            status_code=202,
+            content={
+                "status": "queued",
+                "jobId": job_id,
+                "pollUrl": f"/chat/agent/jobs/{job_id}",
+                "eventsUrl": f"/chat/agent/jobs/{job_id}/events"
+            }
+        )
+
+    # Identical concurrent requests share one agent run and one stored chat row
+    try:
+        return await agent_reply_flights.do(
+            (user_id, message),
+            lambda: run_agent_reply(request.app.state, user_id, message)
+        )
+    except AgentOverloadedError as e:
+        print(f"🚦 Agent overloaded, rejecting request for user: {user_id}")
+        raise _overloaded_response(e)
+
+
+def _overloaded_response(error: AgentOverloadedError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="The assistant is busy right now. Please try again shortly.",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+async def run_agent_reply(state, user_id: str, message: Optional[str]) -> dict:
+    """Run the agent, store its reply in chat history and build the response."""
+    db = state.db
+
     try:
         # Check if this is an agent name update message
-        if message and message.startswith("Updated the name of the agent to "):
+        if _is_name_update_message(message):
             print("🔄 Detected agent name update message")
             agent_response = await handle_agent_name_update(db, user_id, message)
             status = "success"
@@ -108,20 +203,13 @@ async def chat_with_agent(request: Request, agent_req: AgentRequest = Body(...))
         else:
             # Regular learning agent invocation with optional message
             print("⚙️ Running learning agent...")
-            result = await run_learning_agent(db, user_id, message)
-            agent_response = result.get("response_text", "I couldn't process your request.")
-            status = result.get("status", "error")
-            
-            # Parse the response to extract tasks only if it looks like a task list
-            print("🔍 Parsing response for tasks...")
-            if _is_task_list_response(agent_response):
-                tasks = parse_agent_response_to_tasks(agent_response)
-                print(f"✅ Extracted {len(tasks)} tasks from response")
-            else:
-                tasks = []
-                print("ℹ️ Response is conversational (no tasks to extract)")
+            result = await state.agent.ainvoke(user_id, message)
+            agent_response, status, tasks = _agent_reply(result)
         
         print(f"✅ Agent completed with status: {status}")
+    except AgentOverloadedError:
+        # Nothing ran, so nothing is stored; the endpoint answers 429
+        raise
     except Exception as e:
         print(f"❌ Agent Error: {str(e)}")
         import traceback
@@ -130,27 +218,143 @@ async def chat_with_agent(request: Request, agent_req: AgentRequest = Body(...))
         status = "error"
         tasks = []
 
-    # Store agent chat in database
-    agent_chat_doc = {
-        "userId": user_id,
-        "userType": "agent",
-        "message": agent_response,
-        "timestamp": datetime.now()
-    }
-
-    result = await db.chats.insert_one(agent_chat_doc)
-    print(f"💾 Stored agent response in chat history")
-
-    created_chat = await db.chats.find_one({"_id": result.inserted_id})
+    created_chat = await _store_agent_chat(db, user_id, agent_response)
     
     # Return structured response with both message and tasks
     return {
-        **serialize(created_chat),
+        **created_chat,
         "tasks": tasks,  # Add tasks array to response
         "status": status
     }
 
 
+@router.get("/agent/metrics")
+async def get_agent_metrics(request: Request):
+    """Request coalescing, admission control and token usage counters for the agent endpoints."""
+    return {
+        "coalescing": {
+            "chat_replies": agent_reply_flights.stats(),
+            "agent_runs": request.app.state.agent.flights.stats()
+        },
+        "admission": request.app.state.agent.admission.stats(),
+        "token_usage": token_usage_totals
+    }
+
+
+def _serialize_job(job: dict) -> dict:
+    job = serialize(job)
+    job["jobId"] = job.pop("id")
+    return job
+
+
+@router.get("/agent/jobs/{job_id}")
+async def get_agent_job(request: Request, job_id: str):
+    """Poll the status (and, once finished, the result) of an async agent job."""
+    job = await request.app.state.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _serialize_job(job)
+
+
+@router.get("/agent/jobs/{job_id}/events")
+async def stream_agent_job(request: Request, job_id: str):
+    """
+    Server-Sent Events for an async agent job.
+    Emits a "status" event on every status change and a final "done" event
+    carrying the finished job.
+    """
+    jobs = request.app.state.jobs
+    job = await jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        last_status = None
+        current = job
+        try:
+            while True:
+                if current["status"] != last_status:
+                    last_status = current["status"]
+                    yield _sse_event("status", {"jobId": job_id, "status": last_status})
+                if last_status in TERMINAL_STATES:
+                    yield _sse_event("done", _serialize_job(current))
+                    return
+                if await request.is_disconnected():
+                    return
+                # Woken early by local workers; the timeout covers jobs run by other processes
+                await jobs.wait_for_update(job_id, timeout=1.0)
+                current = await jobs.get(job_id)
+        finally:
+            # Jobs finished by another process never set (and so never pop) their local event
+            jobs.forget_updates(job_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/agent/stream", status_code=200)
+async def chat_with_agent_stream(request: Request, agent_req: AgentRequest = Body(...)):
+    """
+    Streaming variant of /chat/agent using Server-Sent Events.
+    Emits "mode", "tool_start", "tool_end" and "token" events while the agent runs,
+    then persists the final message to chat history and emits a "done" event
+    carrying the same payload /chat/agent returns.
+    """
+    db = request.app.state.db
+    user_id = agent_req.userId
+    message = agent_req.message
+
+    print(f"🚀 Streaming agent invoked for user: {user_id}")
+
+    # Reject up front while a 429 can still be sent; once streaming starts the
+    # status line is gone and a late rejection becomes an "error" event instead
+    admission = request.app.state.agent.admission
+    if not _is_name_update_message(message) and admission.is_saturated():
+        raise _overloaded_response(admission.reject())
+
+    async def event_stream():
+        try:
+            if _is_name_update_message(message):
+                agent_response = await handle_agent_name_update(db, user_id, message)
+                status = "success"
+                tasks = []
+            else:
+                result = {}
+                async for event, data in request.app.state.agent.astream(user_id, message):
+                    if event == "result":
+                        result = data
+                    else:
+                        yield _sse_event(event, data)
+                agent_response, status, tasks = _agent_reply(result)
+        except AgentOverloadedError as e:
+            yield _sse_event("error", {"status": 429, "retry_after": e.retry_after})
+            return
+        except Exception as e:
+            print(f"❌ Agent Error: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            agent_response = f"An error occurred: {str(e)}"
+            status = "error"
+            tasks = []
+
+        created_chat = await _store_agent_chat(db, user_id, agent_response)
+        yield _sse_event("done", {**created_chat, "tasks": tasks, "status": status})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 def _is_task_list_response(text: str) -> bool:
     """Check if response looks like a task list (has numbered items)"""
     lines = text.strip().split('\n')
@@ -158,12 +362,107 @@ def _is_task_list_response(text: str) -> bool:
     return len(numbered_lines) >= 3  # At least 3 numbered items
 
 
+def _chat_keyset_filter(user_id: str, boundary, direction: str) -> dict:
+    """Filter for messages strictly before/after a (timestamp, _id) boundary."""
+    timestamp, chat_id = boundary
+    order = -1 if direction == "before" else 1
+    if chat_id is None:
+        return {"userId": user_id, **keyset_filter([("timestamp", order)], [timestamp])}
+    return {"userId": user_id, **keyset_filter([("timestamp", order), ("_id", order)], [timestamp, chat_id])}
+
+
+async def _resolve_chat_cursor(db, user_id: str, cursor: str):
+    """
+    Turn a `before`/`after` value into a (timestamp, _id) boundary.
+    Accepts a chat message id (as returned in `id`) or an ISO-8601 timestamp.
+    """
+    if ObjectId.is_valid(cursor):
+        chat = await db.chats.find_one({"_id": ObjectId(cursor), "userId": user_id}, {"timestamp": 1})
+        if not chat:
+            raise HTTPException(status_code=404, detail=f"Chat message {cursor} not found")
+        return chat["timestamp"], chat["_id"]
+
+    try:
+        return datetime.fromisoformat(cursor), None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="before/after must be a chat id or an ISO-8601 timestamp")
+
+
+def _chat_json(doc: dict) -> str:
+    return json.dumps(jsonable_encoder(serialize(doc)))
+
+
+async def _stream_json_array(cursor):
+    """Write a JSON array one document at a time as the cursor yields them."""
+    yield "["
+    first = True
+    async for doc in cursor:
+        yield ("" if first else ",") + _chat_json(doc)
+        first = False
+    yield "]"
+
+
+async def _stream_ndjson(cursor):
+    async for doc in cursor:
+        yield _chat_json(doc) + "\n"
+
+
 @router.get("/history/{user_id}")
-async def get_chat_history(request: Request, user_id: str):
-    """Retrieve chat history for a specific user"""
+async def get_chat_history(
+    request: Request,
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = Query(None, description="Chat id or ISO timestamp; return older messages"),
+    after: Optional[str] = Query(None, description="Chat id or ISO timestamp; return newer messages"),
+    format: Literal["json", "ndjson"] = "json"
+):
+    """
+    Retrieve chat history for a specific user, oldest first.
+
+    - No `limit`: the whole history, streamed as a JSON array.
+    - `limit`: one page. Without a cursor it is the newest `limit` messages;
+      `before`/`after` page older/newer from a message. The `X-Next-Cursor`
+      header holds the id to pass as the same cursor for the next page and is
+      absent once there are no more messages.
+    - `format=ndjson`: export everything (after `after`, if given) as one JSON
+      document per line, streamed straight from the database cursor.
+    """
     db = request.app.state.db
-    cursor = db.chats.find({"userId": user_id}).sort("timestamp", 1)
-    return [serialize(doc) async for doc in cursor]
+
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
+    query = {"userId": user_id}
+    if before:
+        query = _chat_keyset_filter(user_id, await _resolve_chat_cursor(db, user_id, before), "before")
+    elif after:
+        query = _chat_keyset_filter(user_id, await _resolve_chat_cursor(db, user_id, after), "after")
+
+    if format == "ndjson":
+        if before:
+            raise HTTPException(status_code=400, detail="ndjson export only supports after")
+        cursor = db.chats.find(query).sort([("timestamp", 1), ("_id", 1)]).batch_size(CHAT_EXPORT_BATCH_SIZE)
+        return StreamingResponse(_stream_ndjson(cursor), media_type="application/x-ndjson")
+
+    if limit is None:
+        if before or after:
+            raise HTTPException(status_code=400, detail="limit is required with before/after")
+        cursor = db.chats.find(query).sort([("timestamp", 1), ("_id", 1)]).batch_size(CHAT_EXPORT_BATCH_SIZE)
+        return StreamingResponse(_stream_json_array(cursor), media_type="application/json")
+
+    # Newest-first when paging backwards, then flipped to oldest-first
+    direction = -1 if not after else 1
+    docs = await db.chats.find(query).sort([("timestamp", direction), ("_id", direction)]).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if direction == -1:
+        docs.reverse()
+
+    headers = {}
+    if has_more and docs:
+        headers[NEXT_CURSOR_HEADER] = str(docs[0]["_id"] if direction == -1 else docs[-1]["_id"])
+
+    return JSONResponse(jsonable_encoder([serialize(doc) for doc in docs]), headers=headers)
 
 
 @router.post("/manage-agent", status_code=200)
@@ -187,62 +486,17 @@ async def manage_agent(request: Request, agent_req: ManageAgentRequest = Body(..
     if not agent_name or not agent_name.strip():
         raise HTTPException(status_code=400, detail="Agent name cannot be empty")
 
-    # Check for existing agents with this userId
-    print(f"🔍 Searching for existing agent with userId: {user_id}")
-    existing_agent = await db.agents.find_one({"userId": user_id})
-    
-    if existing_agent:
-        print(f"✅ Found existing agent:")
-        print(f"   - _id: {existing_agent.get('_id')}")
-        print(f"   - userId: {existing_agent.get('userId')}")
-        print(f"   - agentName: {existing_agent.get('agentName')}")
-        print(f"   - updated_at: {existing_agent.get('updated_at')}")
-    else:
-        print(f"❌ No existing agent found for userId: {user_id}")
-        
-        # Check if there are any agents at all for debugging
-        all_agents_count = await db.agents.count_documents({})
-        print(f"📊 Total agents in collection: {all_agents_count}")
-        
-        if all_agents_count > 0:
-            print(f"🔍 Checking all existing userIds in agents collection:")
-            all_agents = await db.agents.find({}, {"userId": 1, "agentName": 1}).to_list(length=10)
-            for ag in all_agents:
-                print(f"   - userId: '{ag.get('userId')}' (type: {type(ag.get('userId'))}), agentName: '{ag.get('agentName')}'")
-
-    # Upsert agent document
+    # Upsert agent document and get it back in the same round trip
     print(f"💾 Performing upsert for userId: {user_id}")
-    result = await db.agents.update_one(
-        {"userId": user_id},
-        {
-            "$set": {
-                "agentName": agent_name.strip(),
-                "updated_at": datetime.now()
-            },
-            "$setOnInsert": {
-                "created_at": datetime.now()
-            }
-        },
-        upsert=True
-    )
-
-    print(f"💾 Upsert result:")
-    print(f"   - matched_count: {result.matched_count}")
-    print(f"   - modified_count: {result.modified_count}")
-    print(f"   - upserted_id: {result.upserted_id}")
+    agent, created = await upsert_and_fetch(db.agents, {"userId": user_id}, {"agentName": agent_name.strip()})
+    await profile_cache.set("agents", user_id, agent)
 
-    # Fetch the updated/created agent
-    agent = await db.agents.find_one({"userId": user_id})
-    
-    if agent:
-        print(f"✅ Final agent state:")
-        print(f"   - _id: {agent.get('_id')}")
-        print(f"   - userId: {agent.get('userId')}")
-        print(f"   - agentName: {agent.get('agentName')}")
-    else:
-        print(f"❌ WARNING: Could not retrieve agent after upsert!")
+    print(f"✅ Final agent state:")
+    print(f"   - _id: {agent.get('_id')}")
+    print(f"   - userId: {agent.get('userId')}")
+    print(f"   - agentName: {agent.get('agentName')}")
     
-    action = "updated" if result.modified_count > 0 else "created"
+    action = "created" if created else "updated"
     print(f"✅ Agent {action} successfully")
     print("=" * 80)
     
@@ -269,21 +523,11 @@ async def get_agent(request: Request, agent_req: GetAgentRequest = Body(...)):
     print("=" * 80)
 
     # Find agent document
-    agent = await db.agents.find_one({"userId": user_id})
+    agent = await profile_cache.get_agent(db, user_id)
     
     if not agent:
         print(f"❌ No agent found for userId: {user_id}")
-        
-        # Debug: show what userIds exist
-        all_agents_count = await db.agents.count_documents({})
-        print(f"📊 Total agents in collection: {all_agents_count}")
-        
-        if all_agents_count > 0:
-            print(f"🔍 Existing userIds in agents collection:")
-            all_agents = await db.agents.find({}, {"userId": 1, "agentName": 1}).to_list(length=10)
-            for ag in all_agents:
-                print(f"   - userId: '{ag.get('userId')}' (type: {type(ag.get('userId'))})")
-        
+
         # Return default agent name if not found
         return {
             "status": "success",
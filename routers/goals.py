@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Request, Body, HTTPException
+from fastapi import APIRouter, Request, Body, HTTPException, Response, Depends
 from models import Goal
 from utils.helpers import serialize
-from datetime import datetime
+from utils.repository import upsert_and_fetch
+from utils.pagination import PageParams, paginate, parse_fields, set_next_cursor
+from agents.recommendation_cache import recommendation_cache
+from utils.profile_cache import profile_cache
 from bson import ObjectId
 from pydantic import BaseModel
 
 router = APIRouter()
 
+# Fields selectable with ?fields=
+GOAL_FIELDS = {"userId", "goals", "updated_at"}
+
 
 class ManageGoalsRequest(BaseModel):
     """Request model for managing goals"""
@@ -20,11 +26,14 @@ class GetGoalsRequest(BaseModel):
 
 
 @router.get("/")
-async def get_all_goals(request: Request, userId: str = None):
-    """Get all goals, optionally filtered by userId"""
+async def get_all_goals(request: Request, response: Response, userId: str = None, page: PageParams = Depends()):
+    """Get goals one page at a time, optionally filtered by userId. The next page's cursor is in X-Next-Cursor."""
     db = request.app.state.db
     query = {"userId": userId} if userId else {}
-    return [serialize(g) async for g in db.goals.find(query)]
+    projection = parse_fields(page.fields, GOAL_FIELDS)
+    docs, next_cursor = await paginate(db.goals, query, [("_id", 1)], page, projection)
+    set_next_cursor(response, next_cursor)
+    return [serialize(g) for g in docs]
 
 
 @router.post("/", response_model=Goal, status_code=201)
@@ -32,16 +41,10 @@ async def set_user_goals(request: Request, goal_data: Goal = Body(...)):
     """Set or update user goals (upsert operation)"""
     db = request.app.state.db
 
-    await db.goals.update_one(
-        {"userId": goal_data.userId},
-        {"$set": {
-            "goals": goal_data.goals,
-            "updated_at": datetime.now()
-        }},
-        upsert=True
-    )
+    updated_goal, _ = await upsert_and_fetch(db.goals, {"userId": goal_data.userId}, {"goals": goal_data.goals})
+    await recommendation_cache.invalidate_user(goal_data.userId)
+    await profile_cache.set("goals", goal_data.userId, updated_goal)
 
-    updated_goal = await db.goals.find_one({"userId": goal_data.userId})
     return serialize(updated_goal)
 
 
@@ -49,7 +52,7 @@ async def set_user_goals(request: Request, goal_data: Goal = Body(...)):
 async def get_user_goals(request: Request, user_id: str):
     """Get goals for a specific user by user_id"""
     db = request.app.state.db
-    goal = await db.goals.find_one({"userId": user_id})
+    goal = await profile_cache.get_goals(db, user_id)
     if not goal:
         raise HTTPException(status_code=404, detail="Goals not found for this user")
     return serialize(goal)
@@ -78,29 +81,17 @@ async def manage_goals(request: Request, goals_req: ManageGoalsRequest = Body(..
     if len(goals_text) > 1024:
         raise HTTPException(status_code=400, detail="Goals cannot exceed 1024 characters")
 
-    # Upsert goals document
-    result = await db.goals.update_one(
-        {"userId": user_id},
-        {
-            "$set": {
-                "goals": goals_text,
-                "updated_at": datetime.now()
-            },
-            "$setOnInsert": {
-                "created_at": datetime.now()
-            }
-        },
-        upsert=True
-    )
+    # Upsert goals document and get it back in the same round trip
+    goals_doc, created = await upsert_and_fetch(db.goals, {"userId": user_id}, {"goals": goals_text})
+    await recommendation_cache.invalidate_user(user_id)
+    await profile_cache.set("goals", user_id, goals_doc)
 
-    # Fetch the updated/created goals
-    goals_doc = await db.goals.find_one({"userId": user_id})
-    
-    print(f"✅ Goals {'updated' if result.modified_count > 0 else 'created'} successfully")
+    action = "created" if created else "updated"
+    print(f"✅ Goals {action} successfully")
     
     return {
         "status": "success",
-        "message": f"Goals {'updated' if result.modified_count > 0 else 'created'} successfully",
+        "message": f"Goals {action} successfully",
         "goals": serialize(goals_doc)
     }
 
@@ -116,7 +107,7 @@ async def get_goals(request: Request, goals_req: GetGoalsRequest = Body(...)):
     print(f"🔍 Fetching goals for user: {user_id}")
 
     # Find goals document
-    goals_doc = await db.goals.find_one({"userId": user_id})
+    goals_doc = await profile_cache.get_goals(db, user_id)
     
     if not goals_doc:
         # Return empty goals if not found
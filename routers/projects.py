@@ -1,47 +1,114 @@
-from fastapi import APIRouter, Request, Body, HTTPException
+from fastapi import APIRouter, Request, Body, HTTPException, Query, Response, Depends
 from models import Project, ProjectWithTasks, Task
 from utils.helpers import serialize
+from utils.repository import insert_document, now_ms
+from utils.pagination import PageParams, paginate, parse_fields, set_next_cursor
+from utils.catalog_cache import catalog_cache
 from bson import ObjectId
 from typing import List
 
 router = APIRouter()
 
+# Upper bound on project IDs per /projects/stats call
+MAX_STATS_PROJECTS = 100
 
-@router.get("/", response_model=List[Project])
-async def list_projects(request: Request):
+# Fields selectable with ?fields=; the required ones are always returned so
+# the response models validate
+PROJECT_FIELDS = {"name", "description", "status", "created_at"}
+PROJECT_REQUIRED_FIELDS = {"name"}
+TASK_FIELDS = {"project_id", "title", "description", "status"}
+TASK_REQUIRED_FIELDS = {"project_id", "title"}
+
+
+async def project_status_counts(db, project_ids: List[str]) -> dict:
+    """
+    Count tasks per status for each project with one $group aggregation.
+    Only project_id and status are read, so the (project_id, status) index
+    covers the query. Every requested project appears in the result, even
+    without tasks.
+    """
+    pipeline = [
+        {"$match": {"project_id": {"$in": project_ids}}},
+        {"$group": {"_id": {"project_id": "$project_id", "status": "$status"}, "count": {"$sum": 1}}}
+    ]
+
+    counts = {project_id: {} for project_id in project_ids}
+    async for row in db.tasks.aggregate(pipeline):
+        status = row["_id"].get("status") or "unknown"
+        counts[row["_id"]["project_id"]][status] = row["count"]
+
+    return {
+        project_id: {
+            "total_tasks": sum(by_status.values()),
+            "completed": by_status.get("completed", 0),
+            "pending": by_status.get("pending", 0),
+            "in_progress": by_status.get("in_progress", 0),
+            "by_status": by_status
+        }
+        for project_id, by_status in counts.items()
+    }
+
+
+@router.get("/", response_model=List[Project], response_model_exclude_unset=True)
+async def list_projects(request: Request, response: Response, page: PageParams = Depends()):
+    """List projects, newest first. The next page's cursor is in X-Next-Cursor."""
+    db = request.app.state.db
+    projection = parse_fields(page.fields, PROJECT_FIELDS, PROJECT_REQUIRED_FIELDS)
+    docs, next_cursor = await paginate(db.projects, {}, [("created_at", -1)], page, projection)
+    set_next_cursor(response, next_cursor)
+    return [serialize(doc) for doc in docs]
+
+
+@router.get("/stats")
+async def get_projects_stats(request: Request, ids: str = Query(..., description="Comma-separated project IDs")):
+    """Get task statistics for several projects in one call, keyed by project ID"""
     db = request.app.state.db
-    cursor = db.projects.find().sort("created_at", -1)
-    return [serialize(doc) async for doc in cursor]
+    project_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+
+    if not project_ids:
+        raise HTTPException(status_code=400, detail="ids is required")
+    if len(project_ids) > MAX_STATS_PROJECTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATS_PROJECTS} project IDs per request")
+
+    return await project_status_counts(db, project_ids)
 
 
 @router.post("/", response_model=Project, status_code=201)
 async def create_new_project(request: Request, project: Project = Body(...)):
     db = request.app.state.db
-    project_dict = project.model_dump(exclude={"id"})
-    result = await db.projects.insert_one(project_dict)
-
-    new_project = await db.projects.find_one({"_id": result.inserted_id})
+    new_project = await insert_document(db.projects, {**project.model_dump(exclude={"id"}), "updated_at": now_ms()})
+    await catalog_cache.put_project(new_project)
     return serialize(new_project)
 
 
-@router.get("/{project_id}", response_model=ProjectWithTasks)
-async def get_project_details(request: Request, project_id: str):
+@router.get("/{project_id}", response_model=ProjectWithTasks, response_model_exclude_unset=True)
+async def get_project_details(
+    request: Request,
+    response: Response,
+    project_id: str,
+    page: PageParams = Depends()
+):
     """
-    Get project details along with all associated tasks.
+    Get project details along with one page of its tasks.
+    limit/cursor/fields apply to the tasks; the next page's cursor is in X-Next-Cursor.
     """
     db = request.app.state.db
     
     if not ObjectId.is_valid(project_id):
         raise HTTPException(status_code=400, detail="Invalid Project ID")
 
-    project = await db.projects.find_one({"_id": ObjectId(project_id)})
+    project = await catalog_cache.get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     project_data = serialize(project)
     
-    tasks_cursor = db.tasks.find({"project_id": project_id})
-    tasks = [serialize(task) async for task in tasks_cursor]
+    projection = parse_fields(page.fields, TASK_FIELDS, TASK_REQUIRED_FIELDS)
+    # Only the project document comes from the cache: the page is a bounded,
+    # index-backed query rather than a slice of the project's whole task list
+    task_docs, next_cursor = await paginate(db.tasks, {"project_id": project_id}, [("_id", 1)], page, projection)
+    tasks = [serialize(task) for task in task_docs]
+    set_next_cursor(response, next_cursor)
     
     project_with_tasks = {
         **project_data,
@@ -55,10 +122,5 @@ async def get_project_details(request: Request, project_id: str):
 async def get_project_stats(request: Request, project_id: str):
     """Get statistics about tasks in a project"""
     db = request.app.state.db
-    tasks = await db.tasks.find({"project_id": project_id}).to_list(length=100)
-    return {
-        "total_tasks": len(tasks),
-        "completed": len([t for t in tasks if t["status"] == "completed"]),
-        "pending": len([t for t in tasks if t["status"] == "pending"]),
-        "in_progress": len([t for t in tasks if t["status"] == "in_progress"])
-    }
\ No newline at end of file
+    stats = await project_status_counts(db, [project_id])
+    return stats[project_id]
\ No newline at end of file
@@ -1,13 +1,33 @@
 from fastapi import APIRouter, Request, Body, HTTPException
 from models import Task, TaskUpdate, UserTaskLink, TaskResponse
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
 from utils.helpers import serialize
+from utils.repository import insert_document, now_ms, update_and_fetch
+from utils.ranking import RANK_REBALANCE_LENGTH, initial_ranks, rank_between, resequence_ranks, sort_by_rank
+from utils.assignments import (
+    add_assignments, add_comment, assigned_task_ids, has_assignments, load_assignments,
+    remove_assignment, replace_ranks, update_assignment, update_assignments
+)
+from agents.recommendation_cache import recommendation_cache
+from utils.catalog_cache import catalog_cache
+from agents.task_index import task_index
 from bson import ObjectId
-from typing import List, Optional, Literal
+from typing import List, Optional, Literal, Set
+import asyncio
+import json
+import os
 from datetime import datetime
 from pydantic import BaseModel
 
 router = APIRouter()
 
+# Keep references to fire-and-forget rebalances so they are not garbage collected
+_background_tasks = set()
+
+# Documents per insert_many call in POST /tasks/bulk
+TASK_BULK_CHUNK_SIZE = int(os.getenv("TASK_BULK_CHUNK_SIZE", "1000"))
+
 
 class TaskCommentRequest(BaseModel):
     """Request model for saving task comments"""
@@ -17,48 +37,165 @@ class TaskCommentRequest(BaseModel):
     commentBy: Optional[Literal["user", "admin"]] = "user"
 
 
+class BulkAssignmentRequest(BaseModel):
+    """Request model for assigning the same tasks to many users"""
+    userIds: List[str]
+    taskIds: List[str]
+    assignedBy: Literal["user", "admin"] = "admin"
+
+
+class MoveTaskRequest(BaseModel):
+    """Request model for moving one task between two neighbours"""
+    userId: str
+    taskId: str
+    prevTaskId: Optional[str] = None  # task that should end up right before it
+    nextTaskId: Optional[str] = None  # task that should end up right after it
+
+
 @router.post("/", response_model=Task, status_code=201)
 async def create_task(request: Request, task: Task = Body(...)):
     db = request.app.state.db
-    task_dict = task.model_dump(exclude={"id"})
-    result = await db.tasks.insert_one(task_dict)
+    new_task = await insert_document(db.tasks, {**task.model_dump(exclude={"id"}), "updated_at": now_ms()})
+    await recommendation_cache.invalidate_catalog()
+    await catalog_cache.put_task(new_task)
 
-    new_task = await db.tasks.find_one({"_id": result.inserted_id})
+    task_index.upsert_document(new_task)
     return serialize(new_task)
 
 
-@router.get("/user/{user_id}", response_model=List[TaskResponse])
-async def get_user_tasks(request: Request, user_id: str):
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'body'}: {e['msg']}" for e in error.errors())
+
+
+async def _ndjson_items(request: Request):
+    """Yield one parsed item per line of a streamed NDJSON body, without buffering the whole body."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def _json_items(request: Request):
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of tasks")
+    if isinstance(payload, dict):
+        payload = payload.get("tasks")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of tasks")
+    for item in payload:
+        yield item
+
+
+async def _insert_task_chunk(db, chunk: list) -> list:
+    """Insert (index, document) pairs with one unordered insert_many and report per item."""
+    failed = {}
+    try:
+        await db.tasks.insert_many([doc for _, doc in chunk], ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+
+    results = []
+    created = []
+    for position, (index, doc) in enumerate(chunk):
+        if position in failed:
+            results.append({"index": index, "status": "error", "error": failed[position]})
+        else:
+            # insert_many sets _id on each document, so nothing needs re-reading
+            task_index.upsert_document(doc)
+            created.append(doc)
+            results.append({"index": index, "status": "created", "id": str(doc["_id"])})
+    await catalog_cache.put_tasks(created)
+    return results
+
+
+@router.post("/bulk", status_code=200)
+async def create_tasks_bulk(request: Request):
     """
-    Get all tasks assigned to a user from the assignments collection.
+    Create many tasks in one request.
+
+    Body: a JSON array of Task objects (or {"tasks": [...]}), or NDJSON with
+    one Task per line (Content-Type: application/x-ndjson), which is read as
+    a stream. Items are validated one by one and written with unordered
+    insert_many calls of TASK_BULK_CHUNK_SIZE. Invalid items are skipped and
+    reported; `results` has one entry per input item, in input order.
     """
     db = request.app.state.db
-    
-    # Get user's assignment document
-    assignment = await db.assignments.find_one({"userId": user_id})
-    
-    if not assignment or not assignment.get("tasks"):
+
+    content_type = request.headers.get("content-type", "")
+    is_ndjson = "ndjson" in content_type or "jsonl" in content_type
+    items = _ndjson_items(request) if is_ndjson else _json_items(request)
+
+    results = []
+    chunk = []
+    index = 0
+    async for raw in items:
+        try:
+            data = json.loads(raw) if is_ndjson else raw
+            task = Task.model_validate(data)
+            chunk.append((index, {**task.model_dump(exclude={"id"}), "updated_at": now_ms()}))
+        except ValidationError as e:
+            results.append({"index": index, "status": "invalid", "error": _validation_message(e)})
+        except ValueError as e:
+            results.append({"index": index, "status": "invalid", "error": f"Invalid JSON: {str(e)}"})
+        index += 1
+
+        if len(chunk) >= TASK_BULK_CHUNK_SIZE:
+            results.extend(await _insert_task_chunk(db, chunk))
+            chunk = []
+
+    if chunk:
+        results.extend(await _insert_task_chunk(db, chunk))
+
+    results.sort(key=lambda r: r["index"])
+    created = sum(1 for r in results if r["status"] == "created")
+    if created:
+        await recommendation_cache.invalidate_catalog()
+
+    print(f"📦 Bulk task import: {created} created, {len(results) - created} failed")
+    return {
+        "status": "success" if created == len(results) else "partial",
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }
+
+
+async def build_task_responses(db, task_assignments: List[dict]) -> List[TaskResponse]:
+    """
+    Join task assignments with their task and project documents.
+    Tasks and their (deduplicated) projects come from the catalog cache, which
+    fetches misses with one batched `$in` query each instead of two lookups
+    per assignment. Assignment order is kept; entries whose task or project
+    no longer exists are skipped.
+    """
+    task_ids = {t["taskId"] for t in task_assignments if ObjectId.is_valid(t.get("taskId", ""))}
+    if not task_ids:
         return []
-    
+
+    tasks_by_id = await catalog_cache.get_tasks(db, task_ids)
+
+    project_ids = {t["project_id"] for t in tasks_by_id.values() if ObjectId.is_valid(t.get("project_id", ""))}
+    projects_by_id = await catalog_cache.get_projects(db, project_ids)
+
     response_tasks = []
-    
-    for task_assignment in assignment["tasks"]:
+
+    for task_assignment in task_assignments:
         task_id = task_assignment["taskId"]
-        
-        # Validate ObjectId
-        if not ObjectId.is_valid(task_id):
-            continue
-        
-        # Fetch task details
-        task = await db.tasks.find_one({"_id": ObjectId(task_id)})
+        task = tasks_by_id.get(task_id)
         if not task:
             continue
-        
-        # Fetch project details
-        project = await db.projects.find_one({"_id": ObjectId(task["project_id"])})
+
+        project = projects_by_id.get(task["project_id"])
         if not project:
             continue
-        
+
         # Build response
         task_response = TaskResponse(
             taskId=task_id,
@@ -68,15 +205,32 @@ async def get_user_tasks(request: Request, user_id: str):
             projectName=project.get("name", ""),
             assignedBy=task_assignment.get("assignedBy", "admin"),
             sequenceId=task_assignment.get("sequenceId"),
+            rank=task_assignment.get("rank"),
             isCompleted=task_assignment.get("isCompleted", False),
             comments=task_assignment.get("comments", [])
         )
-        
+
         response_tasks.append(task_response)
-    
+
     return response_tasks
 
 
+@router.get("/user/{user_id}", response_model=List[TaskResponse])
+async def get_user_tasks(request: Request, user_id: str):
+    """
+    Get all tasks assigned to a user, ordered by rank.
+    """
+    db = request.app.state.db
+    
+    # Get user's task assignments
+    task_assignments = await load_assignments(db, user_id)
+    
+    if not task_assignments:
+        return []
+    
+    return await build_task_responses(db, sort_by_rank(task_assignments))
+
+
 @router.put("/{task_id}", response_model=Task)
 async def update_task_status(request: Request, task_id: str, update: TaskUpdate):
     db = request.app.state.db
@@ -84,17 +238,24 @@ async def update_task_status(request: Request, task_id: str, update: TaskUpdate)
         raise HTTPException(status_code=400, detail="Invalid Task ID")
 
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
-    await db.tasks.update_one({"_id": ObjectId(task_id)}, {"$set": update_data})
+    if update_data:
+        updated = await update_and_fetch(db.tasks, {"_id": ObjectId(task_id)}, {"$set": {**update_data, "updated_at": now_ms()}})
+    else:
+        updated = await db.tasks.find_one({"_id": ObjectId(task_id)})
+    if not updated:
+        raise HTTPException(status_code=404, detail="Task not found")
 
-    updated = await db.tasks.find_one({"_id": ObjectId(task_id)})
+    await recommendation_cache.invalidate_catalog()
+    await catalog_cache.put_task(updated)
+    task_index.upsert_document(updated)
     return serialize(updated)
 
 
 @router.post("/user-tasks", status_code=201)
 async def link_user_to_task(request: Request, payload: UserTaskLink = Body(...)):
     """
-    Assign a task to a user by adding it to the assignments collection.
-    Creates or updates the user's assignment document.
+    Assign a task to a user.
+    Creates or updates the user's assignments.
     """
     db = request.app.state.db
     
@@ -103,7 +264,7 @@ async def link_user_to_task(request: Request, payload: UserTaskLink = Body(...))
         raise HTTPException(status_code=400, detail="Invalid taskId format")
     
     # Verify task exists
-    task = await db.tasks.find_one({"_id": ObjectId(payload.taskId)})
+    task = await catalog_cache.get_task(db, payload.taskId)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -116,14 +277,11 @@ async def link_user_to_task(request: Request, payload: UserTaskLink = Body(...))
         "comments": []
     }
     
-    # Update or create assignment document
-    result = await db.assignments.update_one(
-        {"userId": payload.userId},
-        {
-            "$addToSet": {"tasks": task_assignment}
-        },
-        upsert=True
-    )
+    # Update or create the user's assignments
+    failed = await add_assignments(db, {payload.userId: [task_assignment]})
+    if failed:
+        raise HTTPException(status_code=500, detail=failed[payload.userId])
+    await recommendation_cache.invalidate_user(payload.userId)
     
     return {
         "status": "success", 
@@ -131,6 +289,70 @@ async def link_user_to_task(request: Request, payload: UserTaskLink = Body(...))
     }
 
 
+@router.post("/user-tasks/bulk", status_code=200)
+async def bulk_link_users_to_tasks(request: Request, payload: BulkAssignmentRequest = Body(...)):
+    """
+    Assign the same tasks to many users (e.g. onboarding a cohort).
+    All task IDs are checked with at most one query and every user's assignments
+    are upserted in a single bulk_write. Tasks a user already has are
+    left untouched and reported as alreadyAssigned.
+    """
+    db = request.app.state.db
+
+    user_ids = list(dict.fromkeys(payload.userIds))
+    task_ids = list(dict.fromkeys(payload.taskIds))
+    if not user_ids:
+        raise HTTPException(status_code=400, detail="userIds is required")
+    if not task_ids:
+        raise HTTPException(status_code=400, detail="taskIds is required")
+
+    invalid_ids = [t for t in task_ids if not ObjectId.is_valid(t)]
+    existing = await catalog_cache.get_tasks(db, [t for t in task_ids if t not in invalid_ids])
+    missing_ids = [t for t in task_ids if t not in existing and t not in invalid_ids]
+    valid_ids = [t for t in task_ids if t in existing]
+    if not valid_ids:
+        raise HTTPException(status_code=404, detail="None of the tasks were found")
+
+    # What each user already has, so existing assignments (with their progress
+    # and comments) are not duplicated by $addToSet
+    already = await assigned_task_ids(db, user_ids)
+
+    new_assignments = {}
+    results = []
+    for user_id in user_ids:
+        new_ids = [t for t in valid_ids if t not in already[user_id]]
+        result = {
+            "userId": user_id,
+            "status": "success",
+            "assigned": new_ids,
+            "alreadyAssigned": [t for t in valid_ids if t in already[user_id]]
+        }
+        results.append(result)
+        if not new_ids:
+            continue
+
+        new_assignments[user_id] = [
+            {"taskId": task_id, "assignedBy": payload.assignedBy, "sequenceId": None, "isCompleted": False, "comments": []}
+            for task_id in new_ids
+        ]
+
+    failed = await add_assignments(db, new_assignments) if new_assignments else {}
+
+    for result in results:
+        if result["userId"] in failed:
+            result.update({"status": "error", "error": failed[result["userId"]], "assigned": []})
+        elif result["assigned"]:
+            await recommendation_cache.invalidate_user(result["userId"])
+
+    print(f"👥 Bulk assignment: {len(valid_ids)} task(s) to {len(user_ids)} user(s), {len(failed)} failed")
+    return {
+        "status": "success" if not failed else "partial",
+        "tasksNotFound": missing_ids,
+        "invalidTaskIds": invalid_ids,
+        "results": results
+    }
+
+
 @router.put("/user-tasks/{user_id}/{task_id}", status_code=200)
 async def update_user_task_assignment(
     request: Request, 
@@ -143,17 +365,15 @@ async def update_user_task_assignment(
 ):
     """
     Update a specific task assignment for a user.
-    Can update completion status, sequence, or add comments.
+    Can update completion status, sequence, or add comments. A new sequenceId
+    also moves the task there in a list ordered by rank.
     """
     db = request.app.state.db
     
     update_fields = {}
     
     if isCompleted is not None:
-        update_fields["tasks.$[elem].isCompleted"] = isCompleted
-    
-    if sequenceId is not None:
-        update_fields["tasks.$[elem].sequenceId"] = sequenceId
+        update_fields["isCompleted"] = isCompleted
     
     # Add comment if provided
     if comment and commentBy:
@@ -162,22 +382,18 @@ async def update_user_task_assignment(
             "commentBy": commentBy,
             "createdAt": datetime.now()
         }
-        await db.assignments.update_one(
-            {"userId": user_id},
-            {"$push": {"tasks.$[elem].comments": new_comment}},
-            array_filters=[{"elem.taskId": task_id}]
-        )
+        await add_comment(db, user_id, task_id, new_comment)
     
+    if sequenceId is not None:
+        assigned_ids = await resequence_assignments(db, user_id, {task_id: sequenceId}, {task_id: update_fields})
+        if not assigned_ids or task_id not in assigned_ids:
+            raise HTTPException(status_code=404, detail="Assignment not found")
+        await recommendation_cache.invalidate_user(user_id)
     # Update other fields if any
-    if update_fields:
-        result = await db.assignments.update_one(
-            {"userId": user_id},
-            {"$set": update_fields},
-            array_filters=[{"elem.taskId": task_id}]
-        )
-        
-        if result.matched_count == 0:
+    elif update_fields:
+        if not await update_assignment(db, user_id, task_id, update_fields):
             raise HTTPException(status_code=404, detail="Assignment not found")
+        await recommendation_cache.invalidate_user(user_id)
     
     return {"status": "success", "message": "Assignment updated"}
 
@@ -185,7 +401,10 @@ async def update_user_task_assignment(
 async def rearrange_user_tasks(request: Request, payload: dict = Body(...)):
     """
     Rearrange tasks for a user by updating their sequenceId values.
-    Accepts a list of tasks with updated sequenceIds.
+    Accepts a list of tasks with updated sequenceIds and applies them in one
+    atomic update; in a list ordered by rank, the listed tasks get ranks that
+    put them in sequenceId order among the others. Task IDs that are not
+    assigned to the user are listed in `notFound`.
     """
     db = request.app.state.db
     
@@ -198,12 +417,8 @@ async def rearrange_user_tasks(request: Request, payload: dict = Body(...)):
     if not tasks:
         raise HTTPException(status_code=400, detail="tasks array is required")
     
-    # Verify user assignment exists
-    assignment = await db.assignments.find_one({"userId": user_id})
-    if not assignment:
-        raise HTTPException(status_code=404, detail="No assignments found for this user")
-    
-    # Update sequenceId for each task
+    # Last entry wins if a task is listed twice; one array filter per task
+    sequence_by_task = {}
     for task_update in tasks:
         task_id = task_update.get("taskId")
         sequence_id = task_update.get("sequenceId")
@@ -211,24 +426,163 @@ async def rearrange_user_tasks(request: Request, payload: dict = Body(...)):
         if not task_id or sequence_id is None:
             continue
         
-        # Update the sequenceId for the specific task in the array
-        await db.assignments.update_one(
-            {"userId": user_id},
-            {"$set": {"tasks.$[elem].sequenceId": sequence_id}},
-            array_filters=[{"elem.taskId": task_id}]
-        )
+        sequence_by_task[task_id] = sequence_id
+    
+    if not sequence_by_task:
+        raise HTTPException(status_code=400, detail="tasks must include taskId and sequenceId")
+    
+    # Apply the whole reorder in one write (atomic in the embedded layout)
+    assigned_ids = await resequence_assignments(db, user_id, sequence_by_task)
+    if assigned_ids is None:
+        raise HTTPException(status_code=404, detail="No assignments found for this user")
+    
+    not_found = [task_id for task_id in sequence_by_task if task_id not in assigned_ids]
     
     return {
         "status": "success",
-        "message": f"Task order updated for user {user_id}"
+        "message": f"Task order updated for user {user_id}",
+        "updated": len(sequence_by_task) - len(not_found),
+        "notFound": not_found
     }
 
 
+async def resequence_assignments(
+    db,
+    user_id: str,
+    sequence_by_task: dict,
+    fields_by_task: Optional[dict] = None
+) -> Optional[Set[str]]:
+    """
+    Write new sequenceIds (plus any other `fields_by_task`) and, if the user's
+    list is ordered by rank, the ranks that keep rank order consistent with
+    them. Returns the task IDs the user had, or None if they have none.
+    """
+    task_assignments = await load_assignments(db, user_id, fields=("taskId", "rank", "sequenceId"))
+    if task_assignments is None:
+        return None
+
+    fields_by_task = fields_by_task or {}
+    updates = {
+        task_id: {**fields_by_task.get(task_id, {}), "sequenceId": sequence_id}
+        for task_id, sequence_id in sequence_by_task.items()
+    }
+    ranks = resequence_ranks(task_assignments, sequence_by_task)
+    for task_id, rank in ranks.items():
+        updates.setdefault(task_id, {})["rank"] = rank
+    assigned_ids = await update_assignments(db, user_id, updates)
+
+    if any(len(rank) > RANK_REBALANCE_LENGTH for rank in ranks.values()):
+        schedule_rebalance(db, user_id)
+    return assigned_ids
+
+
+def schedule_rebalance(db, user_id: str):
+    task = asyncio.create_task(rebalance_user_ranks(db, user_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def write_ranks(db, user_id: str, ranks: dict):
+    """Set the rank of several assigned tasks in one update."""
+    await update_assignments(db, user_id, {task_id: {"rank": rank} for task_id, rank in ranks.items()})
+
+
+async def rebalance_user_ranks(db, user_id: str):
+    """Replace a user's rank keys with short, evenly spaced ones in the same order."""
+    task_assignments = await load_assignments(db, user_id, fields=("taskId", "rank", "sequenceId"))
+    if not task_assignments:
+        return
+
+    ordered = sort_by_rank(task_assignments)
+    old_ranks = {t["taskId"]: t.get("rank") for t in ordered}
+    new_ranks = dict(zip(old_ranks, initial_ranks(len(ordered))))
+    # A move, reorder or assignment since the read wins; the next long key retries
+    if not await replace_ranks(db, user_id, old_ranks, new_ranks):
+        print(f"⚠️ Skipped rebalancing task ranks for user {user_id}: the list changed meanwhile")
+        return
+    print(f"⚖️ Rebalanced task ranks for user {user_id} ({len(ordered)} tasks)")
+
+
+@router.post("/move-user-task", status_code=200)
+async def move_user_task(request: Request, payload: MoveTaskRequest = Body(...)):
+    """
+    Move one task between two neighbours in a user's task list.
+    Give prevTaskId, nextTaskId or both; the missing neighbour is taken from
+    the current order (prevTaskId only = right after it, nextTaskId only =
+    right before it). Only the moved task's rank is written.
+    """
+    db = request.app.state.db
+
+    if not payload.prevTaskId and not payload.nextTaskId:
+        raise HTTPException(status_code=400, detail="prevTaskId or nextTaskId is required")
+
+    if payload.taskId in (payload.prevTaskId, payload.nextTaskId):
+        raise HTTPException(status_code=400, detail="A task cannot be its own neighbour")
+
+    task_assignments = await load_assignments(db, payload.userId, fields=("taskId", "rank", "sequenceId"))
+    if task_assignments is None:
+        raise HTTPException(status_code=404, detail="No assignments found for this user")
+
+    ordered = sort_by_rank(task_assignments)
+    task_ids = [t["taskId"] for t in ordered]
+    for task_id in (payload.taskId, payload.prevTaskId, payload.nextTaskId):
+        if task_id and task_id not in task_ids:
+            raise HTTPException(status_code=404, detail=f"Task {task_id} not found in user's assignments")
+
+    # Lists from before ranks existed get ranks once, in their current order
+    ranks = {t["taskId"]: t.get("rank") for t in ordered}
+    needs_backfill = any(rank is None for rank in ranks.values())
+    if needs_backfill:
+        ranks = dict(zip(task_ids, initial_ranks(len(task_ids))))
+
+    others = [task_id for task_id in task_ids if task_id != payload.taskId]
+    prev_id, next_id = payload.prevTaskId, payload.nextTaskId
+    if prev_id and not next_id:
+        position = others.index(prev_id) + 1
+        next_id = others[position] if position < len(others) else None
+    elif next_id and not prev_id:
+        position = others.index(next_id)
+        prev_id = others[position - 1] if position > 0 else None
+
+    try:
+        new_rank = rank_between(ranks.get(prev_id), ranks.get(next_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="prevTaskId must come before nextTaskId")
+
+    if needs_backfill:
+        await write_ranks(db, payload.userId, {**ranks, payload.taskId: new_rank})
+    else:
+        await write_ranks(db, payload.userId, {payload.taskId: new_rank})
+
+    if len(new_rank) > RANK_REBALANCE_LENGTH:
+        schedule_rebalance(db, payload.userId)
+
+    return {
+        "status": "success",
+        "message": f"Task {payload.taskId} moved",
+        "taskId": payload.taskId,
+        "rank": new_rank
+    }
+
+
+async def _raise_assignment_not_found(db, user_id: str, task_id: str):
+    """
+    Error path for conditional assignment updates that matched nothing:
+    tell apart a user without assignments from a task the user doesn't have.
+    """
+    if not await has_assignments(db, user_id):
+        raise HTTPException(status_code=404, detail="No assignments found for this user")
+    raise HTTPException(
+        status_code=404, 
+        detail=f"Task {task_id} not found in user's assignments"
+    )
+
+
 @router.post("/delete-user-task", status_code=200)
 async def delete_user_task(request: Request, payload: dict = Body(...)):
     """
     Delete a task assignment from a user's task list.
-    Removes the task from the assignments collection.
+    Removes the task and its comments from the user's assignments.
     """
     db = request.app.state.db
     
@@ -241,22 +595,11 @@ async def delete_user_task(request: Request, payload: dict = Body(...)):
     if not task_id:
         raise HTTPException(status_code=400, detail="taskId is required")
     
-    # Verify user assignment exists
-    assignment = await db.assignments.find_one({"userId": user_id})
-    if not assignment:
-        raise HTTPException(status_code=404, detail="No assignments found for this user")
-    
-    # Remove the task from the user's tasks array
-    result = await db.assignments.update_one(
-        {"userId": user_id},
-        {"$pull": {"tasks": {"taskId": task_id}}}
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=404, 
-            detail=f"Task {task_id} not found in user's assignments"
-        )
+    # Remove the task from the user's assignments; only matches if it is there
+    removed = await remove_assignment(db, user_id, task_id)
+    if not removed:
+        await _raise_assignment_not_found(db, user_id, task_id)
+    await recommendation_cache.invalidate_user(user_id)
     
     return {
         "status": "success",
@@ -267,8 +610,8 @@ async def delete_user_task(request: Request, payload: dict = Body(...)):
 @router.post("/task-comments", status_code=200)
 async def save_task_comment(request: Request, payload: TaskCommentRequest = Body(...)):
     """
-    Save a comment for a specific task in the assignments collection.
-    Adds a new comment to the task's comments array.
+    Save a comment for a specific task assigned to a user.
+    Adds a new comment to the task's comments.
     
     Request body:
     - userId: str (required) - The ID of the user
@@ -282,19 +625,6 @@ async def save_task_comment(request: Request, payload: TaskCommentRequest = Body
     if not payload.comment.strip():
         raise HTTPException(status_code=400, detail="comment cannot be empty")
     
-    # Verify user assignment exists
-    assignment = await db.assignments.find_one({"userId": payload.userId})
-    if not assignment:
-        raise HTTPException(status_code=404, detail="No assignments found for this user")
-    
-    # Verify task exists in user's assignments
-    task_found = any(task.get("taskId") == payload.taskId for task in assignment.get("tasks", []))
-    if not task_found:
-        raise HTTPException(
-            status_code=404, 
-            detail=f"Task {payload.taskId} not found in user's assignments"
-        )
-    
     # Create comment object
     new_comment = {
         "comment": payload.comment.strip(),
@@ -302,18 +632,10 @@ async def save_task_comment(request: Request, payload: TaskCommentRequest = Body
         "createdAt": datetime.now()
     }
     
-    # Add comment to the task's comments array
-    result = await db.assignments.update_one(
-        {"userId": payload.userId},
-        {"$push": {"tasks.$[elem].comments": new_comment}},
-        array_filters=[{"elem.taskId": payload.taskId}]
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=500, 
-            detail="Failed to save comment"
-        )
+    # Add comment to the task's comments; only matches if the user has the task
+    saved = await add_comment(db, payload.userId, payload.taskId, new_comment)
+    if not saved:
+        await _raise_assignment_not_found(db, payload.userId, payload.taskId)
     
     return {
         "status": "success",
@@ -325,7 +647,7 @@ async def save_task_comment(request: Request, payload: TaskCommentRequest = Body
 @router.post("/update-task-completion-status", status_code=200)
 async def update_task_completion_status(request: Request, payload: dict = Body(...)):
     """
-    Update the completion status of a task in the assignments collection.
+    Update the completion status of a task assigned to a user.
     
     Request body:
     - userId: str (required) - The ID of the user
@@ -348,31 +670,11 @@ async def update_task_completion_status(request: Request, payload: dict = Body(.
     if is_completed is None:
         raise HTTPException(status_code=400, detail="isCompleted is required")
     
-    # Verify user assignment exists
-    assignment = await db.assignments.find_one({"userId": user_id})
-    if not assignment:
-        raise HTTPException(status_code=404, detail="No assignments found for this user")
-    
-    # Verify task exists in user's assignments
-    task_found = any(task.get("taskId") == task_id for task in assignment.get("tasks", []))
-    if not task_found:
-        raise HTTPException(
-            status_code=404, 
-            detail=f"Task {task_id} not found in user's assignments"
-        )
-    
-    # Update the task completion status
-    result = await db.assignments.update_one(
-        {"userId": user_id},
-        {"$set": {"tasks.$[elem].isCompleted": is_completed}},
-        array_filters=[{"elem.taskId": task_id}]
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=500, 
-            detail="Failed to update task completion status"
-        )
+    # Update the task completion status; only matches if the user has the task
+    updated = await update_assignment(db, user_id, task_id, {"isCompleted": is_completed})
+    if not updated:
+        await _raise_assignment_not_found(db, user_id, task_id)
+    await recommendation_cache.invalidate_user(user_id)
     
     return {
         "status": "success",
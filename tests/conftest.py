@@ -0,0 +1,98 @@
+import os
+
+# The agent must never reach a real LLM, and caches stay in-process
+os.environ.setdefault("AGENT_LLM_BACKEND", "fake")
+os.environ["CACHE_BACKEND"] = "memory"
+
+import uuid
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+from pymongo.errors import PyMongoError
+
+from fake_mongo import FakeDatabase
+from real_mongo import CommandRecorder, RecordingDatabase
+
+# Tests that run against a real server use a scratch database here, or are skipped
+MONGODB_TEST_URL = os.getenv("MONGODB_TEST_URL", "mongodb://localhost:27017")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@asynccontextmanager
+async def scratch_database():
+    """A RecordingDatabase on a new database at MONGODB_TEST_URL, dropped afterwards. Skips if no mongod answers."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    name = f"learning_api_test_{uuid.uuid4().hex[:8]}"
+    recorder = CommandRecorder(name)
+    client = AsyncIOMotorClient(MONGODB_TEST_URL, serverSelectionTimeoutMS=1000, event_listeners=[recorder])
+    try:
+        await client.admin.command("ping")
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"No mongod at {MONGODB_TEST_URL} ({type(e).__name__})")
+    recorder.database = database = RecordingDatabase(client[name])
+    try:
+        yield database
+    finally:
+        await client.drop_database(name)
+        client.close()
+
+
+def check_query_shapes(database):
+    """Every query the test sent must be in the index registry (utils/indexes.py)."""
+    from utils.indexes import registered_shapes, shape_key
+
+    unregistered = sorted({shape_key(*query) for query in database.queries} - registered_shapes(), key=repr)
+    if unregistered:
+        pytest.fail("Query shapes missing from utils.indexes.QUERY_SHAPES: " + "; ".join(map(repr, unregistered)))
+
+
+@pytest.fixture(params=["fake", "mongod"])
+async def db(request):
+    """
+    The database the app is wired to: the in-memory fake, and a real mongod
+    when MONGODB_TEST_URL answers, so the fake's semantics are checked too.
+    Both log calls and queries the same way.
+    """
+    from agents.recommendation_cache import recommendation_cache
+    from utils.catalog_cache import catalog_cache
+    from utils.profile_cache import profile_cache
+
+    # The caches are process-wide; entries from another test would hide round trips
+    await catalog_cache.clear()
+    await profile_cache.clear()
+    await recommendation_cache.invalidate_catalog()
+
+    if request.param == "fake":
+        database = FakeDatabase()
+        yield database
+        check_query_shapes(database)
+    else:
+        async with scratch_database() as database:
+            yield database
+            check_query_shapes(database)
+
+
+@pytest.fixture
+async def client(db):
+    """The API app wired to `db`; the lifespan (indexes, workers) is not run."""
+    from agents.learning_agent import get_learning_agent
+    from main import app
+
+    app.state.db = db
+    app.state.agent = get_learning_agent(db)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        yield http
+
+
+@pytest.fixture
+async def mongo_db():
+    """A scratch database on MONGODB_TEST_URL; skips the test if no mongod answers."""
+    async with scratch_database() as database:
+        yield database
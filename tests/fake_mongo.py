@@ -0,0 +1,486 @@
+"""
+In-memory stand-in for the Motor database the routers use.
+
+Covers the query and update operators this codebase sends (equality and
+dotted paths into arrays, $in/$nin/$exists/comparisons/$or/$and,
+$elemMatch/$all/$size; $set, $unset, $inc, $push, $addToSet/$each, $pull,
+$setOnInsert, with $[] and $[identifier] array filters) and aggregations
+made of $match, $group ($sum) and $sort. Every method that would be one
+round trip to mongod is logged in `db.calls` as (collection, command), with
+the command name mongod logs, so tests can assert how many round trips an
+endpoint makes. tests/real_mongo.py logs a real server the same way. The filters (and sorts) sent
+are logged in `db.queries` as (collection, filter, sort).
+"""
+
+import copy
+import re
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+_MISSING = object()
+_POSITIONAL = re.compile(r"^\$\[(\w*)\]$")
+
+
+# Queries
+
+def _values(document, path: str) -> list:
+    """Every value `path` reaches, descending into arrays like MongoDB does."""
+    current = [document]
+    for part in path.split("."):
+        found = []
+        for value in current:
+            if isinstance(value, dict) and part in value:
+                found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                else:
+                    found.extend(v[part] for v in value if isinstance(v, dict) and part in v)
+        current = found
+    return current
+
+
+def _candidates(values: list) -> list:
+    """A field matches if it, or any element of it when it is an array, matches."""
+    candidates = []
+    for value in values:
+        candidates.append(value)
+        if isinstance(value, list):
+            candidates.extend(value)
+    return candidates
+
+
+def _compare(op: str, value, operand) -> bool:
+    try:
+        return {
+            "$lt": lambda: value < operand,
+            "$lte": lambda: value <= operand,
+            "$gt": lambda: value > operand,
+            "$gte": lambda: value >= operand,
+        }[op]()
+    except TypeError:
+        return False
+
+
+def _matches_condition(values: list, condition) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for op, operand in condition.items():
+            candidates = _candidates(values)
+            if op == "$in":
+                ok = any(c in operand for c in candidates) or (not values and None in operand)
+            elif op == "$nin":
+                ok = not any(c in operand for c in candidates)
+            elif op == "$ne":
+                ok = operand not in candidates
+            elif op == "$exists":
+                ok = bool(values) == bool(operand)
+            elif op in ("$lt", "$lte", "$gt", "$gte"):
+                ok = any(_compare(op, c, operand) for c in candidates)
+            elif op == "$elemMatch":
+                ok = any(isinstance(c, dict) and matches(c, operand) for v in values if isinstance(v, list) for c in v)
+            elif op == "$all":
+                ok = all(
+                    _matches_condition(values, item) if isinstance(item, dict) and "$elemMatch" in item
+                    else item in candidates
+                    for item in operand
+                )
+            elif op == "$size":
+                ok = any(isinstance(v, list) and len(v) == operand for v in values)
+            else:
+                raise NotImplementedError(f"query operator {op}")
+            if not ok:
+                return False
+        return True
+    if not values:
+        return condition is None
+    return condition in _candidates(values)
+
+
+def matches(document: dict, query: Optional[dict]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(document, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, sub) for sub in condition):
+                return False
+        elif not _matches_condition(_values(document, key), condition):
+            return False
+    return True
+
+
+# Updates
+
+def _targets(container, parts: List[str], array_filters: dict):
+    """(parent, key) pairs the remaining path `parts` refers to, creating dicts on the way."""
+    head, rest = parts[0], parts[1:]
+    positional = _POSITIONAL.match(head)
+    if positional:
+        identifier = positional.group(1)
+        elements = range(len(container))
+        if identifier:
+            elements = [i for i in elements if matches(container[i], array_filters[identifier])]
+        keys = list(elements)
+    else:
+        keys = [int(head) if isinstance(container, list) else head]
+
+    targets = []
+    for key in keys:
+        if not rest:
+            targets.append((container, key))
+            continue
+        if isinstance(container, dict) and not isinstance(container.get(key), (dict, list)):
+            container[key] = {}
+        targets.extend(_targets(container[key], rest, array_filters))
+    return targets
+
+
+def _parse_array_filters(array_filters: Optional[List[dict]]) -> dict:
+    parsed = {}
+    for array_filter in array_filters or []:
+        for key, condition in array_filter.items():
+            identifier, _, field = key.partition(".")
+            parsed.setdefault(identifier, {})[field] = condition
+    return parsed
+
+
+def apply_update(document: dict, update: dict, array_filters: Optional[List[dict]] = None, inserting: bool = False):
+    filters = _parse_array_filters(array_filters)
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            for parent, key in _targets(document, path.split("."), filters):
+                current = parent[key] if (isinstance(parent, list) or key in parent) else _MISSING
+                if op in ("$set", "$setOnInsert"):
+                    parent[key] = copy.deepcopy(value)
+                elif op == "$unset":
+                    if current is not _MISSING:
+                        del parent[key]
+                elif op == "$inc":
+                    parent[key] = (0 if current is _MISSING else current) + value
+                elif op == "$push":
+                    parent.setdefault(key, []).append(copy.deepcopy(value))
+                elif op == "$addToSet":
+                    array = parent.setdefault(key, [])
+                    for item in value["$each"] if isinstance(value, dict) and "$each" in value else [value]:
+                        if item not in array:
+                            array.append(copy.deepcopy(item))
+                elif op == "$pull":
+                    if current is not _MISSING:
+                        parent[key] = [
+                            item for item in current
+                            if not (matches(item, value) if isinstance(value, dict) else item == value)
+                        ]
+                else:
+                    raise NotImplementedError(f"update operator {op}")
+
+
+def _project(document: Optional[dict], projection: Optional[dict]) -> Optional[dict]:
+    if document is None or not projection:
+        return copy.deepcopy(document)
+    include = {field for field, on in projection.items() if on and field != "_id"}
+    if not include:
+        result = copy.deepcopy(document)
+        for field, on in projection.items():
+            if not on:
+                result.pop(field, None)
+        return result
+    result = {"_id": document["_id"]} if projection.get("_id", 1) and "_id" in document else {}
+    subfields = {}
+    for path in include:
+        head, _, rest = path.partition(".")
+        if head not in document:
+            continue
+        if not rest:
+            result[head] = copy.deepcopy(document[head])
+        elif isinstance(document[head], list):
+            subfields.setdefault(head, []).append(rest)
+    # Several subfields of one array are projected element by element, like MongoDB
+    for head, fields in subfields.items():
+        result[head] = [
+            {field: copy.deepcopy(item[field]) for field in fields if field in item}
+            for item in document[head] if isinstance(item, dict)
+        ]
+    return result
+
+
+def _sort_key(value):
+    # Missing/None sorts first, as in MongoDB; types are not mixed within one field here
+    return (value is not None, value)
+
+
+# Results
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int = None, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = matched_count if modified_count is None else modified_count
+        self.upserted_id = upserted_id
+
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+
+
+class BulkWriteResult:
+    def __init__(self):
+        self.matched_count = 0
+        self.modified_count = 0
+        self.upserted_count = 0
+        self.inserted_count = 0
+
+
+# Cursors and collections
+
+class FakeCursor:
+    def __init__(self, collection: "FakeCollection", query: Optional[dict], projection: Optional[dict]):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key, direction=None):
+        self._sort = key if isinstance(key, list) else [(key, direction or 1)]
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def _execute(self) -> list:
+        if self._results is None:
+            self._collection._record("find", self._query, sort=self._sort or None)
+            documents = [d for d in self._collection.documents if matches(d, self._query)]
+            for field, direction in reversed(self._sort):
+                documents.sort(key=lambda d: _sort_key(next(iter(_values(d, field)), None)), reverse=direction == -1)
+            documents = documents[self._skip:]
+            if self._limit:
+                documents = documents[:self._limit]
+            self._results = [_project(d, self._projection) for d in documents]
+        return self._results
+
+    async def to_list(self, length=None):
+        results = self._execute()
+        return results if length is None else results[:length]
+
+    def __aiter__(self):
+        self._iterator = iter(self._execute())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def _evaluate(document: dict, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return next(iter(_values(document, expression[1:])), None)
+    if isinstance(expression, dict):
+        return {key: _evaluate(document, value) for key, value in expression.items()}
+    return expression
+
+
+def _group(documents: list, stage: dict) -> list:
+    groups = {}
+    for document in documents:
+        key = _evaluate(document, stage["_id"])
+        group = groups.setdefault(repr(key), {"_id": key})
+        for field, accumulator in stage.items():
+            if field == "_id":
+                continue
+            operator, operand = next(iter(accumulator.items()))
+            if operator != "$sum":
+                raise NotImplementedError(f"accumulator {operator}")
+            value = _evaluate(document, operand)
+            group[field] = group.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+    return list(groups.values())
+
+
+class FakeAggregationCursor(FakeCursor):
+    def __init__(self, collection: "FakeCollection", pipeline: list):
+        super().__init__(collection, None, None)
+        self._pipeline = pipeline
+
+    def _execute(self) -> list:
+        if self._results is None:
+            self._collection._record("aggregate", next((stage["$match"] for stage in self._pipeline if "$match" in stage), {}))
+            documents = copy.deepcopy(self._collection.documents)
+            for stage in self._pipeline:
+                (name, operand), = stage.items()
+                if name == "$match":
+                    documents = [d for d in documents if matches(d, operand)]
+                elif name == "$group":
+                    documents = _group(documents, operand)
+                elif name == "$sort":
+                    for field, direction in reversed(list(operand.items())):
+                        documents.sort(key=lambda d: _sort_key(next(iter(_values(d, field)), None)), reverse=direction == -1)
+                else:
+                    raise NotImplementedError(f"aggregation stage {name}")
+            self._results = documents
+        return self._results
+
+
+class FakeCollection:
+    def __init__(self, database: "FakeDatabase", name: str):
+        self.database = database
+        self.name = name
+        self.documents = []
+
+    def _record(self, command: str, *filters: Optional[dict], sort: Optional[list] = None):
+        self.database.calls.append((self.name, command))
+        for query in filters:
+            self.database.queries.append((self.name, query or {}, sort))
+
+    def _first(self, query: Optional[dict]) -> Optional[dict]:
+        return next((d for d in self.documents if matches(d, query)), None)
+
+    def _upsert(self, query: dict, update: dict, array_filters=None) -> dict:
+        document = {
+            key: value for key, value in query.items()
+            if not key.startswith("$") and not (isinstance(value, dict) and any(k.startswith("$") for k in value))
+        }
+        apply_update(document, update, array_filters, inserting=True)
+        document.setdefault("_id", ObjectId())
+        self.documents.append(document)
+        return document
+
+    async def insert_one(self, document: dict, **kwargs):
+        self._record("insert")
+        document.setdefault("_id", ObjectId())
+        self.documents.append(copy.deepcopy(document))
+        return InsertOneResult(document["_id"])
+
+    async def insert_many(self, documents: list, **kwargs):
+        self._record("insert")
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            self.documents.append(copy.deepcopy(document))
+        return InsertManyResult([d["_id"] for d in documents])
+
+    async def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None, **kwargs):
+        self._record("find", query)
+        return _project(self._first(query), projection)
+
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None, **kwargs) -> FakeCursor:
+        return FakeCursor(self, query, projection)
+
+    async def find_one_and_update(
+        self, query: dict, update: dict, projection=None, upsert=False,
+        return_document=ReturnDocument.BEFORE, array_filters=None, **kwargs
+    ):
+        self._record("findAndModify", query)
+        document = self._first(query)
+        if document is None:
+            if not upsert:
+                return None
+            document = self._upsert(query, update, array_filters)
+            return _project(document, projection) if return_document == ReturnDocument.AFTER else None
+        before = copy.deepcopy(document)
+        apply_update(document, update, array_filters)
+        return _project(document if return_document == ReturnDocument.AFTER else before, projection)
+
+    async def update_one(self, query: dict, update: dict, upsert=False, array_filters=None, **kwargs):
+        self._record("update", query)
+        return self._update_one(query, update, upsert, array_filters)
+
+    def _update_one(self, query: dict, update: dict, upsert=False, array_filters=None) -> UpdateResult:
+        document = self._first(query)
+        if document is None:
+            if upsert:
+                return UpdateResult(0, 0, self._upsert(query, update, array_filters)["_id"])
+            return UpdateResult(0)
+        apply_update(document, update, array_filters)
+        return UpdateResult(1)
+
+    async def update_many(self, query: dict, update: dict, array_filters=None, **kwargs):
+        self._record("update", query)
+        matched = [d for d in self.documents if matches(d, query)]
+        for document in matched:
+            apply_update(document, update, array_filters)
+        return UpdateResult(len(matched))
+
+    async def delete_one(self, query: dict, **kwargs):
+        self._record("delete", query)
+        document = self._first(query)
+        if document is not None:
+            self.documents.remove(document)
+        return DeleteResult(1 if document is not None else 0)
+
+    async def delete_many(self, query: dict, **kwargs):
+        self._record("delete", query)
+        kept = [d for d in self.documents if not matches(d, query)]
+        deleted = len(self.documents) - len(kept)
+        self.documents[:] = kept
+        return DeleteResult(deleted)
+
+    async def bulk_write(self, operations: list, ordered: bool = True, **kwargs):
+        # The driver sends one update command for the batch (only UpdateOne is used here)
+        self._record("update", *[operation._filter for operation in operations])
+        result = BulkWriteResult()
+        for operation in operations:
+            # pymongo's UpdateOne keeps its arguments in these attributes
+            update = self._update_one(
+                operation._filter, operation._doc, operation._upsert, getattr(operation, "_array_filters", None)
+            )
+            result.matched_count += update.matched_count
+            result.upserted_count += update.upserted_id is not None
+        return result
+
+    async def count_documents(self, query: dict, **kwargs):
+        # count_documents() is an aggregation on the server
+        self._record("aggregate", query)
+        return sum(1 for d in self.documents if matches(d, query))
+
+    def aggregate(self, pipeline: list, **kwargs) -> "FakeAggregationCursor":
+        return FakeAggregationCursor(self, pipeline)
+
+    async def estimated_document_count(self, **kwargs):
+        self._record("count")
+        return len(self.documents)
+
+    async def create_indexes(self, indexes: list, **kwargs):
+        self._record("createIndexes")
+        return [index.document["name"] for index in indexes]
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+        self.calls = []
+        self.queries = []
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+        return self.collections[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
@@ -0,0 +1,74 @@
+"""
+A real Motor database that logs its commands the way fake_mongo.FakeDatabase
+does, so the same tests can run against mongod: `db.calls` holds
+(collection, command) per round trip and `db.queries` (collection, filter,
+sort) per filter sent, both taken from pymongo command monitoring.
+"""
+
+from pymongo import monitoring
+
+# Driver housekeeping (and test setup) that is not a round trip made by the app
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue", "dropDatabase"
+}
+
+
+def _sort(sort) -> list:
+    return list(sort.items()) if sort else None
+
+
+def _filters(command_name: str, command: dict) -> list:
+    """(filter, sort) pairs a command sends, in the shapes FakeDatabase logs."""
+    if command_name == "find":
+        return [(command.get("filter", {}), _sort(command.get("sort")))]
+    if command_name == "findAndModify":
+        return [(command.get("query", {}), _sort(command.get("sort")))]
+    if command_name == "update":
+        return [(update["q"], None) for update in command["updates"]]
+    if command_name == "delete":
+        return [(delete["q"], None) for delete in command["deletes"]]
+    if command_name == "aggregate":
+        return [(next((stage["$match"] for stage in command["pipeline"] if "$match" in stage), {}), None)]
+    if command_name == "count":
+        return [(command.get("query", {}), None)]
+    return []
+
+
+class RecordingDatabase:
+    """Wraps a Motor database; attribute and item access go to it."""
+
+    def __init__(self, database):
+        self._database = database
+        self.calls = []
+        self.queries = []
+
+    def __getattr__(self, name: str):
+        return getattr(self._database, name)
+
+    def __getitem__(self, name: str):
+        return self._database[name]
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Logs the commands sent to one database into a RecordingDatabase."""
+
+    def __init__(self, database_name: str):
+        self.database_name = database_name
+        self.database = None
+
+    def started(self, event):
+        if self.database is None or event.database_name != self.database_name:
+            return
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        # getMore names the cursor's collection separately
+        collection = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self.database.calls.append((collection, event.command_name))
+        for query, sort in _filters(event.command_name, event.command):
+            self.database.queries.append((collection, query, sort))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
@@ -0,0 +1,30 @@
+"""Agent tools answer with strings, errors included."""
+
+import json
+
+import pytest
+
+from agents.learning_agent import get_project_details, get_project_tasks, get_user_assigned_tasks, get_user_goals
+
+pytestmark = pytest.mark.anyio
+
+
+class BrokenDatabase:
+    def __getattr__(self, name):
+        raise RuntimeError("database unavailable")
+
+    __getitem__ = __getattr__
+
+
+# The db fixture empties the caches, so every tool reaches the broken database
+@pytest.mark.usefixtures("db")
+@pytest.mark.parametrize("tool, args", [
+    (get_user_goals, {"user_id": "u1"}),
+    (get_project_details, {"project_id": "p1"}),
+    (get_project_tasks, {"project_id": "p1"}),
+    (get_user_assigned_tasks, {"user_id": "u1"}),
+])
+async def test_tool_errors_are_json_strings(tool, args):
+    result = await tool.ainvoke(args, config={"configurable": {"db": BrokenDatabase(), "user_id": "u1"}})
+    assert isinstance(result, str)
+    assert json.loads(result)["error"] == "database unavailable"
@@ -0,0 +1,149 @@
+"""
+RedisCache across workers.
+
+Two RedisCache instances with their own FakeRedis client on one FakeServer
+stand in for two API workers sharing a Redis server.
+"""
+
+import asyncio
+import copy
+
+import fakeredis
+import pytest
+from bson import ObjectId
+
+from fake_mongo import FakeDatabase
+from utils.cache import CacheBackend, MemoryCache, RedisCache
+from utils.catalog_cache import CatalogCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def eventually(predicate, timeout: float = 2):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def workers():
+    server = fakeredis.FakeServer()
+    # A long local TTL, so only invalidation messages can drop local copies
+    caches = [RedisCache("catalog", fakeredis.FakeAsyncRedis(server=server), local_ttl=60) for _ in range(2)]
+    for cache in caches:
+        await cache.start()
+    client = caches[0]._redis
+    await eventually(lambda: all(cache.stats()["listening"] for cache in caches))
+    while (await client.pubsub_numsub(caches[0]._channel))[0][1] < len(caches):
+        await asyncio.sleep(0.01)
+    yield caches
+    for cache in caches:
+        await cache.stop()
+
+
+async def test_write_drops_other_workers_local_copy(workers):
+    a, b = workers
+    await a.set("task:1", {"title": "old"})
+    await eventually(lambda: b.invalidations_received == 1)
+    assert await b.get("task:1") == {"title": "old"}
+
+    await a.set("task:1", {"title": "new"})
+    await eventually(lambda: b.invalidations_received == 2)
+    assert await b.get("task:1") == {"title": "new"}
+
+    await a.delete("task:1")
+    await eventually(lambda: b.invalidations_received == 3)
+    assert await b.get("task:1") is None
+
+
+async def test_clear_drops_other_workers_local_copies(workers):
+    a, b = workers
+    await a.set_many({"task:1": {"title": "one"}, "task:2": {"title": "two"}})
+    await eventually(lambda: b.invalidations_received == 1)
+    assert len(await b.get_many(["task:1", "task:2"])) == 2
+
+    await a.clear()
+    await eventually(lambda: b.invalidations_received == 2)
+    assert await b.get_many(["task:1", "task:2"]) == {}
+
+
+async def test_fill_is_shared_when_nothing_was_written(workers):
+    a, b = workers
+    assert await a.fill({"task:1": {"title": "from db"}}, await a.version())
+    assert await b.get("task:1") == {"title": "from db"}
+
+
+@pytest.mark.parametrize("write", ["set", "delete", "clear"])
+async def test_fill_loses_to_a_write_from_another_worker(workers, write):
+    a, b = workers
+    version = await a.version()
+    # Worker B writes while worker A is still reading the old document
+    if write == "set":
+        await b.set("task:1", {"title": "new"})
+    elif write == "delete":
+        await b.delete("task:1")
+    else:
+        await b.clear()
+
+    assert not await a.fill({"task:1": {"title": "old"}}, version)
+    expected = {"title": "new"} if write == "set" else None
+    assert await a.get("task:1") == expected
+    assert await b.get("task:1") == expected
+
+
+class SlowCursor:
+    """Returns what the query matched when it ran, once `release` is set."""
+
+    def __init__(self, cursor, release: asyncio.Event):
+        self._cursor = cursor
+        self._release = release
+        self.read = asyncio.Event()
+
+    def sort(self, *args):
+        self._cursor.sort(*args)
+        return self
+
+    async def to_list(self, length=None):
+        documents = copy.deepcopy(await self._cursor.to_list(length))
+        self.read.set()
+        await self._release.wait()
+        return documents
+
+
+async def test_slow_read_does_not_undo_another_workers_update(workers, monkeypatch):
+    a, b = workers
+    db = FakeDatabase()
+    task = {"_id": ObjectId(), "project_id": "p1", "title": "old"}
+    await db.tasks.insert_one(dict(task))
+
+    release = asyncio.Event()
+    cursors = []
+    find = db.tasks.find
+
+    def slow_find(*args, **kwargs):
+        cursors.append(SlowCursor(find(*args, **kwargs), release))
+        return cursors[-1]
+
+    monkeypatch.setattr(db.tasks, "find", slow_find)
+    reader = asyncio.create_task(CatalogCache(a).get_project_tasks(db, "p1"))
+    await eventually(lambda: cursors and cursors[0].read.is_set())
+
+    # Worker B updates the task after A's query ran but before A fills the cache
+    updated = await db.tasks.find_one_and_update({"_id": task["_id"]}, {"$set": {"title": "new"}}, return_document=True)
+    await CatalogCache(b).put_task(updated)
+    release.set()
+    assert [t["title"] for t in await reader] == ["old"]
+
+    monkeypatch.setattr(db.tasks, "find", find)
+    assert await a.get("project_tasks:p1") is None
+    assert (await a.get(f"task:{task['_id']}"))["title"] == "new"
+    assert [t["title"] for t in await CatalogCache(a).get_project_tasks(db, "p1")] == ["new"]
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoFill(MemoryCache):
+        fill = CacheBackend.fill
+
+    with pytest.raises(TypeError, match="fill"):
+        NoFill()
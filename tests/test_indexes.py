@@ -0,0 +1,17 @@
+"""The index registry against the queries the app sends."""
+
+import pytest
+
+from utils.indexes import apply_indexes, find_collection_scans, query_shape
+
+pytestmark = pytest.mark.anyio
+
+
+def test_query_shape_ignores_values():
+    assert query_shape({"userId": "a", "taskId": {"$in": ["1", "2"]}}) == query_shape({"taskId": {"$in": []}, "userId": "b"})
+    assert query_shape({"userId": "a"}) != query_shape({"userId": {"$in": ["a"]}})
+
+
+async def test_no_registered_query_scans_a_collection(mongo_db):
+    await apply_indexes(mongo_db)
+    assert await find_collection_scans(mongo_db) == []
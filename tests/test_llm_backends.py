@@ -0,0 +1,32 @@
+"""Record/replay chat model: transcripts recorded from one call style replay in either."""
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agents.llm_backends import FakeChatModel, RecordReplayChatModel
+
+pytestmark = pytest.mark.anyio
+
+PROMPT = [HumanMessage(content="Which task should I start with?")]
+
+
+def test_sync_record_then_replay(tmp_path):
+    path = str(tmp_path / "transcripts" / "agent_llm.jsonl")
+    recorded = RecordReplayChatModel(inner=FakeChatModel(), path=path, mode="record").invoke(PROMPT)
+
+    replayed = RecordReplayChatModel(path=path, mode="replay").invoke(PROMPT)
+    assert replayed.content == recorded.content
+
+
+async def test_async_replay_of_sync_recording(tmp_path):
+    path = str(tmp_path / "agent_llm.jsonl")
+    recorded = RecordReplayChatModel(inner=FakeChatModel(), path=path, mode="record").invoke(PROMPT)
+
+    replayed = await RecordReplayChatModel(path=path, mode="replay").ainvoke(PROMPT)
+    assert replayed.content == recorded.content
+
+
+def test_replay_miss_names_the_transcript(tmp_path):
+    path = str(tmp_path / "agent_llm.jsonl")
+    with pytest.raises(LookupError, match="agent_llm.jsonl"):
+        RecordReplayChatModel(path=path, mode="replay").invoke(PROMPT)
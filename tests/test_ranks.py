@@ -0,0 +1,144 @@
+"""Background rank rebalancing never overwrites a list that changed after it was read."""
+
+import pytest
+
+from routers import tasks as tasks_router
+from utils import assignments
+from utils.ranking import initial_ranks, sort_by_rank
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "rank_user"
+
+
+@pytest.fixture(params=assignments.STORAGE_MODES)
+def storage(request, monkeypatch):
+    monkeypatch.setattr(assignments, "ASSIGNMENTS_STORAGE", request.param)
+    return request.param
+
+
+async def assign_tasks(client) -> list:
+    """Five tasks, the first four assigned to USER_ID and ranked with the fourth first."""
+    project = (await client.post("/projects/", json={"name": "Ranks"})).json()
+    ids = []
+    for sequence_id in range(5):
+        task = (await client.post("/tasks/", json={"project_id": project["id"], "title": f"Task {sequence_id}"})).json()
+        if sequence_id < 4:
+            await client.post("/tasks/user-tasks", json={"userId": USER_ID, "taskId": task["id"], "sequenceId": sequence_id})
+        ids.append(task["id"])
+    # Give every assignment a rank: move the last task to the front
+    response = await client.post("/tasks/move-user-task", json={"userId": USER_ID, "taskId": ids[3], "nextTaskId": ids[0]})
+    assert response.status_code == 200, response.text
+    return ids
+
+
+@pytest.fixture
+async def task_ids(client, storage):
+    return await assign_tasks(client)
+
+
+async def ranks(db) -> dict:
+    ordered = sort_by_rank(await assignments.load_assignments(db, USER_ID, fields=("taskId", "rank", "sequenceId")))
+    return {t["taskId"]: t.get("rank") for t in ordered}
+
+
+async def test_rebalance_keeps_order(db, task_ids):
+    before = await ranks(db)
+    await tasks_router.rebalance_user_ranks(db, USER_ID)
+    after = await ranks(db)
+    assert list(after) == list(before) == [task_ids[3], *task_ids[:3]]
+    assert list(after.values()) == initial_ranks(4)
+
+
+@pytest.mark.parametrize("change", ["move", "assign"])
+async def test_rebalance_skips_list_changed_after_read(client, db, task_ids, monkeypatch, change):
+    load_assignments = tasks_router.load_assignments
+
+    async def load_then_change(*args, **kwargs):
+        task_assignments = await load_assignments(*args, **kwargs)
+        # Only the rebalance's own read; the request below reads as usual
+        monkeypatch.setattr(tasks_router, "load_assignments", load_assignments)
+        # Another request changes the list between the rebalance's read and its write
+        if change == "move":
+            response = await client.post("/tasks/move-user-task", json={"userId": USER_ID, "taskId": task_ids[0], "prevTaskId": task_ids[2]})
+        else:
+            response = await client.post("/tasks/user-tasks", json={"userId": USER_ID, "taskId": task_ids[4], "sequenceId": 4})
+        assert response.status_code < 400, response.text
+        return task_assignments
+
+    monkeypatch.setattr(tasks_router, "load_assignments", load_then_change)
+    await tasks_router.rebalance_user_ranks(db, USER_ID)
+
+    changed = await ranks(db)
+    await tasks_router.rebalance_user_ranks(db, USER_ID)
+    # The first rebalance wrote nothing, so the change survived; the retry applies
+    assert list(await ranks(db)) == list(changed)
+    if change == "move":
+        assert list(changed) == [task_ids[3], task_ids[1], task_ids[2], task_ids[0]]
+    else:
+        assert task_ids[4] in changed and len(changed) == 5
+
+
+async def test_dual_rebalance_copies_unmigrated_assignments(client, db, monkeypatch):
+    monkeypatch.setattr(assignments, "ASSIGNMENTS_STORAGE", "embedded")
+    task_ids = await assign_tasks(client)
+    monkeypatch.setattr(assignments, "ASSIGNMENTS_STORAGE", "dual")
+
+    await tasks_router.rebalance_user_ranks(db, USER_ID)
+    # The split layout now holds every assignment, with the rebalanced ranks
+    monkeypatch.setattr(assignments, "ASSIGNMENTS_STORAGE", "split")
+    after = await ranks(db)
+    assert list(after) == [task_ids[3], *task_ids[:3]]
+    assert list(after.values()) == initial_ranks(4)
+
+
+async def test_sequence_update_moves_task_in_ranked_list(client, db, task_ids):
+    before = await ranks(db)
+    response = await client.put(f"/tasks/user-tasks/{USER_ID}/{task_ids[0]}", params={"sequenceId": 5, "isCompleted": True})
+    assert response.status_code == 200, response.text
+
+    after = await ranks(db)
+    assert list(after) == [task_ids[3], task_ids[1], task_ids[2], task_ids[0]]
+    # Only the moved task's rank changed
+    assert {t: r for t, r in after.items() if t != task_ids[0]} == {t: r for t, r in before.items() if t != task_ids[0]}
+    task_assignments = await assignments.load_assignments(db, USER_ID, fields=("taskId", "isCompleted"))
+    assert [t["taskId"] for t in task_assignments if t.get("isCompleted")] == [task_ids[0]]
+
+
+async def test_sequence_update_of_unknown_task_is_404(client, task_ids):
+    response = await client.put(f"/tasks/user-tasks/{USER_ID}/{task_ids[4]}", params={"sequenceId": 1})
+    assert response.status_code == 404
+
+
+async def test_partial_rearrange_keeps_other_ranks(client, db, task_ids):
+    before = await ranks(db)
+    response = await client.post("/tasks/rearrange-user-tasks", json={
+        "userId": USER_ID, "tasks": [{"taskId": task_ids[1], "sequenceId": 10}, {"taskId": "missing", "sequenceId": 0}]
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["notFound"] == ["missing"]
+
+    after = await ranks(db)
+    assert list(after) == [task_ids[3], task_ids[0], task_ids[2], task_ids[1]]
+    assert all(after[t] == before[t] for t in (task_ids[3], task_ids[0], task_ids[2]))
+
+
+async def test_full_rearrange_replaces_ranks(client, db, task_ids):
+    response = await client.post("/tasks/rearrange-user-tasks", json={
+        "userId": USER_ID, "tasks": [{"taskId": task_id, "sequenceId": index} for index, task_id in enumerate(task_ids[:4])]
+    })
+    assert response.status_code == 200, response.text
+    after = await ranks(db)
+    assert list(after) == task_ids[:4]
+    assert list(after.values()) == initial_ranks(4)
+
+
+async def test_rearrange_ranks_tasks_linked_after_ranking(client, db, task_ids):
+    await client.post("/tasks/user-tasks", json={"userId": USER_ID, "taskId": task_ids[4], "sequenceId": 4})
+    response = await client.post("/tasks/rearrange-user-tasks", json={
+        "userId": USER_ID, "tasks": [{"taskId": task_ids[4], "sequenceId": 0}]
+    })
+    assert response.status_code == 200, response.text
+    after = await ranks(db)
+    assert list(after) == [task_ids[4], task_ids[3], task_ids[0], task_ids[1], task_ids[2]]
+    assert None not in after.values()
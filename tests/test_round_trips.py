@@ -0,0 +1,134 @@
+"""
+Database round trips per endpoint.
+
+Each request runs against tests/fake_mongo.py, which logs one (collection,
+command) entry per call that would be a round trip to mongod, and against a
+real mongod logged the same way (tests/real_mongo.py) when one is
+available; the tests pin the exact list.
+"""
+
+import pytest
+
+from utils import assignments
+
+pytestmark = pytest.mark.anyio
+
+
+async def call(client, db, method: str, url: str, **kwargs):
+    db.calls.clear()
+    response = await client.request(method, url, **kwargs)
+    assert response.status_code < 400, response.text
+    return response.json(), list(db.calls)
+
+
+@pytest.fixture
+async def task(client):
+    project = (await client.post("/projects/", json={"name": "Round trips"})).json()
+    return (await client.post("/tasks/", json={"project_id": project["id"], "title": "First task"})).json()
+
+
+async def test_create_project(client, db):
+    _, calls = await call(client, db, "POST", "/projects/", json={"name": "Round trips"})
+    assert calls == [("projects", "insert")]
+
+
+async def test_create_task(client, db):
+    project = (await client.post("/projects/", json={"name": "Round trips"})).json()
+    _, calls = await call(client, db, "POST", "/tasks/", json={"project_id": project["id"], "title": "First task"})
+    assert calls == [("tasks", "insert")]
+
+
+async def test_update_task(client, db, task):
+    _, calls = await call(client, db, "PUT", f"/tasks/{task['id']}", json={"status": "in_progress"})
+    assert calls == [("tasks", "findAndModify")]
+
+
+@pytest.mark.parametrize("url", ["/goals/", "/goals/manage-goals"])
+async def test_set_goals(client, db, url):
+    _, calls = await call(client, db, "POST", url, json={"userId": "rt_user", "goals": "Learn MongoDB"})
+    assert calls == [("goals", "findAndModify")]
+
+
+async def test_manage_agent(client, db):
+    _, calls = await call(client, db, "POST", "/chat/manage-agent", json={"userId": "rt_user", "agentName": "Coach"})
+    assert calls == [("agents", "findAndModify")]
+
+
+async def test_agent_name_update_message(client, db):
+    await client.post("/chat/manage-agent", json={"userId": "rt_user", "agentName": "Coach"})
+    _, calls = await call(client, db, "POST", "/chat/agent",
+                          json={"userId": "rt_user", "message": "Updated the name of the agent to Coach"})
+    assert calls == [("chats", "insert")]
+
+
+async def test_get_agent_default_is_cached(client, db):
+    _, calls = await call(client, db, "POST", "/chat/get-agent", json={"userId": "no_agent_yet"})
+    assert calls == [("agents", "find")]
+    body, calls = await call(client, db, "POST", "/chat/get-agent", json={"userId": "no_agent_yet"})
+    assert body["agent"]["isDefault"] and calls == []
+
+
+async def test_project_stats(client, db):
+    projects = [(await client.post("/projects/", json={"name": name})).json()["id"] for name in ("One", "Two", "Empty")]
+    for project_id, status in [(projects[0], "completed"), (projects[0], "pending"), (projects[0], "pending"),
+                               (projects[1], "in_progress"), (projects[1], "blocked")]:
+        await client.post("/tasks/", json={"project_id": project_id, "title": "Task", "status": status})
+
+    stats, calls = await call(client, db, "GET", "/projects/stats", params={"ids": ",".join(projects)})
+    assert calls == [("tasks", "aggregate")]
+    assert stats[projects[0]] == {
+        "total_tasks": 3, "completed": 1, "pending": 2, "in_progress": 0, "by_status": {"completed": 1, "pending": 2}
+    }
+    assert stats[projects[1]]["total_tasks"] == 2 and stats[projects[1]]["by_status"] == {"in_progress": 1, "blocked": 1}
+    assert stats[projects[2]] == {"total_tasks": 0, "completed": 0, "pending": 0, "in_progress": 0, "by_status": {}}
+
+    single, calls = await call(client, db, "GET", f"/projects/{projects[0]}/stats")
+    assert single == stats[projects[0]] and calls == [("tasks", "aggregate")]
+
+
+# Assignment endpoints, per storage layout (see utils/assignments.py)
+ASSIGNMENT_ROUND_TRIPS = {
+    "embedded": {
+        "comment": [("assignments", "update")],
+        "complete": [("assignments", "update")],
+        "delete": [("assignments", "update")],
+    },
+    "split": {
+        "comment": [("user_tasks", "update"), ("task_comments", "insert")],
+        "complete": [("user_tasks", "update")],
+        "delete": [("user_tasks", "delete"), ("task_comments", "delete")],
+    },
+}
+
+
+@pytest.fixture(params=sorted(ASSIGNMENT_ROUND_TRIPS))
+def storage(request, monkeypatch):
+    monkeypatch.setattr(assignments, "ASSIGNMENTS_STORAGE", request.param)
+    return request.param
+
+
+async def test_assignment_writes(client, db, task, storage):
+    expected = ASSIGNMENT_ROUND_TRIPS[storage]
+    await client.post("/tasks/user-tasks", json={"userId": "rt_user", "taskId": task["id"]})
+
+    _, calls = await call(client, db, "POST", "/tasks/task-comments",
+                          json={"userId": "rt_user", "taskId": task["id"], "comment": "Started"})
+    assert calls == expected["comment"]
+
+    _, calls = await call(client, db, "POST", "/tasks/update-task-completion-status",
+                          json={"userId": "rt_user", "taskId": task["id"], "isCompleted": True})
+    assert calls == expected["complete"]
+
+    _, calls = await call(client, db, "POST", "/tasks/delete-user-task",
+                          json={"userId": "rt_user", "taskId": task["id"]})
+    assert calls == expected["delete"]
+
+
+async def test_assignment_write_to_unknown_task(client, db, storage):
+    await client.post("/projects/", json={"name": "Round trips"})
+    db.calls.clear()
+    response = await client.post("/tasks/task-comments", json={"userId": "rt_user", "taskId": "missing", "comment": "?"})
+    assert response.status_code == 404
+    # The guarded write reports the miss; only then is the user looked up, for the error message
+    collection = ASSIGNMENT_ROUND_TRIPS[storage]["comment"][0][0]
+    assert db.calls == [(collection, "update"), (collection, "find")]
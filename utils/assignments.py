@@ -0,0 +1,518 @@
+"""
+Storage for per-user task assignments.
+
+Two layouts are supported:
+
+- embedded: one `assignments` document per user with a `tasks` array whose
+  elements embed their `comments`. Every update rewrites that one document,
+  which grows with every task and comment the user ever gets.
+- split: one `user_tasks` document per (userId, taskId), unique on the pair,
+  and one `task_comments` document per comment. An update touches one small
+  document however long the user's history is.
+
+ASSIGNMENTS_STORAGE picks the layout the routers and agent tools use:
+
+    embedded  embedded layout only (default)
+    dual      write both layouts; read the split layout, falling back per task
+              to the embedded document for assignments not migrated yet
+    split     split layout only
+
+Online migration: deploy with ASSIGNMENTS_STORAGE=dual, run
+`python -m utils.assignments --migrate` (safe to re-run), check
+`python -m utils.assignments --status`, then deploy with split. The
+`assignments` collection can be dropped once nothing reads it.
+"""
+
+import asyncio
+import os
+import sys
+from typing import Dict, Iterable, List, Optional, Set
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from utils.repository import now_ms, update_if_matched
+
+ASSIGNMENTS_STORAGE = os.getenv("ASSIGNMENTS_STORAGE", "embedded")
+STORAGE_MODES = ("embedded", "dual", "split")
+
+# Fields kept on each assignment; comments are stored separately in the split layout
+ASSIGNMENT_FIELDS = ("taskId", "assignedBy", "sequenceId", "rank", "isCompleted")
+
+COMMENT_SORT = [("taskId", ASCENDING), ("createdAt", ASCENDING)]
+
+# Attempts at copying a user's assignments while they are being written to
+MIGRATION_COPY_ROUNDS = 5
+
+
+def _storage() -> str:
+    if ASSIGNMENTS_STORAGE not in STORAGE_MODES:
+        raise ValueError(f"ASSIGNMENTS_STORAGE must be one of {', '.join(STORAGE_MODES)}")
+    return ASSIGNMENTS_STORAGE
+
+
+def _writes_embedded() -> bool:
+    return _storage() in ("embedded", "dual")
+
+
+def _writes_split() -> bool:
+    return _storage() in ("dual", "split")
+
+
+def _split_document(user_id: str, task_assignment: dict) -> dict:
+    document = {field: task_assignment[field] for field in ASSIGNMENT_FIELDS if field in task_assignment}
+    document["userId"] = user_id
+    return document
+
+
+def _comment_document(user_id: str, task_id: str, comment: dict) -> dict:
+    return {"userId": user_id, "taskId": task_id, **comment}
+
+
+async def _load_embedded(db, user_id: str, fields: Optional[Iterable[str]]) -> Optional[List[dict]]:
+    projection = {f"tasks.{field}": 1 for field in fields} if fields else None
+    assignment = await db.assignments.find_one({"userId": user_id}, projection)
+    if assignment is None:
+        return None
+    return assignment.get("tasks", [])
+
+
+async def _load_split(db, user_id: str, fields: Optional[Iterable[str]], comments: bool) -> List[dict]:
+    projection = {"_id": 0, "userId": 0} if not fields else {"_id": 0, "taskId": 1, **{f: 1 for f in fields}}
+    task_assignments = await db.user_tasks.find({"userId": user_id}, projection).to_list(length=None)
+    if not comments:
+        return task_assignments
+
+    comments_by_task = {}
+    async for comment in db.task_comments.find({"userId": user_id}, {"_id": 0, "userId": 0}).sort(COMMENT_SORT):
+        comments_by_task.setdefault(comment.pop("taskId"), []).append(comment)
+    for task_assignment in task_assignments:
+        task_assignment["comments"] = comments_by_task.get(task_assignment["taskId"], [])
+    return task_assignments
+
+
+async def load_assignments(
+    db,
+    user_id: str,
+    fields: Optional[Iterable[str]] = None,
+    comments: bool = True
+) -> Optional[List[dict]]:
+    """
+    Return the user's task assignments in the embedded shape
+    (taskId, assignedBy, sequenceId, rank, isCompleted, comments), or None if
+    the user has never had any. `fields` limits what is fetched; comments are
+    only loaded when `comments` is true and no `fields` are given.
+    """
+    storage = _storage()
+    with_comments = comments and not fields
+    if storage == "embedded":
+        return await _load_embedded(db, user_id, fields)
+    if storage == "split":
+        task_assignments = await _load_split(db, user_id, fields, with_comments)
+        return task_assignments or None
+
+    embedded, split = await asyncio.gather(
+        _load_embedded(db, user_id, fields),
+        _load_split(db, user_id, fields, with_comments)
+    )
+    if embedded is None and not split:
+        return None
+
+    # Embedded order is kept; migrated entries are served from the split layout
+    split_by_task = {t["taskId"]: t for t in split}
+    merged = [split_by_task.pop(t.get("taskId"), t) for t in embedded or []]
+    return merged + list(split_by_task.values())
+
+
+async def has_assignments(db, user_id: str) -> bool:
+    if _writes_embedded() and await db.assignments.find_one({"userId": user_id}, {"_id": 1}):
+        return True
+    return _writes_split() and await db.user_tasks.find_one({"userId": user_id}, {"_id": 1}) is not None
+
+
+async def assigned_task_ids(db, user_ids: List[str]) -> Dict[str, Set[str]]:
+    """Task IDs each user already has, with one query per layout."""
+    assigned = {user_id: set() for user_id in user_ids}
+    if _writes_embedded():
+        async for assignment in db.assignments.find({"userId": {"$in": user_ids}}, {"userId": 1, "tasks.taskId": 1}):
+            assigned[assignment["userId"]].update(t.get("taskId") for t in assignment.get("tasks", []))
+    if _writes_split():
+        async for task_assignment in db.user_tasks.find({"userId": {"$in": user_ids}}, {"userId": 1, "taskId": 1}):
+            assigned[task_assignment["userId"]].add(task_assignment["taskId"])
+    return assigned
+
+
+async def add_assignments(db, assignments_by_user: Dict[str, List[dict]]) -> Dict[str, str]:
+    """
+    Add task assignments for several users with one bulk_write per layout.
+    Tasks a user already has are left untouched in the split layout.
+    Returns {userId: error message} for users whose write failed.
+    """
+    failed = {}
+
+    if _writes_embedded():
+        users = list(assignments_by_user)
+        operations = [
+            UpdateOne(
+                {"userId": user_id},
+                {"$addToSet": {"tasks": {"$each": assignments_by_user[user_id]}}},
+                upsert=True
+            )
+            for user_id in users
+        ]
+        try:
+            await db.assignments.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed[users[error["index"]]] = error.get("errmsg", "write failed")
+
+    if _writes_split():
+        pairs = [
+            (user_id, task_assignment)
+            for user_id, task_assignments in assignments_by_user.items() if user_id not in failed
+            for task_assignment in task_assignments
+        ]
+        now = now_ms()
+        operations = [
+            UpdateOne(
+                {"userId": user_id, "taskId": task_assignment["taskId"]},
+                {"$setOnInsert": {**_split_document(user_id, task_assignment), "assigned_at": now}},
+                upsert=True
+            )
+            for user_id, task_assignment in pairs
+        ]
+        if operations:
+            try:
+                await db.user_tasks.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    failed.setdefault(pairs[error["index"]][0], error.get("errmsg", "write failed"))
+
+    return failed
+
+
+async def update_assignment(db, user_id: str, task_id: str, fields: dict) -> bool:
+    """$set `fields` on one assignment; True if the user has the task."""
+    matched = False
+    if _writes_embedded():
+        matched = await update_if_matched(
+            db.assignments,
+            {"userId": user_id, "tasks.taskId": task_id},
+            {"$set": {f"tasks.$[elem].{field}": value for field, value in fields.items()}},
+            array_filters=[{"elem.taskId": task_id}]
+        )
+    if _writes_split():
+        split_matched = await update_if_matched(db.user_tasks, {"userId": user_id, "taskId": task_id}, {"$set": fields})
+        if matched and not split_matched:
+            # Not migrated yet (dual): copy the embedded assignment, which has this write
+            await _copy_to_split(db, user_id, {task_id})
+        matched = matched or split_matched
+    return matched
+
+
+def _embedded_set(fields_by_task: Dict[str, dict]) -> tuple:
+    """$set paths and array filters for different fields on several embedded tasks."""
+    update_fields = {}
+    array_filters = []
+    for index, (task_id, fields) in enumerate(fields_by_task.items()):
+        for field, value in fields.items():
+            update_fields[f"tasks.$[t{index}].{field}"] = value
+        array_filters.append({f"t{index}.taskId": task_id})
+    return update_fields, array_filters
+
+
+async def update_assignments(db, user_id: str, fields_by_task: Dict[str, dict]) -> Optional[Set[str]]:
+    """
+    $set different fields on several of a user's assignments. Returns the
+    task IDs the user had (so callers can report unknown ones), or None if
+    the user has no assignments.
+    """
+    assigned = None
+    embedded_assigned = set()
+
+    if _writes_embedded():
+        update_fields, array_filters = _embedded_set(fields_by_task)
+        # The pre-update document tells which of the tasks were assigned
+        assignment = await db.assignments.find_one_and_update(
+            {"userId": user_id},
+            {"$set": update_fields},
+            array_filters=array_filters,
+            projection={"tasks.taskId": 1}
+        )
+        if assignment is not None:
+            assigned = embedded_assigned = {t.get("taskId") for t in assignment.get("tasks", [])}
+
+    if _writes_split():
+        operations = [
+            UpdateOne({"userId": user_id, "taskId": task_id}, {"$set": fields})
+            for task_id, fields in fields_by_task.items()
+        ]
+        if assigned is None:
+            assigned = {t["taskId"] async for t in db.user_tasks.find({"userId": user_id}, {"taskId": 1})} or None
+        if operations:
+            result = await db.user_tasks.bulk_write(operations, ordered=False)
+            if embedded_assigned and result.matched_count < len(operations):
+                # Dual: copy the assignments with no split row yet, which have this write
+                await _copy_unmigrated(db, user_id, embedded_assigned & set(fields_by_task))
+
+    return assigned
+
+
+def _rank_update(rank: Optional[str]) -> dict:
+    return {"$unset": {"rank": ""}} if rank is None else {"$set": {"rank": rank}}
+
+
+async def replace_ranks(db, user_id: str, old_ranks: Dict[str, Optional[str]], new_ranks: Dict[str, str]) -> bool:
+    """
+    Rewrite the ranks of all of a user's assignments, but only if the user
+    still has exactly the tasks in `old_ranks`, with those ranks. Returns
+    False, leaving the ranks as they are, if the list changed since it was read.
+
+    The embedded check and write are one atomic update. Split rows are each
+    written only if they still hold their old rank; in the split layout a
+    partial write (or a task added meanwhile) is put back. In dual mode the
+    embedded write is the check, and tasks with no split row yet are copied
+    from the embedded document, which already has their new ranks.
+    """
+    if _writes_embedded():
+        update_fields, array_filters = _embedded_set({task_id: {"rank": rank} for task_id, rank in new_ranks.items()})
+        unchanged = {
+            "$size": len(old_ranks),
+            "$all": [{"$elemMatch": {"taskId": task_id, "rank": rank}} for task_id, rank in old_ranks.items()]
+        }
+        if not await update_if_matched(
+            db.assignments, {"userId": user_id, "tasks": unchanged}, {"$set": update_fields}, array_filters=array_filters
+        ):
+            return False
+
+    if _writes_split():
+        result = await db.user_tasks.bulk_write([
+            UpdateOne({"userId": user_id, "taskId": task_id, "rank": old_ranks[task_id]}, {"$set": {"rank": rank}})
+            for task_id, rank in new_ranks.items()
+        ], ordered=False)
+        if _writes_embedded():
+            # Dual: copy tasks with no split row yet; a row whose rank a move
+            # rewrote since the check keeps that rank
+            if result.matched_count < len(new_ranks):
+                await _copy_unmigrated(db, user_id, set(new_ranks))
+        elif (
+            result.matched_count < len(new_ranks)
+            or await db.user_tasks.count_documents({"userId": user_id}) != len(old_ranks)
+        ):
+            await db.user_tasks.bulk_write([
+                UpdateOne({"userId": user_id, "taskId": task_id, "rank": rank}, _rank_update(old_ranks[task_id]))
+                for task_id, rank in new_ranks.items()
+            ], ordered=False)
+            return False
+    return True
+
+
+async def add_comment(db, user_id: str, task_id: str, comment: dict) -> bool:
+    """Append a comment to one assignment; True if the user has the task."""
+    matched = False
+    if _writes_embedded():
+        matched = await update_if_matched(
+            db.assignments,
+            {"userId": user_id, "tasks.taskId": task_id},
+            {"$push": {"tasks.$[elem].comments": comment}},
+            array_filters=[{"elem.taskId": task_id}]
+        )
+    if _writes_split():
+        # Guarded on the assignment row so comments never outlive (or precede) it
+        split_matched = await update_if_matched(
+            db.user_tasks,
+            {"userId": user_id, "taskId": task_id},
+            {"$inc": {"commentCount": 1}, "$set": {"lastCommentAt": comment["createdAt"]}}
+        )
+        if split_matched:
+            await db.task_comments.insert_one(_comment_document(user_id, task_id, comment))
+        elif matched:
+            # Not migrated yet (dual): copy the embedded assignment, comments included
+            await _copy_to_split(db, user_id, {task_id})
+        matched = matched or split_matched
+    return matched
+
+
+async def remove_assignment(db, user_id: str, task_id: str) -> bool:
+    """Remove one assignment and its comments; True if the user had the task."""
+    removed = False
+    if _writes_embedded():
+        removed = await update_if_matched(
+            db.assignments,
+            {"userId": user_id, "tasks.taskId": task_id},
+            {"$pull": {"tasks": {"taskId": task_id}}}
+        )
+    if _writes_split():
+        result = await db.user_tasks.delete_one({"userId": user_id, "taskId": task_id})
+        if result.deleted_count:
+            await db.task_comments.delete_many({"userId": user_id, "taskId": task_id})
+        removed = removed or result.deleted_count > 0
+    return removed
+
+
+async def _load_embedded_tasks(db, user_id: str, task_ids: Optional[Set[str]] = None) -> Optional[List[dict]]:
+    assignment = await db.assignments.find_one({"userId": user_id}, {"tasks": 1})
+    if assignment is None:
+        return None
+    return [
+        t for t in assignment.get("tasks", [])
+        if t.get("taskId") and (task_ids is None or t["taskId"] in task_ids)
+    ]
+
+
+def _copy_snapshot(task_assignments: List[dict]) -> dict:
+    """What a split copy of these assignments holds, for telling whether they changed."""
+    return {
+        t["taskId"]: ({field: t.get(field) for field in ASSIGNMENT_FIELDS}, len(t.get("comments", [])))
+        for t in task_assignments
+    }
+
+
+async def _write_split_copy(db, user_id: str, task_assignments: List[dict]) -> tuple:
+    now = now_ms()
+    task_operations = []
+    comment_operations = []
+    for task_assignment in task_assignments:
+        task_id = task_assignment["taskId"]
+        comments = task_assignment.get("comments", [])
+        update = {
+            # $set, not $setOnInsert: the embedded copy is the newer one while it is migrated
+            "$set": {**_split_document(user_id, task_assignment), "commentCount": len(comments)},
+            "$setOnInsert": {"assigned_at": now}
+        }
+        if comments:
+            update["$set"]["lastCommentAt"] = comments[-1].get("createdAt")
+        unset = {field: "" for field in ASSIGNMENT_FIELDS if field not in task_assignment}
+        if unset:
+            update["$unset"] = unset
+        task_operations.append(UpdateOne({"userId": user_id, "taskId": task_id}, update, upsert=True))
+        for comment in comments:
+            comment_operations.append(UpdateOne(
+                _comment_document(user_id, task_id, comment),
+                {"$setOnInsert": {"migrated_at": now}},
+                upsert=True
+            ))
+
+    if task_operations:
+        await db.user_tasks.bulk_write(task_operations, ordered=False)
+    if comment_operations:
+        await db.task_comments.bulk_write(comment_operations, ordered=False)
+    return len(task_operations), len(comment_operations)
+
+
+async def _copy_unmigrated(db, user_id: str, task_ids: Set[str]):
+    """Dual: copy those of `task_ids` that have no split row yet from the embedded document."""
+    unmigrated = task_ids - {
+        t["taskId"] async for t in db.user_tasks.find({"userId": user_id, "taskId": {"$in": list(task_ids)}}, {"taskId": 1})
+    }
+    if unmigrated:
+        await _copy_to_split(db, user_id, unmigrated)
+
+
+async def _copy_to_split(db, user_id: str, task_ids: Optional[Set[str]] = None) -> Optional[tuple]:
+    """
+    Copy the user's embedded assignments (all, or just `task_ids`) into the
+    split layout with their current values and comments. A dual-mode write
+    that lands on the embedded document while the copy is written could be
+    overwritten by the older value, so the document is re-read after each
+    copy and copied again until it holds still. Returns (tasks copied,
+    comments copied), or None if it never did.
+    """
+    task_assignments = await _load_embedded_tasks(db, user_id, task_ids)
+    for _ in range(MIGRATION_COPY_ROUNDS):
+        if not task_assignments:
+            return 0, 0
+        copied = await _write_split_copy(db, user_id, task_assignments)
+        current = await _load_embedded_tasks(db, user_id, task_ids)
+        if current is not None and _copy_snapshot(current) == _copy_snapshot(task_assignments):
+            return copied
+        task_assignments = current
+    print(f"⚠️ Assignments of {user_id} kept changing while being copied to the split layout")
+    return None
+
+
+async def migrate_user(db, assignment: dict) -> Optional[tuple]:
+    """
+    Copy one embedded assignment document into the split layout.
+    The document is re-read rather than trusted from the migration cursor, and
+    its current values overwrite split rows written earlier. Idempotent:
+    comments are not duplicated, and split rows for tasks removed from the
+    embedded document in the meantime are deleted. Returns (tasks copied,
+    comments copied), or None if the user's assignments kept changing; the
+    user then stays pending for the next run.
+    """
+    user_id = assignment["userId"]
+    copied = await _copy_to_split(db, user_id)
+    if copied is None:
+        return None
+
+    # Reconcile against the embedded document as it is now
+    current = await db.assignments.find_one_and_update(
+        {"_id": assignment["_id"]},
+        {"$set": {"migrated_at": now_ms()}},
+        projection={"tasks.taskId": 1}
+    )
+    if current is not None:
+        current_ids = [t.get("taskId") for t in current.get("tasks", [])]
+        stale = {"userId": user_id, "taskId": {"$nin": current_ids}}
+        await db.user_tasks.delete_many(stale)
+        await db.task_comments.delete_many(stale)
+
+    return copied
+
+
+async def migrate(db, batch_size: int = 100) -> dict:
+    """Migrate every embedded assignment document that has not been migrated yet."""
+    totals = {"users": 0, "tasks": 0, "comments": 0, "skipped": 0}
+    cursor = db.assignments.find({"migrated_at": {"$exists": False}}).batch_size(batch_size)
+    async for assignment in cursor:
+        copied = await migrate_user(db, assignment)
+        if copied is None:
+            totals["skipped"] += 1
+            continue
+        tasks, comments = copied
+        totals["users"] += 1
+        totals["tasks"] += tasks
+        totals["comments"] += comments
+        if totals["users"] % batch_size == 0:
+            print(f"🚚 Migrated {totals['users']} users ({totals['tasks']} tasks, {totals['comments']} comments)")
+    print(f"✅ Migration done: {totals['users']} users, {totals['tasks']} tasks, {totals['comments']} comments")
+    if totals["skipped"]:
+        print(f"⚠️ {totals['skipped']} users were changing during the copy; re-run --migrate for them")
+    return totals
+
+
+async def migration_status(db) -> dict:
+    status = {
+        "embedded_users": await db.assignments.count_documents({}),
+        "pending_users": await db.assignments.count_documents({"migrated_at": {"$exists": False}}),
+        "split_assignments": await db.user_tasks.estimated_document_count(),
+        "split_comments": await db.task_comments.estimated_document_count()
+    }
+    for key, value in status.items():
+        print(f"{key:<18} {value}")
+    return status
+
+
+async def _main(argv: List[str]) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from utils.indexes import INDEXES, apply_indexes
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL"))
+    db = client[os.getenv("DATABASE_NAME", "projects")]
+    try:
+        if "--migrate" in argv:
+            # The unique (userId, taskId) index must exist before rows are upserted concurrently
+            await apply_indexes(db, {name: INDEXES[name] for name in ("user_tasks", "task_comments")})
+            batch_size = int(argv[argv.index("--batch-size") + 1]) if "--batch-size" in argv else 100
+            await migrate(db, batch_size)
+        status = await migration_status(db)
+        return 1 if status["pending_users"] else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
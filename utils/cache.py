@@ -0,0 +1,415 @@
+import abc
+import asyncio
+import copy
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional
+
+from bson import json_util
+
+# memory: per-process LRU (single worker); redis: shared by every worker/pod
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "learning_api")
+# How long a worker may serve a Redis value from its own memory; bounds
+# staleness if an invalidation message is missed (e.g. during a reconnect)
+CACHE_LOCAL_TTL_SECONDS = float(os.getenv("CACHE_LOCAL_TTL_SECONDS", "5"))
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries also expire after `ttl` seconds.
+    Not thread-safe; meant for use from the asyncio event loop.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        return self._data.pop(key, None) is not None
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class CacheBackend(abc.ABC):
+    """
+    Async key/value cache interface shared by the catalog, profile and
+    recommendation caches. Keys are strings; values are BSON-compatible
+    (documents with ObjectId/datetime are fine). get() returns a copy the
+    caller may mutate.
+
+    Every write (set, set_many, delete, clear) bumps the cache's version.
+    Values read from the database go in with fill(), which only stores them
+    if the version is still the one taken before the read, so a slow read
+    never overwrites a newer write or undoes an invalidation.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Any:
+        ...
+
+    async def get_many(self, keys: List[str]) -> dict:
+        """Values for the keys that are cached; missing keys are left out."""
+        values = {}
+        for key in keys:
+            value = await self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    async def set_many(self, values: dict, ttl: Optional[float] = None):
+        for key, value in values.items():
+            await self.set(key, value, ttl)
+
+    @abc.abstractmethod
+    async def delete(self, *keys: str):
+        ...
+
+    @abc.abstractmethod
+    async def clear(self):
+        ...
+
+    @abc.abstractmethod
+    async def version(self) -> int:
+        """Current version; take it before reading what will be passed to fill()."""
+
+    @abc.abstractmethod
+    async def fill(self, values: dict, version: int, ttl: Optional[float] = None) -> bool:
+        """Store values unless a write happened since `version`; returns whether they were stored."""
+
+    async def start(self):
+        """Start background work (e.g. listening for invalidations)."""
+
+    async def stop(self):
+        pass
+
+    @abc.abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class MemoryCache(CacheBackend):
+    """Per-process LRU + TTL cache. Only consistent with a single worker."""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._version = 0
+
+    async def get(self, key: str) -> Any:
+        return copy.deepcopy(self._entries.get(key))
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._version += 1
+        self._entries.set(key, copy.deepcopy(value), ttl)
+
+    async def delete(self, *keys: str):
+        self._version += 1
+        for key in keys:
+            self._entries.delete(key)
+
+    async def clear(self):
+        self._version += 1
+        self._entries.clear()
+
+    async def version(self) -> int:
+        return self._version
+
+    async def fill(self, values: dict, version: int, ttl: Optional[float] = None) -> bool:
+        if version != self._version:
+            return False
+        for key, value in values.items():
+            self._entries.set(key, copy.deepcopy(value), ttl)
+        return True
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self._entries.stats()}
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared by every worker through a Redis-protocol server, with a
+    short-lived copy of recent reads in each worker's memory.
+
+    Every write and invalidation is published on the cache's channel; the
+    other workers drop their local copy of the affected keys when they
+    receive it (start() runs the listener). Values are stored as extended
+    JSON so ObjectId and datetime survive the round trip.
+
+    The version is a Redis counter shared by every worker: writes increment
+    it before touching any key, and fill() checks it and stores its values
+    in one MULTI/EXEC under WATCH, so a write from any worker wins over a
+    fill that read the database before it.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        namespace: str,
+        client,
+        ttl: float = 600,
+        local_maxsize: int = 1024,
+        local_ttl: float = CACHE_LOCAL_TTL_SECONDS
+    ):
+        self._redis = client
+        self.ttl = ttl
+        self._prefix = f"{CACHE_KEY_PREFIX}:{namespace}:"
+        self._channel = f"{CACHE_KEY_PREFIX}:{namespace}:invalidate"
+        # Outside the key prefix, so clear() never deletes it
+        self._version_key = f"{CACHE_KEY_PREFIX}:version:{namespace}"
+        self._local = TTLCache(maxsize=local_maxsize, ttl=local_ttl)
+        self._worker_id = uuid.uuid4().hex
+        self._listener = None
+        self._local_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations_received = 0
+
+    async def get(self, key: str) -> Any:
+        value = self._local.get(key)
+        if value is None:
+            raw = await self._redis.get(self._prefix + key)
+            if raw is None:
+                self.misses += 1
+                return None
+            value = json_util.loads(raw)
+            self._local.set(key, value)
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    async def get_many(self, keys: List[str]) -> dict:
+        """Like get() for several keys, with one MGET for those not held locally."""
+        values = {}
+        remote = []
+        for key in keys:
+            value = self._local.get(key)
+            if value is None:
+                remote.append(key)
+            else:
+                values[key] = value
+        if remote:
+            for key, raw in zip(remote, await self._redis.mget([self._prefix + key for key in remote])):
+                if raw is not None:
+                    values[key] = json_util.loads(raw)
+                    self._local.set(key, values[key])
+        self.hits += len(values)
+        self.misses += len(keys) - len(values)
+        return copy.deepcopy(values)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, values: dict, ttl: Optional[float] = None):
+        """Store several values with one pipelined round trip and one invalidation message."""
+        if not values:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        self._local_writes += 1
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.incr(self._version_key)
+            for key, value in values.items():
+                pipe.set(self._prefix + key, json_util.dumps(value), px=int(ttl * 1000))
+                self._local.set(key, copy.deepcopy(value))
+            pipe.publish(self._channel, json_util.dumps({"keys": list(values), "from": self._worker_id}))
+            await pipe.execute()
+
+    async def delete(self, *keys: str):
+        if not keys:
+            return
+        self._local_writes += 1
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.incr(self._version_key)
+            pipe.delete(*[self._prefix + key for key in keys])
+            pipe.publish(self._channel, json_util.dumps({"keys": list(keys), "from": self._worker_id}))
+            await pipe.execute()
+        for key in keys:
+            self._local.delete(key)
+
+    async def clear(self):
+        self._local_writes += 1
+        await self._redis.incr(self._version_key)
+        batch = []
+        async for key in self._redis.scan_iter(match=self._prefix + "*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                await self._redis.delete(*batch)
+                batch = []
+        if batch:
+            await self._redis.delete(*batch)
+        self._local.clear()
+        await self._publish({"clear": True})
+
+    async def version(self) -> int:
+        return int(await self._redis.get(self._version_key) or 0)
+
+    async def fill(self, values: dict, version: int, ttl: Optional[float] = None) -> bool:
+        from redis.exceptions import WatchError
+
+        if not values:
+            return True
+        ttl = self.ttl if ttl is None else ttl
+        local_writes = self._local_writes
+        async with self._redis.pipeline(transaction=True) as pipe:
+            await pipe.watch(self._version_key)
+            if int(await pipe.get(self._version_key) or 0) != version:
+                return False
+            pipe.multi()
+            for key, value in values.items():
+                pipe.set(self._prefix + key, json_util.dumps(value), px=int(ttl * 1000))
+            try:
+                await pipe.execute()
+            except WatchError:
+                return False
+        # A write in this worker that ran after the EXEC owns the local copies now
+        if local_writes == self._local_writes:
+            for key, value in values.items():
+                self._local.set(key, copy.deepcopy(value))
+        return True
+
+    async def _publish(self, message: dict):
+        await self._redis.publish(self._channel, json_util.dumps({**message, "from": self._worker_id}))
+
+    def _apply_invalidation(self, message: dict):
+        if message.get("from") == self._worker_id:
+            return
+        self.invalidations_received += 1
+        if message.get("clear"):
+            self._local.clear()
+        for key in message.get("keys", []):
+            self._local.delete(key)
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self._channel)
+                try:
+                    # Anything cached locally before (re)subscribing may have missed messages
+                    self._local.clear()
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self._apply_invalidation(json_util.loads(message["data"]))
+                finally:
+                    await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Cache invalidation listener for {self._channel} failed: {str(e)}; retrying")
+                self._local.clear()
+                await asyncio.sleep(1)
+
+    async def start(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "local": self._local.stats(),
+            "invalidations_received": self.invalidations_received,
+            "listening": self._listener is not None and not self._listener.done()
+        }
+
+
+_redis_clients = {}
+_backends: List[CacheBackend] = []
+
+
+def _redis_client(url: str):
+    if url not in _redis_clients:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package (pip install redis)")
+        _redis_clients[url] = redis.from_url(url)
+    return _redis_clients[url]
+
+
+def build_cache(namespace: str, maxsize: int = 1024, ttl: float = 600) -> CacheBackend:
+    """Create a cache on the backend selected by CACHE_BACKEND."""
+    if CACHE_BACKEND == "redis":
+        backend = RedisCache(namespace, _redis_client(REDIS_URL), ttl=ttl, local_maxsize=maxsize)
+    elif CACHE_BACKEND == "memory":
+        backend = MemoryCache(maxsize=maxsize, ttl=ttl)
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r} (expected memory or redis)")
+    _backends.append(backend)
+    return backend
+
+
+async def start_caches():
+    for backend in _backends:
+        await backend.start()
+
+
+async def stop_caches():
+    for backend in _backends:
+        await backend.stop()
@@ -0,0 +1,125 @@
+import os
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from utils.cache import CacheBackend, build_cache
+
+
+class CatalogCache:
+    """
+    Project and task documents, cached by ID and (for task lists) by
+    project_id. Projects and tasks change rarely and only through
+    routers/projects.py and routers/tasks.py, which write through to the cache.
+
+    Full documents are cached so every projection can be served from one
+    entry; callers get copies they are free to mutate (serialize() does).
+    What a read fetches goes in with the backend's fill(), which skips it if
+    any worker wrote to the catalog since the read started, so a slow read
+    cannot undo an invalidation.
+    """
+
+    def __init__(self, backend: CacheBackend, enabled: bool = True):
+        self._entries = backend
+        self.enabled = enabled
+
+    async def _version(self) -> Optional[int]:
+        return await self._entries.version() if self.enabled else None
+
+    async def _fill(self, values: dict, version: Optional[int]):
+        if self.enabled and version is not None:
+            await self._entries.fill(values, version)
+
+    # Reads
+
+    async def get_projects(self, db, project_ids: Iterable[str]) -> Dict[str, dict]:
+        """Projects by ID; misses are fetched with one $in query. Unknown IDs are left out."""
+        return await self._get_many(db.projects, "project", project_ids)
+
+    async def get_tasks(self, db, task_ids: Iterable[str]) -> Dict[str, dict]:
+        """Tasks by ID; misses are fetched with one $in query. Unknown IDs are left out."""
+        return await self._get_many(db.tasks, "task", task_ids)
+
+    async def get_project(self, db, project_id: str) -> Optional[dict]:
+        return (await self.get_projects(db, [project_id])).get(project_id)
+
+    async def get_task(self, db, task_id: str) -> Optional[dict]:
+        return (await self.get_tasks(db, [task_id])).get(task_id)
+
+    async def get_project_tasks(self, db, project_id: str) -> List[dict]:
+        """All of a project's tasks, ordered by _id."""
+        key = f"project_tasks:{project_id}"
+        if self.enabled:
+            tasks = await self._entries.get(key)
+            if tasks is not None:
+                return tasks
+
+        version = await self._version()
+        tasks = await db.tasks.find({"project_id": project_id}).sort("_id", 1).to_list(length=None)
+        await self._fill({key: tasks, **{f"task:{task['_id']}": task for task in tasks}}, version)
+        return tasks
+
+    async def _get_many(self, collection, kind: str, ids: Iterable[str]) -> Dict[str, dict]:
+        ids = list(dict.fromkeys(ids))
+        cached = await self._entries.get_many([f"{kind}:{doc_id}" for doc_id in ids]) if self.enabled else {}
+        found = {}
+        missing = []
+        for doc_id in ids:
+            doc = cached.get(f"{kind}:{doc_id}")
+            if doc is not None:
+                found[doc_id] = doc
+            elif ObjectId.is_valid(doc_id):
+                missing.append(doc_id)
+
+        if missing:
+            version = await self._version()
+            fetched = {
+                str(doc["_id"]): doc
+                async for doc in collection.find({"_id": {"$in": [ObjectId(doc_id) for doc_id in missing]}})
+            }
+            await self._fill({f"{kind}:{doc_id}": doc for doc_id, doc in fetched.items()}, version)
+            found.update(fetched)
+        return found
+
+    # Write-through
+
+    async def put_project(self, project: dict):
+        if self.enabled:
+            await self._entries.set(f"project:{project['_id']}", project)
+
+    async def put_task(self, task: dict):
+        """Store a created or updated task and drop its project's cached task list."""
+        await self._entries.delete(f"project_tasks:{task.get('project_id')}")
+        if self.enabled:
+            await self._entries.set(f"task:{task['_id']}", task)
+
+    async def put_tasks(self, tasks: List[dict]):
+        """put_task() for a batch of tasks, e.g. from a bulk import."""
+        await self._entries.delete(*{f"project_tasks:{task.get('project_id')}" for task in tasks})
+        if self.enabled:
+            await self._entries.set_many({f"task:{task['_id']}": task for task in tasks})
+
+    async def invalidate_project(self, project_id: str):
+        await self._entries.delete(f"project:{project_id}", f"project_tasks:{project_id}")
+
+    async def invalidate_task(self, task_id: str, project_id: Optional[str] = None):
+        keys = [f"task:{task_id}"]
+        if project_id is not None:
+            keys.append(f"project_tasks:{project_id}")
+        await self._entries.delete(*keys)
+
+    async def clear(self):
+        await self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, **self._entries.stats()}
+
+
+catalog_cache = CatalogCache(
+    build_cache(
+        "catalog",
+        maxsize=int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "10000")),
+        ttl=float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300"))
+    ),
+    enabled=os.getenv("CATALOG_CACHE_ENABLED", "true").lower() == "true"
+)
@@ -0,0 +1,297 @@
+"""
+Cache invalidation from MongoDB writes that did not go through this worker:
+admin scripts, seeding, direct Atlas edits, or (with CACHE_BACKEND=memory)
+the API running in another worker.
+
+ChangeWatcher tails one database-level change stream filtered to
+WATCHED_COLLECTIONS and evicts the matching catalog, profile, recommendation
+and task index entries. Its resume token is saved in `cache_watch_state`, so
+a restart picks up where it stopped. Change streams need a replica set;
+against a standalone server the watcher polls POLLED_COLLECTIONS for
+documents with a newer `updated_at` instead (deletes and writes that do not
+set updated_at are not seen in that mode).
+
+Enabled with CACHE_CHANGE_WATCHER=true and started in main.py's lifespan.
+
+Usage (against a single-node replica set, e.g. `mongod --replSet rs0` after
+`rs.initiate()`):
+    python -m utils.change_watcher --check   # exits 1 if an out-of-band edit is not picked up
+"""
+
+import asyncio
+import os
+import sys
+import time
+from typing import Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from agents.recommendation_cache import recommendation_cache
+from agents.task_index import task_index
+from utils.catalog_cache import catalog_cache
+from utils.profile_cache import profile_cache
+from utils.repository import now_ms
+
+CHANGE_WATCHER_ENABLED = os.getenv("CACHE_CHANGE_WATCHER", "false").lower() == "true"
+CHANGE_POLL_SECONDS = float(os.getenv("CACHE_CHANGE_POLL_SECONDS", "5"))
+
+WATCHED_COLLECTIONS = ("projects", "tasks", "goals", "agents", "assignments", "user_tasks")
+# Collections whose documents carry updated_at (set by upsert_and_fetch and the task/project routers)
+POLLED_COLLECTIONS = ("projects", "tasks", "goals", "agents")
+STATE_COLLECTION = "cache_watch_state"
+
+# Only what invalidation needs is shipped with each change event
+CHANGE_FIELDS = ("userId", "project_id", "title", "description")
+
+# "$changeStream is only supported on replica sets" / unknown stage on old servers
+CHANGE_STREAMS_UNSUPPORTED = {40573, 40324}
+# The resume token fell off the oplog
+CHANGE_STREAM_HISTORY_LOST = {280, 286}
+
+# Resume tokens are saved at most this often
+TOKEN_SAVE_SECONDS = 1.0
+
+
+async def clear_caches():
+    """Drop everything; used when changes may have been missed."""
+    await catalog_cache.clear()
+    await profile_cache.clear()
+    await recommendation_cache.invalidate_catalog()
+
+
+async def invalidate_for_change(collection: str, operation: str, document_id, document: Optional[dict]):
+    """
+    Evict cache entries affected by one changed document. `document` holds
+    CHANGE_FIELDS when known; deletes don't carry it, so they fall back to
+    clearing the whole affected cache.
+    """
+    doc_id = str(document_id)
+    document = document or {}
+
+    if collection == "projects":
+        await catalog_cache.invalidate_project(doc_id)
+
+    elif collection == "tasks":
+        if operation == "delete":
+            task_index.remove(doc_id)
+        elif document.get("title") is not None:
+            task_index.upsert_document({**document, "_id": doc_id})
+
+        if document.get("project_id") is None:
+            await catalog_cache.clear()
+        else:
+            await catalog_cache.invalidate_task(doc_id, document["project_id"])
+        await recommendation_cache.invalidate_catalog()
+
+    elif collection in ("goals", "agents"):
+        user_id = document.get("userId")
+        if user_id is None:
+            await profile_cache.clear()
+        else:
+            await profile_cache.invalidate(user_id, collection)
+            if collection == "goals":
+                await recommendation_cache.invalidate_user(user_id)
+
+    elif collection in ("assignments", "user_tasks") and document.get("userId"):
+        await recommendation_cache.invalidate_user(document["userId"])
+
+
+class ChangeWatcher:
+    """Background task that applies invalidate_for_change() to every change in the database."""
+
+    def __init__(self, db, poll_interval: float = CHANGE_POLL_SECONDS):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.mode = "stopped"
+        self.changes = 0
+        self.errors = 0
+        self.last_change_at = None
+        self._task = None
+        self._token_saved_at = 0.0
+
+    # Lifecycle
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.mode = "stopped"
+
+    async def _run(self):
+        try:
+            await self._watch()
+        except OperationFailure as e:
+            if e.code not in CHANGE_STREAMS_UNSUPPORTED:
+                raise
+            print(f"ℹ️  Change streams unavailable ({e.code}); polling updated_at every {self.poll_interval}s")
+            await self._poll()
+
+    async def _apply(self, collection: str, operation: str, document_id, document: Optional[dict]):
+        try:
+            await invalidate_for_change(collection, operation, document_id, document)
+            self.changes += 1
+            self.last_change_at = now_ms()
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ Cache invalidation for {collection}/{document_id} failed: {str(e)}")
+
+    # Change streams
+
+    def _pipeline(self) -> list:
+        return [
+            {"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}},
+            {"$project": {
+                "operationType": 1,
+                "ns": 1,
+                "documentKey": 1,
+                **{f"fullDocument.{field}": 1 for field in CHANGE_FIELDS}
+            }}
+        ]
+
+    async def _load_token(self):
+        state = await self.db[STATE_COLLECTION].find_one({"_id": "change_stream"})
+        return state.get("resume_token") if state else None
+
+    async def _save_token(self, token, force: bool = False):
+        if token is None or (not force and time.monotonic() - self._token_saved_at < TOKEN_SAVE_SECONDS):
+            return
+        self._token_saved_at = time.monotonic()
+        await self.db[STATE_COLLECTION].update_one(
+            {"_id": "change_stream"},
+            {"$set": {"resume_token": token, "saved_at": now_ms()}},
+            upsert=True
+        )
+
+    async def _watch(self):
+        token = await self._load_token()
+        while True:
+            try:
+                async with self.db.watch(self._pipeline(), full_document="updateLookup", resume_after=token) as stream:
+                    self.mode = "change_stream"
+                    print(f"👀 Watching {', '.join(WATCHED_COLLECTIONS)} for changes"
+                          f"{' (resumed)' if token else ''}")
+                    async for change in stream:
+                        operation = change["operationType"]
+                        if operation in ("insert", "update", "replace", "delete"):
+                            await self._apply(
+                                change["ns"]["coll"], operation,
+                                change["documentKey"]["_id"], change.get("fullDocument")
+                            )
+                        elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+                            await clear_caches()
+                        token = stream.resume_token
+                        await self._save_token(token)
+                    # The stream was invalidated (e.g. database dropped); start a new one
+                    token = None
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    raise
+                if e.code in CHANGE_STREAM_HISTORY_LOST:
+                    print("⚠️ Change stream resume token expired; clearing caches and starting from now")
+                    token = None
+                    await clear_caches()
+                    continue
+                self.errors += 1
+                print(f"⚠️ Change stream failed: {str(e)}; retrying")
+                await asyncio.sleep(self.poll_interval)
+            except PyMongoError as e:
+                self.errors += 1
+                print(f"⚠️ Change stream failed: {str(e)}; retrying")
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                await self._save_token(token, force=True)
+
+    # Polling fallback
+
+    async def _poll(self):
+        self.mode = "polling"
+        state = await self.db[STATE_COLLECTION].find_one({"_id": "poll"}) or {}
+        since = state.get("since", {})
+        now = now_ms()
+        for collection in POLLED_COLLECTIONS:
+            since.setdefault(collection, now)
+        # _ids already handled at exactly since[collection]; the query uses $gte
+        # so writes in the same millisecond are not skipped
+        seen = {collection: set() for collection in POLLED_COLLECTIONS}
+        projection = {"updated_at": 1, **{field: 1 for field in CHANGE_FIELDS}}
+
+        while True:
+            try:
+                for collection in POLLED_COLLECTIONS:
+                    cursor = self.db[collection].find({"updated_at": {"$gte": since[collection]}}, projection)
+                    async for document in cursor.sort("updated_at", 1):
+                        if document["updated_at"] == since[collection] and document["_id"] in seen[collection]:
+                            continue
+                        if document["updated_at"] > since[collection]:
+                            since[collection] = document["updated_at"]
+                            seen[collection] = set()
+                        seen[collection].add(document["_id"])
+                        await self._apply(collection, "update", document["_id"], document)
+                await self.db[STATE_COLLECTION].update_one(
+                    {"_id": "poll"}, {"$set": {"since": since, "saved_at": now_ms()}}, upsert=True
+                )
+            except PyMongoError as e:
+                self.errors += 1
+                print(f"⚠️ updated_at polling failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "changes": self.changes,
+            "errors": self.errors,
+            "last_change_at": self.last_change_at
+        }
+
+
+async def _check(timeout: float) -> int:
+    """Edit a project behind the API's back and wait for the cached copy to be evicted."""
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    database = os.getenv("CHANGE_WATCHER_CHECK_DATABASE", "change_watcher_check")
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    await client.drop_database(database)
+    db = client[database]
+    watcher = ChangeWatcher(db, poll_interval=min(CHANGE_POLL_SECONDS, 1.0))
+    try:
+        result = await db.projects.insert_one({"name": "before", "updated_at": now_ms()})
+        project_id = str(result.inserted_id)
+        await catalog_cache.get_project(db, project_id)
+
+        await watcher.start()
+        # Let the stream open (or the poller take its first mark) before editing
+        while watcher.mode == "stopped":
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.5)
+
+        await db.projects.update_one({"_id": result.inserted_id}, {"$set": {"name": "after", "updated_at": now_ms()}})
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            project = await catalog_cache.get_project(db, project_id)
+            if project and project["name"] == "after":
+                print(f"✅ Out-of-band edit evicted from the cache ({watcher.mode})")
+                return 0
+            await asyncio.sleep(0.1)
+        print(f"❌ Cached project still stale after {timeout}s ({watcher.mode})")
+        return 1
+    finally:
+        await watcher.stop()
+        await client.drop_database(database)
+        client.close()
+
+
+if __name__ == "__main__":
+    if "--check" not in sys.argv:
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(_check(timeout=float(os.getenv("CHANGE_WATCHER_CHECK_TIMEOUT", "15")))))
@@ -0,0 +1,44 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+    The first caller for a key starts the work; callers that arrive while it
+    is still running await the same future and receive the same result (or
+    exception). The shared work is shielded, so one caller disconnecting
+    does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.executions += 1
+        future = asyncio.ensure_future(fn())
+        self._in_flight[key] = future
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Hashable, future: asyncio.Future):
+        self._in_flight.pop(key, None)
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> dict:
+        total = self.executions + self.coalesced
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0
+        }
@@ -0,0 +1,248 @@
+"""
+Declarative MongoDB index registry.
+
+INDEXES lists every index the app relies on, per collection. apply_indexes()
+creates them idempotently (existing identical indexes are a no-op) and is
+started in the background at startup so it never delays readiness.
+
+QUERY_SHAPES lists the filters/sorts the routers and agent tools send.
+`python -m utils.indexes --check` runs explain() on each of them against
+DATABASE_NAME and exits non-zero if any plan contains a COLLSCAN. The test
+suite fails on any query whose shape (query_shape()) is not registered, and
+tests/test_indexes.py runs the check against a mongod when one is available.
+
+Usage:
+    python -m utils.indexes           # apply the registry
+    python -m utils.indexes --check   # apply, then explain every query shape
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# Names are left to the driver (e.g. "userId_1"), matching indexes created before the registry
+INDEXES = {
+    "tasks": [
+        # Covers the $group-by-status aggregation behind /projects/stats
+        IndexModel([("project_id", ASCENDING), ("status", ASCENDING)]),
+        # Keyset pages of a project's tasks (GET /projects/{id})
+        IndexModel([("project_id", ASCENDING), ("_id", ASCENDING)]),
+        # updated_at polling in utils/change_watcher.py when change streams are unavailable
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    "projects": [
+        # GET /projects/ lists newest first
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    "assignments": [
+        IndexModel([("userId", ASCENDING)]),
+        # Conditional updates on {userId, tasks.taskId} and "who has task X"
+        IndexModel([("tasks.taskId", ASCENDING)]),
+    ],
+    # Split assignment layout (utils/assignments.py)
+    "user_tasks": [
+        # One document per (userId, taskId); also serves "all of a user's tasks"
+        IndexModel([("userId", ASCENDING), ("taskId", ASCENDING)], unique=True),
+    ],
+    "task_comments": [
+        IndexModel([("userId", ASCENDING), ("taskId", ASCENDING), ("createdAt", ASCENDING)]),
+    ],
+    "goals": [
+        IndexModel([("userId", ASCENDING)]),
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    "agents": [
+        # Prevents duplicate agent documents per user
+        IndexModel([("userId", ASCENDING)], unique=True),
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    "chats": [
+        # _id breaks timestamp ties so chat history keyset pages stay index-only
+        IndexModel([("userId", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "agent_jobs": [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+        # Running jobs whose worker stopped renewing its lease (agents/jobs.py)
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+    ],
+}
+
+_SAMPLE_ID = ObjectId()
+_SAMPLE_USER = "index-check-user"
+_SAMPLE_TIME = datetime(2026, 1, 1)
+
+# (label, collection, filter, sort) for finds; (label, collection, pipeline) for aggregations
+# Reads of a whole collection on purpose (same format, never explained)
+FULL_SCANS = [
+    ("task index build", "tasks", {}, None),
+    ("embedded users", "assignments", {}, None),
+    ("users to migrate", "assignments", {"migrated_at": {"$exists": False}}, None),
+]
+
+QUERY_SHAPES = [
+    ("project tasks", "tasks", {"project_id": str(_SAMPLE_ID)}, None),
+    ("project tasks page", "tasks", {"project_id": str(_SAMPLE_ID)}, [("_id", ASCENDING)]),
+    ("task by id", "tasks", {"_id": _SAMPLE_ID}, None),
+    ("tasks by ids", "tasks", {"_id": {"$in": [_SAMPLE_ID]}}, None),
+    ("project by id", "projects", {"_id": _SAMPLE_ID}, None),
+    ("projects page", "projects", {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("user assignments", "assignments", {"userId": _SAMPLE_USER}, None),
+    ("assignment with task", "assignments", {"userId": _SAMPLE_USER, "tasks.taskId": str(_SAMPLE_ID)}, None),
+    ("users with task", "assignments", {"tasks.taskId": str(_SAMPLE_ID)}, None),
+    ("assignments of users", "assignments", {"userId": {"$in": [_SAMPLE_USER]}}, None),
+    ("unchanged ranks", "assignments", {"userId": _SAMPLE_USER, "tasks": {
+        "$size": 1, "$all": [{"$elemMatch": {"taskId": str(_SAMPLE_ID), "rank": "V"}}]
+    }}, None),
+    ("user tasks", "user_tasks", {"userId": _SAMPLE_USER}, None),
+    ("user tasks of users", "user_tasks", {"userId": {"$in": [_SAMPLE_USER]}}, None),
+    ("user task", "user_tasks", {"userId": _SAMPLE_USER, "taskId": str(_SAMPLE_ID)}, None),
+    ("user tasks by ids", "user_tasks", {"userId": _SAMPLE_USER, "taskId": {"$in": [str(_SAMPLE_ID)]}}, None),
+    ("user task with rank", "user_tasks", {"userId": _SAMPLE_USER, "taskId": str(_SAMPLE_ID), "rank": "V"}, None),
+    ("user task comments", "task_comments", {"userId": _SAMPLE_USER}, [("taskId", ASCENDING), ("createdAt", ASCENDING)]),
+    ("task comments", "task_comments", {"userId": _SAMPLE_USER, "taskId": str(_SAMPLE_ID)}, None),
+    ("user goals", "goals", {"userId": _SAMPLE_USER}, None),
+    ("agent by user", "agents", {"userId": _SAMPLE_USER}, None),
+    ("chat by id", "chats", {"_id": _SAMPLE_ID, "userId": _SAMPLE_USER}, None),
+    ("chat history", "chats", {"userId": _SAMPLE_USER}, [("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    ("chat history page", "chats", {
+        "userId": _SAMPLE_USER,
+        "$or": [{"timestamp": {"$lt": _SAMPLE_TIME}}, {"timestamp": _SAMPLE_TIME, "_id": {"$lt": _SAMPLE_ID}}]
+    }, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("queued agent jobs", "agent_jobs", {"status": "queued"}, [("created_at", ASCENDING)]),
+    ("agent job", "agent_jobs", {"_id": _SAMPLE_ID}, None),
+    ("claim agent job", "agent_jobs", {"_id": _SAMPLE_ID, "status": "queued"}, None),
+    ("held agent job", "agent_jobs", {"_id": _SAMPLE_ID, "status": "running", "worker_id": "worker"}, None),
+    ("expired agent job leases", "agent_jobs", {"status": "running", "$or": [
+        {"lease_expires_at": {"$lt": _SAMPLE_TIME}},
+        {"lease_expires_at": {"$exists": False}, "updated_at": {"$lt": _SAMPLE_TIME}}
+    ]}, None),
+    ("cache watch state", "cache_watch_state", {"_id": "poll"}, None),
+    *[
+        (f"changed {collection}", collection, {"updated_at": {"$gte": _SAMPLE_TIME}}, [("updated_at", ASCENDING)])
+        for collection in ("projects", "tasks", "goals", "agents")
+    ],
+    ("project stats", "tasks", [
+        {"$match": {"project_id": {"$in": [str(_SAMPLE_ID)]}}},
+        {"$group": {"_id": {"project_id": "$project_id", "status": "$status"}, "count": {"$sum": 1}}}
+    ]),
+]
+
+
+def query_shape(filter: dict) -> tuple:
+    """
+    What an index has to serve in `filter`, without the values: each field
+    with the operators applied to it ("$eq" for a plain value), and $or/$and
+    branches recursively. Queries with the same shape get the same plan.
+    """
+    shape = []
+    for key, condition in (filter or {}).items():
+        if key in ("$or", "$and"):
+            shape.append((key, tuple(sorted({query_shape(branch) for branch in condition}))))
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            shape.append((key, tuple(sorted(condition))))
+        else:
+            shape.append((key, ("$eq",)))
+    return tuple(sorted(shape))
+
+
+def shape_key(collection: str, query, sort=None) -> tuple:
+    """Registry key for a find/update filter (with its sort) or an aggregation pipeline."""
+    if isinstance(query, list):
+        query = next((stage["$match"] for stage in query if "$match" in stage), {})
+    return collection, query_shape(query), tuple((field, int(direction)) for field, direction in sort or ())
+
+
+def registered_shapes() -> set:
+    """shape_key() of every entry in QUERY_SHAPES and FULL_SCANS."""
+    return {shape_key(*shape[1:]) for shape in QUERY_SHAPES + FULL_SCANS}
+
+
+async def apply_indexes(db, indexes: dict = None):
+    """Create every registered index. Failures are logged per index and do not stop the rest."""
+    indexes = INDEXES if indexes is None else indexes
+    created = 0
+    for collection, models in indexes.items():
+        for model in models:
+            try:
+                await db[collection].create_indexes([model])
+                created += 1
+            except Exception as e:
+                # e.g. an index with the same keys but different options already exists
+                print(f"ℹ️  Index {collection}.{model.document['name']}: {str(e)}")
+    print(f"✅ Indexes applied ({created}/{sum(len(m) for m in indexes.values())})")
+
+
+def _plan_stages(node):
+    """Yield every stage name in an explain() winning plan, however deeply nested."""
+    if isinstance(node, dict):
+        if "stage" in node:
+            yield node["stage"]
+        for value in node.values():
+            yield from _plan_stages(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _plan_stages(value)
+
+
+def _winning_plans(explain):
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from _winning_plans(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            yield from _winning_plans(value)
+
+
+async def find_collection_scans(db, shapes: list = None) -> list:
+    """Explain every query shape; return (label, collection) for each plan that scans a collection."""
+    shapes = QUERY_SHAPES if shapes is None else shapes
+    scans = []
+    for shape in shapes:
+        if len(shape) == 3:
+            label, collection, pipeline = shape
+            explain = await db.command("aggregate", collection, pipeline=pipeline, explain=True)
+        else:
+            label, collection, filter, sort = shape
+            cursor = db[collection].find(filter)
+            if sort:
+                cursor = cursor.sort(sort)
+            explain = await cursor.explain()
+
+        stages = {stage for plan in _winning_plans(explain) for stage in _plan_stages(plan)}
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print(f"{'❌' if status != 'ok' else '✅'} {label:<24} {collection:<12} {', '.join(sorted(stages)) or 'EOF'}")
+        if status != "ok":
+            scans.append((label, collection))
+    return scans
+
+
+async def _main(check: bool) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL"))
+    db = client[os.getenv("DATABASE_NAME", "projects")]
+    try:
+        await apply_indexes(db)
+        if check:
+            scans = await find_collection_scans(db)
+            if scans:
+                print(f"❌ {len(scans)} query shape(s) scan a whole collection")
+                return 1
+            print("✅ No collection scans")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main("--check" in sys.argv)))
@@ -0,0 +1,109 @@
+import base64
+import os
+from typing import Iterable, List, Optional, Tuple
+
+from bson import json_util
+from fastapi import HTTPException, Query, Response
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+# Hard cap on `limit` for every paginated list endpoint
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """
+    Query parameters shared by paginated list endpoints, used as
+    `page: PageParams = Depends()`.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description=f"Value of {NEXT_CURSOR_HEADER} from the previous page"),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return")
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+
+
+def encode_cursor(values: list) -> str:
+    """Opaque cursor for the sort-key values of the last document on a page."""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keyset_filter(sort: List[Tuple[str, int]], values: list) -> dict:
+    """Filter for documents that come strictly after `values` in `sort` order."""
+    clauses = []
+    for index, (field, direction) in enumerate(sort):
+        clause = {prefix: value for (prefix, _), value in zip(sort[:index], values[:index])}
+        clause[field] = {"$gt" if direction == 1 else "$lt": values[index]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str], required: Iterable[str] = ()) -> Optional[dict]:
+    """
+    Map a `fields=a,b` parameter to a Mongo projection. `id` is always
+    returned; `required` fields are added so response models still validate.
+    Returns None (all fields) when no fields were requested.
+    """
+    if not fields:
+        return None
+
+    requested = {f.strip() for f in fields.split(",") if f.strip()} - {"id"}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(sorted(unknown))}")
+
+    return {field: 1 for field in requested | set(required)}
+
+
+async def paginate(
+    collection,
+    query: dict,
+    sort: List[Tuple[str, int]],
+    page: PageParams,
+    projection: Optional[dict] = None
+) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one keyset page. `_id` is appended to the sort as a tie-breaker,
+    so pages never skip or repeat documents. Returns (documents, next_cursor);
+    next_cursor is None on the last page.
+    """
+    if sort[-1][0] != "_id":
+        sort = sort + [("_id", sort[-1][1])]
+
+    if page.cursor:
+        query = {"$and": [query, keyset_filter(sort, decode_cursor(page.cursor, len(sort)))]}
+
+    if projection is not None:
+        # The cursor is built from the sort keys, so they must be fetched
+        projection = {**projection, **{field: 1 for field, _ in sort}}
+
+    docs = await collection.find(query, projection).sort(sort).limit(page.limit + 1).to_list(length=page.limit + 1)
+
+    next_cursor = None
+    if len(docs) > page.limit:
+        docs = docs[:page.limit]
+        next_cursor = encode_cursor([docs[-1].get(field) for field, _ in sort])
+    return docs, next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
@@ -0,0 +1,74 @@
+import copy
+import os
+from typing import Optional
+
+from utils.cache import CacheBackend, build_cache
+from utils.concurrency import SingleFlight
+
+# Collections holding per-user profile documents, keyed by userId
+PROFILE_COLLECTIONS = ("agents", "goals")
+
+
+class ProfileCache:
+    """
+    Per-user agent and goals documents (agentName, goals), cached whole.
+
+    Users without a document are cached too, so the default agent name and
+    empty goals don't cost a read per page load. The routers that upsert
+    these documents store the returned document with set(); concurrent misses
+    for the same user share one read. Callers get copies.
+    """
+
+    def __init__(self, backend: CacheBackend, enabled: bool = True):
+        self._entries = backend
+        self._flights = SingleFlight()
+        self.enabled = enabled
+
+    async def _get(self, db, collection: str, user_id: str) -> Optional[dict]:
+        if not self.enabled:
+            return await db[collection].find_one({"userId": user_id})
+
+        key = f"{collection}:{user_id}"
+        entry = await self._entries.get(key)
+        if entry is None:
+            # Coalesced waiters share the loaded entry, so each gets its own copy
+            entry = await self._flights.do(key, lambda: self._load(db, collection, user_id))
+            return copy.deepcopy(entry["document"])
+        return entry["document"]
+
+    async def _load(self, db, collection: str, user_id: str) -> dict:
+        version = await self._entries.version()
+        entry = {"document": await db[collection].find_one({"userId": user_id})}
+        # Skipped if any worker wrote a profile while we were reading
+        await self._entries.fill({f"{collection}:{user_id}": entry}, version)
+        return entry
+
+    async def get_agent(self, db, user_id: str) -> Optional[dict]:
+        return await self._get(db, "agents", user_id)
+
+    async def get_goals(self, db, user_id: str) -> Optional[dict]:
+        return await self._get(db, "goals", user_id)
+
+    async def set(self, collection: str, user_id: str, document: dict):
+        """Refresh after an upsert, with the document the write returned."""
+        if self.enabled:
+            await self._entries.set(f"{collection}:{user_id}", {"document": document})
+
+    async def invalidate(self, user_id: str, collection: Optional[str] = None):
+        await self._entries.delete(*[f"{name}:{user_id}" for name in ((collection,) if collection else PROFILE_COLLECTIONS)])
+
+    async def clear(self):
+        await self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, **self._entries.stats(), "coalesced_loads": self._flights.coalesced}
+
+
+profile_cache = ProfileCache(
+    build_cache(
+        "profiles",
+        maxsize=int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "10000")),
+        ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+    ),
+    enabled=os.getenv("PROFILE_CACHE_ENABLED", "true").lower() == "true"
+)
@@ -0,0 +1,126 @@
+import os
+from typing import Dict, List, Optional
+
+# Rank keys are strings over these digits; plain string comparison orders them
+# the same way as the base-62 fractions 0.<digits> they represent
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+# Keys grow by roughly one character every ~6 moves into the same gap;
+# past this length the user's list is rebalanced in the background
+RANK_REBALANCE_LENGTH = int(os.getenv("TASK_RANK_REBALANCE_LENGTH", "16"))
+
+
+def _midpoint(low: str, high: Optional[str]) -> str:
+    # low may be "" (zero) and high None (one); neither ends in "0"
+    if high is not None:
+        prefix = 0
+        while prefix < len(high) and (low[prefix] if prefix < len(low) else "0") == high[prefix]:
+            prefix += 1
+        if prefix:
+            return high[:prefix] + _midpoint(low[prefix:], high[prefix:])
+
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+
+    # Adjacent first digits: extend low with one more digit
+    if high is not None and len(high) > 1:
+        return high[:1]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def rank_between(before: Optional[str], after: Optional[str]) -> str:
+    """
+    Return a rank key that sorts strictly between `before` and `after`.
+    None means the start (for `before`) or the end (for `after`) of the list.
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"Rank {before!r} must sort before {after!r}")
+    return _midpoint(before or "", after)
+
+
+def initial_ranks(count: int) -> List[str]:
+    """Evenly spaced, short rank keys for `count` items in order."""
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    step = BASE ** width // (count + 1)
+
+    ranks = []
+    for position in range(1, count + 1):
+        value = position * step
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        ranks.append("".join(reversed(digits)).rstrip("0"))
+    return ranks
+
+
+def sort_by_rank(task_assignments: List[dict]) -> List[dict]:
+    """
+    Order task assignments by rank. Assignments without a rank yet (created
+    before ranks existed, or just linked) follow, ordered by sequenceId.
+    """
+    return sorted(
+        task_assignments,
+        key=lambda t: (
+            t.get("rank") is None,
+            t.get("rank") or "",
+            t.get("sequenceId") is None,
+            t.get("sequenceId") or 0
+        )
+    )
+
+
+def place_by_sequence(ordered: List[dict], sequence_by_task: Dict[str, int]) -> List[str]:
+    """
+    Task IDs of `ordered` (sorted by sort_by_rank) once the tasks in
+    `sequence_by_task` get those sequenceIds: the other tasks keep their
+    order, and each renumbered task goes right before the first task with a
+    higher sequenceId (at the end if there is none).
+    """
+    sequences = {t["taskId"]: t.get("sequenceId") for t in ordered}
+    sequences.update(sequence_by_task)
+    order = [t["taskId"] for t in ordered if t["taskId"] not in sequence_by_task]
+    for task_id in sorted(sequence_by_task, key=sequence_by_task.get):
+        position = next(
+            (index for index, other in enumerate(order)
+             if sequences[other] is not None and sequences[other] > sequence_by_task[task_id]),
+            len(order)
+        )
+        order.insert(position, task_id)
+    return order
+
+
+def resequence_ranks(task_assignments: List[dict], sequence_by_task: Dict[str, int]) -> Dict[str, str]:
+    """
+    Rank keys to write so that rank order follows new sequenceIds, for a list
+    that already uses ranks: the renumbered tasks are placed with
+    place_by_sequence(). Tasks missing a rank get one (in the current order)
+    too. Lists without any rank are ordered by sequenceId already; for them
+    this returns {}.
+    """
+    ordered = sort_by_rank(task_assignments)
+    ranks = {t["taskId"]: t.get("rank") for t in ordered}
+    moved = {task_id: sequence for task_id, sequence in sequence_by_task.items() if task_id in ranks}
+    if not moved or all(rank is None for rank in ranks.values()):
+        return {}
+
+    order = place_by_sequence(ordered, moved)
+    if len(moved) == len(order):
+        return dict(zip(order, initial_ranks(len(order))))
+
+    updates = {}
+    if any(rank is None for rank in ranks.values()):
+        # Tasks linked since the list was ranked get ranks too, in their current order
+        ranks = dict(zip(ranks, initial_ranks(len(ranks))))
+        updates.update(ranks)
+    for index, task_id in enumerate(order):
+        if task_id in moved:
+            before = updates.get(order[index - 1], ranks.get(order[index - 1])) if index else None
+            after = next((ranks[other] for other in order[index + 1:] if other not in moved), None)
+            updates[task_id] = rank_between(before, after)
+    return updates
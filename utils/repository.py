@@ -0,0 +1,71 @@
+"""
+Round-trip-minimal data access helpers shared by the routers.
+
+Writes return what the caller needs from the same round trip instead of
+re-reading: inserts hand back the locally built document, updates use
+find_one_and_update(return_document=AFTER), and conditional updates report
+whether their filter matched instead of checking existence first.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+
+def now_ms() -> datetime:
+    """datetime.now() truncated to the millisecond precision MongoDB stores."""
+    now = datetime.now()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+async def insert_document(collection, document: dict) -> dict:
+    """Insert a document and return it as stored (with _id), without reading it back."""
+    result = await collection.insert_one(document)
+    document["_id"] = result.inserted_id
+    return document
+
+
+async def update_and_fetch(
+    collection,
+    filter: dict,
+    update: dict,
+    upsert: bool = False,
+    projection: Optional[dict] = None,
+    array_filters: Optional[List[dict]] = None
+) -> Optional[dict]:
+    """Apply an update and return the updated document (None if nothing matched)."""
+    return await collection.find_one_and_update(
+        filter,
+        update,
+        upsert=upsert,
+        projection=projection,
+        array_filters=array_filters,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def upsert_and_fetch(collection, filter: dict, fields: dict) -> Tuple[dict, bool]:
+    """
+    Set `fields` (plus updated_at) on the matching document, creating it with
+    created_at if missing. Returns (document, created).
+    """
+    now = now_ms()
+    document = await update_and_fetch(
+        collection,
+        filter,
+        {"$set": {**fields, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+        upsert=True
+    )
+    return document, document.get("created_at") == now
+
+
+async def update_if_matched(
+    collection,
+    filter: dict,
+    update: dict,
+    array_filters: Optional[List[dict]] = None
+) -> bool:
+    """Apply an update guarded by `filter`; True if a document matched."""
+    result = await collection.update_one(filter, update, array_filters=array_filters)
+    return result.matched_count > 0